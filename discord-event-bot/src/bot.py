@@ -1,10 +1,26 @@
 import os
+import json
 import asyncio
+import hashlib
+import signal
+
+import time
 
 import discord
+import yarl
 from discord.ext import commands
 from dotenv import load_dotenv
 
+import config
+from db import meta_db
+from db.dkp_db import close_db
+from db.ledger import WriteBehindLedger
+from utils import metrics
+from utils.bus import BusClient
+from utils.commands import MetricsTree, observe_app_command, record_command, throttled_message
+from utils.log import get_logger, setup_logging
+from utils.ratelimit import CommandLimiter, parse_limits, parse_rate
+
 # Load environment variables from .env
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -13,31 +29,198 @@ if not TOKEN:
     raise RuntimeError("DISCORD_TOKEN is not set in .env")
 
 
+log = get_logger("bot")
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
 
-class EventBot(commands.Bot):
-    def __init__(self):
-        super().__init__(command_prefix="!", intents=intents)
+def use_fake_discord(base_url: str) -> None:
+    """Point discord.py's REST and gateway URLs at a local stand-in.
+
+    Only for testing against tools/fake_discord.py (FAKE_DISCORD_URL).
+    """
+    base = yarl.URL(base_url)
+    discord.http.Route.BASE = str(base / "api" / "v10")
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = base.with_scheme(
+        "wss" if base.scheme == "https" else "ws"
+    ) / "gateway"
+
+
+class EventBot(commands.AutoShardedBot):
+    def __init__(
+        self,
+        *,
+        shard_ids: list[int] | None = None,
+        shard_count: int | None = None,
+        cluster_id: int | None = None,
+        bus: BusClient | None = None,
+    ):
+        super().__init__(
+            command_prefix="!",
+            intents=intents,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            tree_cls=MetricsTree,
+            http_trace=metrics.http_trace(),
+        )
+        # Set when running as one of several clusters (see cluster.py).
+        self.cluster_id = cluster_id
+        self.bus = bus
+        self.dkp_ledger: WriteBehindLedger | None = None
+        self.metrics_server = None
+        self.limiter = CommandLimiter(
+            {
+                "user": parse_rate(config.RATE_LIMIT_USER),
+                "guild": parse_rate(config.RATE_LIMIT_GUILD),
+                "global": parse_rate(config.RATE_LIMIT_GLOBAL),
+            },
+            parse_limits(config.RATE_LIMITS),
+            config.RATE_LIMIT_CACHE_SIZE,
+        )
 
     async def setup_hook(self):
+        if config.METRICS_ENABLED:
+            # One port per cluster so they can share a host.
+            self.metrics_server = await metrics.start_server(
+                config.METRICS_HOST,
+                config.METRICS_PORT + (self.cluster_id or 0),
+            )
+
+        if config.DKP_WRITE_BEHIND:
+            self.dkp_ledger = WriteBehindLedger(
+                max_delay=config.DKP_WRITE_BEHIND_DELAY,
+                max_batch=config.DKP_WRITE_BEHIND_MAX_BATCH,
+            )
+            self.dkp_ledger.start()
+
         # THIS is the correct place to load extensions in discord.py 2.x / py-cord
         await self.load_extension("cogs.events")
         await self.load_extension("cogs.dkp")
+        await self.load_extension("cogs.auctions")
+
+        if self.bus is not None:
+            await self.bus.start()
+
+        # Every cluster registers the same commands; only the first syncs.
+        if not self.cluster_id:
+            await self.sync_commands()
+
+    async def on_ready(self):
+        # Under cluster.py every record already carries cluster_id.
+        log.info(
+            "Logged in as %s", self.user,
+            extra={"user_id": self.user.id, "guilds": len(self.guilds)},
+        )
+
+    async def invoke(self, ctx: commands.Context):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        name = ctx.command.qualified_name
+        guild_id = ctx.guild.id if ctx.guild else None
+        scope, retry_after, first = self.limiter.hit(name, ctx.author.id, guild_id)
+        if scope is not None:
+            metrics.COMMANDS_THROTTLED.inc(command=name, scope=scope)
+            record_command(name, "prefix", "throttled", 0.0, guild_id, ctx.author.id)
+            # Say so once per user, and only when it's their own limit: a
+            # busy guild answering every refused call would just move the
+            # load to the API.
+            if first and scope == "user":
+                await ctx.reply(throttled_message(scope, retry_after), mention_author=False)
+            return
+        started = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            record_command(
+                name,
+                "prefix",
+                "error" if ctx.command_failed else "ok",
+                time.perf_counter() - started,
+                guild_id,
+                ctx.author.id,
+            )
+
+    async def on_app_command_completion(
+        self,
+        interaction: discord.Interaction,
+        command: discord.app_commands.Command,
+    ):
+        observe_app_command(interaction, "ok")
+
+    async def sync_commands(self):
+        """Sync slash commands, skipping scopes whose definitions are unchanged.
+
+        The hash of each scope's command payload is stored in bot_meta, so a
+        plain restart makes no sync calls at all.
+        """
+        await meta_db.init_db()
+        scopes = [discord.Object(id=g) for g in config.COMMAND_GUILD_IDS] or [None]
+
+        for guild in scopes:
+            payload = [c.to_dict(self.tree) for c in self.tree.get_commands(guild=guild)]
+            digest = hashlib.sha256(
+                json.dumps(payload, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            key = f"command_hash:{guild.id if guild else 'global'}"
+
+            if not config.FORCE_COMMAND_SYNC and await meta_db.get_meta(key) == digest:
+                continue
+
+            scope = f"guild {guild.id}" if guild else "global"
+            try:
+                await self.tree.sync(guild=guild)
+            except Exception:
+                log.exception("Failed to sync commands", extra={"scope": scope})
+                continue
+            await meta_db.set_meta(key, digest)
+            log.info("Synced commands", extra={"scope": scope, "commands": len(payload)})
+
+    async def close(self):
+        await super().close()
+        if self.metrics_server is not None:
+            await self.metrics_server.cleanup()
+        if self.bus is not None:
+            await self.bus.close()
+        # Flush queued DKP writes and stop the DB thread only after the
+        # gateway is down, so no command can still be waiting on them.
+        if self.dkp_ledger is not None:
+            await self.dkp_ledger.close()
+        await close_db()
 
 
-bot = EventBot()
-
+async def main():
+    setup_logging()
+    if config.FAKE_DISCORD_URL:
+        use_fake_discord(config.FAKE_DISCORD_URL)
 
-@bot.event
-async def on_ready():
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
-    print(f"Connected to {len(bot.guilds)} guild(s).")
+    async with EventBot() as bot:
+        await bot.start(TOKEN)
 
 
-async def main():
+async def run_cluster(
+    cluster_id: int,
+    shard_ids: list[int],
+    shard_count: int,
+    bus_path: str,
+):
+    """Entry point for one worker process started by cluster.py."""
+    setup_logging(cluster_id=cluster_id)
+    if config.FAKE_DISCORD_URL:
+        use_fake_discord(config.FAKE_DISCORD_URL)
+
+    bot = EventBot(
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+        cluster_id=cluster_id,
+        bus=BusClient(bus_path, cluster_id),
+    )
+    # The launcher stops workers with SIGTERM; close cleanly so queued DKP
+    # writes are flushed.
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, lambda: asyncio.create_task(bot.close())
+    )
     async with bot:
         await bot.start(TOKEN)
 
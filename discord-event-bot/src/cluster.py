@@ -0,0 +1,140 @@
+"""Run the bot as several processes, each owning a slice of the shards.
+
+    python cluster.py
+
+SHARD_COUNT and CLUSTER_COUNT come from .env (see config.py). Clusters
+talk to each other over a small Unix-socket bus (utils/bus.py) so that an
+event broadcast reaches guilds held by every process. A worker that dies
+is restarted; SIGINT/SIGTERM stop them all.
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+from typing import Dict, List
+
+import aiohttp
+import discord
+from dotenv import load_dotenv
+
+import config
+from utils.bus import BusServer
+from utils.log import get_logger, setup_logging
+
+log = get_logger("cluster")
+
+# Seconds to wait before restarting a worker that exited.
+RESTART_DELAY = 5
+
+
+def split_shards(shard_count: int, cluster_count: int) -> List[List[int]]:
+    """Split shard IDs into contiguous, near-equal runs, one per cluster."""
+    clusters = max(1, min(cluster_count, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    result, start = [], 0
+    for i in range(clusters):
+        end = start + size + (1 if i < extra else 0)
+        result.append(list(range(start, end)))
+        start = end
+    return result
+
+
+async def recommended_shards(token: str) -> int:
+    """Ask Discord (GET /gateway/bot) how many shards it recommends."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            f"{discord.http.Route.BASE}/gateway/bot",
+            headers={"Authorization": f"Bot {token}"},
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    return int(data["shards"])
+
+
+def _worker(cluster_id: int, shard_ids: List[int], shard_count: int, bus_path: str):
+    # Ctrl+C reaches the whole process group; let the launcher decide and
+    # stop us with SIGTERM instead.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import bot
+
+    asyncio.run(bot.run_cluster(cluster_id, shard_ids, shard_count, bus_path))
+
+
+async def main():
+    setup_logging()
+    load_dotenv()
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        raise RuntimeError("DISCORD_TOKEN is not set in .env")
+
+    if config.FAKE_DISCORD_URL:
+        from bot import use_fake_discord
+
+        use_fake_discord(config.FAKE_DISCORD_URL)
+
+    shard_count = config.SHARD_COUNT or await recommended_shards(token)
+    plan = split_shards(shard_count, config.CLUSTER_COUNT)
+    log.info("Planned clusters", extra={"shards": shard_count, "clusters": len(plan)})
+
+    bus = BusServer(config.BUS_SOCKET)
+    await bus.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    workers: Dict[int, multiprocessing.Process] = {}
+
+    def spawn(cluster_id: int) -> None:
+        proc = ctx.Process(
+            target=_worker,
+            args=(cluster_id, plan[cluster_id], shard_count, config.BUS_SOCKET),
+            name=f"cluster-{cluster_id}",
+        )
+        proc.start()
+        workers[cluster_id] = proc
+        log.info(
+            "Started cluster",
+            extra={"cluster_id": cluster_id, "shard_ids": plan[cluster_id], "pid": proc.pid},
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    for cluster_id in range(len(plan)):
+        spawn(cluster_id)
+
+    restart_at: Dict[int, float] = {}
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+
+        now = loop.time()
+        for cluster_id, proc in list(workers.items()):
+            if proc.is_alive() or stop.is_set():
+                continue
+            if cluster_id not in restart_at:
+                log.warning(
+                    "Cluster exited; restarting in %ss", RESTART_DELAY,
+                    extra={"cluster_id": cluster_id, "exitcode": proc.exitcode},
+                )
+                restart_at[cluster_id] = now + RESTART_DELAY
+            elif now >= restart_at[cluster_id]:
+                del restart_at[cluster_id]
+                spawn(cluster_id)
+
+    log.info("Shutting down")
+    for proc in workers.values():
+        if proc.is_alive():
+            proc.terminate()
+    for proc in workers.values():
+        await loop.run_in_executor(None, proc.join, 30)
+        if proc.is_alive():
+            proc.kill()
+    await bus.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,448 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+import config
+from db import auction_db
+from db.auction_book import Auction
+from utils.commands import command_scope
+from utils.log import get_logger
+from utils.scheduler import DeadlineScheduler
+
+log = get_logger("auctions")
+
+# Quick-bid buttons on an auction post: raise the top bid by this much
+# (0 = the minimum next bid).
+QUICK_RAISES = (0, 10, 50)
+# Bids listed on an auction post.
+TOP_BIDS_SHOWN = 3
+# Wait before retrying a settlement that failed (e.g. DB busy).
+SETTLE_RETRY = 30
+# Longest auction /auction_start accepts, in minutes (one week).
+MAX_DURATION = 7 * 24 * 60
+
+
+def auction_embed(auction: Auction) -> discord.Embed:
+    """The live post for an auction: end time, top bids and minimum bid."""
+    embed = discord.Embed(
+        title=f"🔨 {auction.item}",
+        description=f"Ends <t:{int(auction.ends_at)}:R>",
+        color=discord.Color.orange(),
+    )
+    top = auction.book.top(TOP_BIDS_SHOWN)
+    lines = [
+        f"**{i}.** <@{user_id}> — **{amount} DKP**"
+        for i, (user_id, amount) in enumerate(top, start=1)
+    ]
+    embed.add_field(name="Top bids", value="\n".join(lines) or "No bids yet", inline=True)
+    embed.add_field(
+        name="Minimum bid",
+        value=f"{auction_db.min_next_bid(auction)} DKP",
+        inline=True,
+    )
+    embed.set_footer(text=f"Auction #{auction.id} • {auction.bids} bid(s)")
+    return embed
+
+
+def result_embed(auction: Auction, result: Optional[tuple[int, int, int]]) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"🔨 {auction.item}",
+        color=discord.Color.dark_grey(),
+    )
+    if result is None:
+        embed.description = "Ended with no winner."
+    else:
+        winner_id, price, _ = result
+        embed.description = f"Sold to <@{winner_id}> for **{price} DKP**."
+        embed.color = discord.Color.green()
+    embed.set_footer(text=f"Auction #{auction.id} • {auction.bids} bid(s)")
+    return embed
+
+
+class AuctionBidButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"auction:(?P<auction_id>[0-9]+):(?P<raise_by>[0-9]+|custom)",
+):
+    """Quick-bid (or "Custom…") button on auction posts.
+
+    The amount is worked out when clicked, relative to the top bid at that
+    moment, so the buttons never go stale and survive restarts.
+    """
+
+    def __init__(self, auction_id: int, raise_by: str):
+        if raise_by == "custom":
+            label, style = "Custom…", discord.ButtonStyle.secondary
+        elif raise_by == "0":
+            label, style = "Bid minimum", discord.ButtonStyle.success
+        else:
+            label, style = f"+{raise_by}", discord.ButtonStyle.primary
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=style,
+                custom_id=f"auction:{auction_id}:{raise_by}",
+            )
+        )
+        self.auction_id = auction_id
+        self.raise_by = raise_by
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Button,
+        match,
+    ):
+        return cls(int(match["auction_id"]), match["raise_by"])
+
+    async def callback(self, interaction: discord.Interaction):
+        if self.raise_by == "custom":
+            await interaction.response.send_modal(BidModal(self.auction_id))
+            return
+
+        auction = auction_db.get_auction(self.auction_id)
+        if auction is None:
+            await interaction.response.send_message(
+                "❌ This auction has ended.", ephemeral=True
+            )
+            return
+        amount = auction_db.min_next_bid(auction)
+        leader = auction.book.leader()
+        if leader is not None:
+            amount = max(amount, leader[1] + int(self.raise_by))
+        cog = interaction.client.get_cog("Auctions")
+        await cog.handle_bid(interaction, self.auction_id, amount)
+
+
+class BidModal(discord.ui.Modal, title="Place a bid"):
+    amount = discord.ui.TextInput(label="Amount (DKP)", max_length=10)
+
+    def __init__(self, auction_id: int):
+        super().__init__()
+        self.auction_id = auction_id
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            amount = int(self.amount.value.strip())
+        except ValueError:
+            await interaction.response.send_message(
+                "❌ The amount must be a whole number.", ephemeral=True
+            )
+            return
+        cog = interaction.client.get_cog("Auctions")
+        await cog.handle_bid(interaction, self.auction_id, amount)
+
+
+def auction_view(auction_id: int) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    for raise_by in QUICK_RAISES:
+        view.add_item(AuctionBidButton(auction_id, str(raise_by)))
+    view.add_item(AuctionBidButton(auction_id, "custom"))
+    return view
+
+
+class Auctions(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # Settlements keyed by ("settle", auction_id); anti-snipe
+        # extensions reschedule the same key.
+        self.scheduler = DeadlineScheduler()
+        self.scheduler_task: Optional[asyncio.Task] = None
+        # auction_id -> pending debounced edit of the auction post
+        self.refresh: dict[int, asyncio.Task] = {}
+
+    async def cog_load(self):
+        await auction_db.init_db()
+        for auction in await auction_db.load_live(self.owns_guild):
+            self.schedule_settle(auction)
+        self.scheduler_task = asyncio.create_task(self.run_scheduler())
+        self.flush_bids.change_interval(seconds=config.AUCTION_FLUSH_INTERVAL)
+        self.flush_bids.start()
+        self.bot.add_dynamic_items(AuctionBidButton)
+
+    async def cog_unload(self):
+        self.scheduler_task.cancel()
+        self.flush_bids.cancel()
+        self.bot.remove_dynamic_items(AuctionBidButton)
+        for task in self.refresh.values():
+            task.cancel()
+        # Runs before EventBot.close() stops the DB thread.
+        await auction_db.flush()
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether this process runs the shard a guild is on."""
+        shard_ids = getattr(self.bot, "shard_ids", None)
+        if shard_ids is None or not self.bot.shard_count:
+            return True
+        return (guild_id >> 22) % self.bot.shard_count in shard_ids
+
+    # ----------------- bids -----------------
+
+    @tasks.loop(seconds=1)
+    async def flush_bids(self):
+        try:
+            await auction_db.flush()
+        except Exception:
+            log.exception("Failed to save bids")
+
+    async def handle_bid(
+        self,
+        interaction: discord.Interaction,
+        auction_id: int,
+        amount: int,
+    ) -> None:
+        status, value = await auction_db.place_bid(
+            auction_id, interaction.user.id, amount
+        )
+        auction = auction_db.get_auction(auction_id)
+
+        if status == "closed":
+            text = "❌ This auction has ended."
+        elif status == "too_low":
+            text = f"❌ The minimum bid is **{value} DKP**."
+        elif status == "insufficient":
+            text = f"❌ You only have **{value} DKP** available"
+            held = auction_db.held_by(interaction.guild_id, interaction.user.id)
+            if held:
+                text += f" ({held} DKP is held by your leading bids)"
+            text += "."
+        else:
+            text = f"✅ You lead **{auction.item}** with **{value} DKP**."
+            if status == "extended":
+                self.schedule_settle(auction)
+                text += f"\n⏱️ Late bid: the auction now ends <t:{int(auction.ends_at)}:R>."
+            self.schedule_refresh(auction_id)
+        await interaction.response.send_message(text, ephemeral=True)
+
+    def schedule_refresh(self, auction_id: int) -> None:
+        """Edit the auction post after AUCTION_EDIT_DELAY, batching bids."""
+        if auction_id not in self.refresh:
+            self.refresh[auction_id] = asyncio.create_task(
+                self.refresh_auction(auction_id)
+            )
+
+    async def refresh_auction(self, auction_id: int) -> None:
+        try:
+            await asyncio.sleep(config.AUCTION_EDIT_DELAY)
+        finally:
+            self.refresh.pop(auction_id, None)
+        auction = auction_db.get_auction(auction_id)
+        if auction is None:
+            # Ended meanwhile; settlement renders the final post.
+            return
+        await self.edit_post(auction, embed=auction_embed(auction))
+
+    async def edit_post(self, auction: Auction, **fields) -> None:
+        channel = self.bot.get_channel(auction.channel_id)
+        if channel is None or auction.message_id is None:
+            return
+        try:
+            await channel.get_partial_message(auction.message_id).edit(**fields)
+        except discord.HTTPException as e:
+            log.warning(
+                "Failed to edit auction: %s", e,
+                extra={"guild_id": auction.guild_id, "auction_id": auction.id},
+            )
+
+    # ----------------- settlement -----------------
+
+    def schedule_settle(self, auction: Auction, delay: float = 0) -> None:
+        when = datetime.fromtimestamp(max(auction.ends_at, time.time() + delay))
+        self.scheduler.schedule(("settle", auction.id), when, auction.id)
+
+    async def run_scheduler(self) -> None:
+        await self.bot.wait_until_ready()
+        await self.scheduler.run(self.on_deadline)
+
+    async def on_deadline(self, key: tuple[str, int], auction_id: int) -> None:
+        auction = auction_db.get_auction(auction_id)
+        if auction is None:
+            return
+        if time.time() < auction.ends_at:
+            # Extended by a late bid after this deadline was taken.
+            self.schedule_settle(auction)
+            return
+
+        try:
+            auction, result = await auction_db.settle(auction_id)
+        except Exception:
+            log.exception("Failed to settle auction", extra={"auction_id": auction_id})
+            self.schedule_settle(auction, SETTLE_RETRY)
+            return
+        if auction is None:
+            return
+
+        await self.edit_post(auction, embed=result_embed(auction, result), view=None)
+        channel = self.bot.get_channel(auction.channel_id)
+        if channel is None:
+            return
+        if result is None:
+            text = f"🔨 The auction for **{auction.item}** ended with no winner."
+        else:
+            winner_id, price, _ = result
+            text = (
+                f"🔨 <@{winner_id}> won **{auction.item}** for **{price} DKP**!"
+            )
+        try:
+            await channel.send(text)
+        except discord.HTTPException as e:
+            log.warning(
+                "Failed to announce auction: %s", e,
+                extra={"guild_id": auction.guild_id, "auction_id": auction.id},
+            )
+
+    # ----------------- autocomplete -----------------
+
+    async def auction_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice[int]]:
+        current = current.strip().casefold().lstrip("#")
+        choices = []
+        for auction in auction_db.get_guild_auctions(interaction.guild_id):
+            name = f"#{auction.id} {auction.item}"
+            if current and current not in name.casefold():
+                continue
+            choices.append(app_commands.Choice(name=name[:100], value=auction.id))
+        return choices[:25]
+
+    # ----------------- /auction_start -----------------
+
+    @app_commands.command(
+        name="auction_start",
+        description="Auction an item for DKP in this channel.",
+    )
+    @command_scope()
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.describe(
+        item="What is being auctioned",
+        duration="How long bidding stays open, in minutes",
+        min_bid="Lowest accepted bid (default 1 DKP)",
+    )
+    async def auction_start(
+        self,
+        interaction: discord.Interaction,
+        item: str,
+        duration: app_commands.Range[int, 1, MAX_DURATION],
+        min_bid: app_commands.Range[int, 1] = 1,
+    ):
+        channel = interaction.channel
+        if not channel.permissions_for(interaction.guild.me).send_messages:
+            await interaction.response.send_message(
+                "❌ I can't send messages in this channel.", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        auction = await auction_db.create_auction(
+            interaction.guild_id,
+            channel.id,
+            item.strip(),
+            interaction.user.id,
+            min_bid,
+            duration * 60,
+        )
+        message = await channel.send(
+            embed=auction_embed(auction), view=auction_view(auction.id)
+        )
+        await auction_db.set_message(auction, message.id)
+        self.schedule_settle(auction)
+
+        await interaction.followup.send(
+            f"✅ Auction #{auction.id} for **{auction.item}** started; "
+            f"it ends <t:{int(auction.ends_at)}:R>.",
+            ephemeral=True,
+        )
+
+    # ----------------- /bid -----------------
+
+    @app_commands.command(
+        name="bid",
+        description="Bid DKP on an open auction.",
+    )
+    @command_scope()
+    @app_commands.describe(
+        amount="Your bid in DKP",
+        auction="Auction to bid on (default: the one open in this channel)",
+    )
+    @app_commands.autocomplete(auction=auction_autocomplete)
+    async def bid(
+        self,
+        interaction: discord.Interaction,
+        amount: app_commands.Range[int, 1],
+        auction: Optional[int] = None,
+    ):
+        if auction is None:
+            auctions = auction_db.get_guild_auctions(interaction.guild_id)
+            here = [a for a in auctions if a.channel_id == interaction.channel_id]
+            candidates = here or auctions
+            if not candidates:
+                await interaction.response.send_message(
+                    "❌ There are no open auctions.", ephemeral=True
+                )
+                return
+            if len(candidates) > 1:
+                await interaction.response.send_message(
+                    "❌ Several auctions are open; choose one with the "
+                    "`auction` option.",
+                    ephemeral=True,
+                )
+                return
+            auction = candidates[0].id
+
+        live = auction_db.get_auction(auction)
+        if live is None or live.guild_id != interaction.guild_id:
+            await interaction.response.send_message(
+                "❌ That auction isn't open.", ephemeral=True
+            )
+            return
+        await self.handle_bid(interaction, auction, amount)
+
+    # ----------------- /auction_cancel -----------------
+
+    @app_commands.command(
+        name="auction_cancel",
+        description="Cancel an open auction without charging anyone.",
+    )
+    @command_scope()
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.describe(auction="Auction to cancel")
+    @app_commands.autocomplete(auction=auction_autocomplete)
+    async def auction_cancel(
+        self,
+        interaction: discord.Interaction,
+        auction: int,
+    ):
+        live = auction_db.get_auction(auction)
+        if live is None or live.guild_id != interaction.guild_id:
+            await interaction.response.send_message(
+                "❌ That auction isn't open.", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        cancelled = await auction_db.cancel(auction)
+        if cancelled is None:
+            await interaction.followup.send(
+                "❌ That auction has already ended.", ephemeral=True
+            )
+            return
+        self.scheduler.cancel(("settle", auction))
+
+        embed = result_embed(cancelled, None)
+        embed.description = "Cancelled."
+        await self.edit_post(cancelled, embed=embed, view=None)
+        await interaction.followup.send(
+            f"✅ Auction #{auction} for **{cancelled.item}** was cancelled.",
+            ephemeral=True,
+        )
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Auctions(bot))
@@ -1,21 +1,441 @@
-from typing import Optional
+import asyncio
+import io
+from datetime import datetime, timedelta
+from typing import IO, Any, Awaitable, Callable, Literal, Optional
 
+import aiohttp
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 
+import config
+from db import decay_db, stats_db, transfer_db
 from db.dkp_db import (
     init_db,
     add_dkp,
+    add_dkp_bulk,
     remove_dkp,
+    get_audit_log,
     get_dkp,
-    get_leaderboard,
+    get_history,
+    get_leaderboard_page,
+    get_rank,
+    invalidate_standings,
 )
+from utils import charts
+from utils.coalesce import Coalescer
+from utils.commands import command_scope
+from utils.log import get_logger
+
+log = get_logger("dkp")
+
+LEADERBOARD_PAGE_SIZE = 10
+HISTORY_PAGE_SIZE = 10
+STATS_TOP = 10
+STATS_CHART_NAME = "dkp_stats.png"
+
+# Identical leaderboard pages and /dkp_stats views requested at the same
+# time are rendered once and sent to everyone who asked.
+_leaderboards = Coalescer("leaderboard")
+_stats = Coalescer("dkp_stats")
+
+
+async def leaderboard_embed(
+    guild: discord.Guild,
+    page: int,
+) -> tuple[Optional[discord.Embed], int, int]:
+    """Render one leaderboard page.
+
+    Returns (embed, page shown, page count); embed is None when nobody in
+    the guild has DKP yet. Pages past the end show the last page.
+    """
+    return await _leaderboards.run(
+        (guild.id, page), lambda: _leaderboard_embed(guild, page)
+    )
+
+
+async def _leaderboard_embed(
+    guild: discord.Guild,
+    page: int,
+) -> tuple[Optional[discord.Embed], int, int]:
+    offset = (max(1, page) - 1) * LEADERBOARD_PAGE_SIZE
+    rows, total = await get_leaderboard_page(guild.id, offset, LEADERBOARD_PAGE_SIZE)
+    if not total:
+        return None, 1, 1
+
+    pages = -(-total // LEADERBOARD_PAGE_SIZE)
+    page = max(1, min(page, pages))
+    if not rows:
+        offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+        rows, total = await get_leaderboard_page(
+            guild.id, offset, LEADERBOARD_PAGE_SIZE
+        )
+
+    lines = []
+    for rank, user_id, points in rows:
+        lines.append(f"**{rank}.** {member_name(guild, user_id)} — **{points} DKP**")
+
+    embed = discord.Embed(
+        title=f"{guild.name} DKP Leaderboard",
+        description="\n".join(lines),
+        color=discord.Color.gold(),
+    )
+    embed.set_footer(text=f"Page {page}/{pages} • {total} members ranked")
+    return embed, page, pages
+
+
+def member_name(guild: discord.Guild, user_id: int) -> str:
+    member = guild.get_member(user_id)
+    return member.display_name if member else f"<left server> ({user_id})"
+
+
+async def stats_embed(
+    guild: discord.Guild,
+    view: str,
+    days: int,
+    member: discord.abc.User,
+    chart: bool,
+) -> tuple[discord.Embed, Optional[bytes]]:
+    """Render one /dkp_stats view, plus a PNG chart if asked and possible.
+
+    Everything comes from the daily rollups (see stats_db).
+    """
+    key = (guild.id, view, days, member.id if view == "member" else None, chart)
+    return await _stats.run(
+        key, lambda: _stats_embed(guild, view, days, member, chart)
+    )
+
+
+async def _stats_embed(
+    guild: discord.Guild,
+    view: str,
+    days: int,
+    member: discord.abc.User,
+    chart: bool,
+) -> tuple[discord.Embed, Optional[bytes]]:
+    window = f"last {days} day" + ("s" if days != 1 else "")
+    embed = discord.Embed(color=discord.Color.gold())
+    png = None
+    want_chart = chart and charts.available()
+
+    if view == "top":
+        rows = await stats_db.top_earners(guild.id, days, STATS_TOP)
+        names = [member_name(guild, user_id) for user_id, _, _ in rows]
+        embed.title = f"Top DKP earners, {window}"
+        embed.description = "\n".join(
+            f"**{i}.** {name} — **+{earned}** (spent {spent})"
+            for i, (name, (_, earned, spent)) in enumerate(zip(names, rows), 1)
+        ) or "Nobody earned DKP in this window."
+        if want_chart and rows:
+            png = await charts.bar_chart(
+                embed.title, names, [earned for _, earned, _ in rows]
+            )
+
+    elif view == "reasons":
+        rows = await stats_db.reason_totals(guild.id, days, STATS_TOP)
+        labels = [(reason or "(no reason)")[:60] for reason, _, _, _ in rows]
+        embed.title = f"DKP by reason, {window}"
+        embed.description = "\n".join(
+            f"`{label}` — +{earned} / -{spent} in {entries} entries"
+            for label, (_, earned, spent, entries) in zip(labels, rows)
+        ) or "No DKP changes in this window."
+        if want_chart and rows:
+            png = await charts.bar_chart(
+                embed.title, labels, [earned + spent for _, earned, spent, _ in rows]
+            )
+
+    elif view == "activity":
+        series = await stats_db.guild_activity(guild.id, days)
+        earned = sum(e for _, e, _ in series)
+        spent = sum(s for _, _, s in series)
+        busiest = max(series, key=lambda day: day[1] + day[2])
+        embed.title = f"{guild.name} DKP activity, {window}"
+        embed.add_field(name="Issued", value=str(earned))
+        embed.add_field(name="Spent", value=str(spent))
+        embed.add_field(name="Net", value=f"{earned - spent:+}")
+        if busiest[1] or busiest[2]:
+            embed.add_field(
+                name="Busiest day",
+                value=f"{busiest[0]:%Y-%m-%d} (+{busiest[1]} / -{busiest[2]})",
+                inline=False,
+            )
+        if want_chart:
+            png = await charts.line_chart(
+                embed.title,
+                [day for day, _, _ in series],
+                {
+                    "Issued": [e for _, e, _ in series],
+                    "Spent": [s for _, _, s in series],
+                },
+            )
+
+    else:
+        series = await stats_db.member_history(guild.id, member.id, days)
+        earned = sum(e for _, e, _, _ in series)
+        spent = sum(s for _, _, s, _ in series)
+        start = series[0][3] - (series[0][1] - series[0][2])
+        embed.title = f"{member_name(guild, member.id)}'s DKP, {window}"
+        embed.add_field(name="Earned", value=str(earned))
+        embed.add_field(name="Spent", value=str(spent))
+        embed.add_field(name="Balance", value=f"{start} → {series[-1][3]}")
+        if want_chart:
+            png = await charts.line_chart(
+                embed.title,
+                [day for day, _, _, _ in series],
+                {"Balance": [balance for _, _, _, balance in series]},
+            )
+
+    embed.set_footer(text="Days are UTC.")
+    if png is not None:
+        embed.set_image(url=f"attachment://{STATS_CHART_NAME}")
+    elif chart and not charts.available():
+        embed.set_footer(text="Days are UTC. Charts need matplotlib installed.")
+    return embed, png
+
+
+class LeaderboardView(discord.ui.View):
+    """Previous/next buttons for a !dkp_top message."""
+
+    def __init__(self, guild: discord.Guild, page: int, pages: int):
+        super().__init__(timeout=180)
+        self.guild = guild
+        self.page = page
+        self.pages = pages
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        self.previous.disabled = self.page <= 1
+        self.next.disabled = self.page >= self.pages
+
+    async def _show(self, interaction: discord.Interaction, page: int) -> None:
+        embed, self.page, self.pages = await leaderboard_embed(self.guild, page)
+        if embed is None:
+            await interaction.response.edit_message(
+                content="No DKP data for this server yet.", embed=None, view=None
+            )
+            return
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, max(1, self.page - 1))
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+
+def format_log_entry(guild: discord.Guild, entry: dict, show_member: bool) -> str:
+    sign = "+" if entry["change"] >= 0 else ""
+    line = f"`{entry['timestamp']}` **{sign}{entry['change']}**"
+    if show_member:
+        member = guild.get_member(entry["user_id"])
+        line += f" {member.display_name if member else entry['user_id']}"
+    if entry["reason"]:
+        line += f" — {entry['reason']}"
+    return line
+
+
+class LogPageView(discord.ui.View):
+    """Newer/older buttons over a keyset-paginated dkp_log query.
+
+    `fetch(cursor)` returns (entries, next cursor); the cursors of pages
+    already shown are kept so "Newer" can walk back without offsets.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Any], Awaitable[tuple[list[dict], Any]]],
+        render: Callable[[list[dict], int], discord.Embed],
+        next_cursor: Any,
+    ):
+        super().__init__(timeout=180)
+        self.fetch = fetch
+        self.render = render
+        self.cursors: list[Any] = [None]
+        self.next_cursor = next_cursor
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        self.newer.disabled = len(self.cursors) <= 1
+        self.older.disabled = self.next_cursor is None
+
+    async def _show(self, interaction: discord.Interaction) -> None:
+        entries, self.next_cursor = await self.fetch(self.cursors[-1])
+        self._update_buttons()
+        await interaction.response.edit_message(
+            embed=self.render(entries, len(self.cursors)),
+            view=self,
+        )
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.append(self.next_cursor)
+        await self._show(interaction)
+
+
+async def download_attachment(attachment: discord.Attachment, out: IO[bytes]) -> None:
+    """Stream an attachment into a file instead of reading it into memory."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(attachment.url) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                out.write(chunk)
+
+
+def import_preview_embed(
+    guild: discord.Guild,
+    filename: str,
+    preview: dict,
+) -> discord.Embed:
+    """Describe what a !dkp_import would change (see preview_import)."""
+    if preview["kind"] == "balances":
+        description = (
+            f"**{preview['rows']}** balance row(s): **{preview['changed']}** "
+            f"member(s) change ({preview['added']} new), "
+            f"{preview['unchanged']} unchanged.\n"
+            f"Net change: **{preview['net']:+} DKP**. Each changed balance is "
+            f"set to the file's value and logged as \"{transfer_db.IMPORT_REASON}\"."
+        )
+    else:
+        span = (
+            f", {preview['first']} → {preview['last']} UTC" if preview["rows"] else ""
+        )
+        description = (
+            f"**{preview['rows']}** log entries for **{preview['members']}** "
+            f"member(s){span}.\n"
+            f"Net change: **{preview['net']:+} DKP**. Entries are appended to "
+            f"the history and added to current balances."
+        )
+    embed = discord.Embed(
+        title=f"Import preview: {filename}",
+        description=description,
+        color=discord.Color.red() if preview["errors"] else discord.Color.blurple(),
+    )
+
+    samples = []
+    for user_id, old, new in preview.get("samples", []):
+        member = guild.get_member(user_id)
+        name = member.display_name if member else str(user_id)
+        samples.append(f"{name}: {old} → **{new}** ({new - old:+})")
+    if samples:
+        embed.add_field(name="Largest changes", value="\n".join(samples), inline=False)
+    if preview["errors"]:
+        embed.add_field(
+            name="Errors",
+            value="\n".join(preview["errors"])[:1024],
+            inline=False,
+        )
+        embed.set_footer(text="Nothing was imported. Fix the file and try again.")
+    else:
+        embed.set_footer(text="Dry run: nothing has been changed yet.")
+    return embed
+
+
+class ImportConfirmView(discord.ui.View):
+    """Apply/Cancel buttons under a !dkp_import preview.
+
+    Holds the uploaded file until one is pressed or the view times out.
+    """
+
+    def __init__(self, cog: "DKPCog", ctx: commands.Context, raw: IO[bytes]):
+        super().__init__(timeout=300)
+        self.cog = cog
+        self.ctx = ctx
+        self.raw = raw
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.ctx.author.id:
+            await interaction.response.send_message(
+                "Only the member who started this import can confirm it.",
+                ephemeral=True,
+            )
+            return False
+        return True
+
+    def finish(self) -> None:
+        self.stop()
+        self.raw.close()
+
+    async def on_timeout(self) -> None:
+        self.raw.close()
+
+    @discord.ui.button(label="Apply import", style=discord.ButtonStyle.danger)
+    async def apply(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.edit_message(
+            content="Importing…", view=None
+        )
+        try:
+            kind, applied = await self.cog.apply_import(self.ctx.guild, self.raw)
+        except transfer_db.TransferError as e:
+            await interaction.edit_original_response(content=f"Import failed:\n{e}")
+            return
+        finally:
+            self.finish()
+        what = "balance(s) set" if kind == "balances" else "log entries imported"
+        await interaction.edit_original_response(
+            content=f"✅ Import done: **{applied}** {what}."
+        )
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.finish()
+        await interaction.response.edit_message(content="Import cancelled.", view=None)
+
+
+class AuditFlags(commands.FlagConverter):
+    reason: Optional[str] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
 
 
 class DKPCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        init_db()
+
+    async def cog_load(self):
+        await init_db()
+        await decay_db.init_db()
+        bus = getattr(self.bot, "bus", None)
+        if bus is not None:
+            bus.subscribe("standings_invalidate", self.on_bus_invalidate)
+        # Decay is one set-based write over all guilds; with several
+        # clusters only the first runs it and tells the others.
+        if not getattr(self.bot, "cluster_id", None):
+            self.apply_decay.change_interval(minutes=config.DKP_DECAY_CHECK_MINUTES)
+            self.apply_decay.start()
+
+    async def cog_unload(self):
+        self.apply_decay.cancel()
+
+    @tasks.loop(minutes=5)
+    async def apply_decay(self):
+        # An exception escaping a tasks.loop stops it for good; a failed
+        # run is just retried on the next tick.
+        try:
+            server_ids, changed = await decay_db.run_due_decay()
+            bus = getattr(self.bot, "bus", None)
+            if server_ids and bus is not None:
+                await bus.publish("standings_invalidate", {"server_ids": server_ids})
+        except Exception:
+            log.exception("Decay run failed")
+            return
+        if server_ids:
+            log.info(
+                "Decayed balances",
+                extra={"balances": changed, "guilds": len(server_ids)},
+            )
+
+    async def on_bus_invalidate(self, data: dict) -> None:
+        """Drop cached standings for guilds another cluster rewrote."""
+        for server_id in data["server_ids"]:
+            invalidate_standings(server_id)
 
     @commands.command(name="dkp_add")
     @commands.has_permissions(manage_guild=True)
@@ -32,7 +452,7 @@ class DKPCog(commands.Cog):
             return
 
         reason_text = " ".join(reason) if reason else None
-        new_total = add_dkp(ctx.guild.id, member.id, amount, reason_text)
+        new_total = await add_dkp(ctx.guild.id, member.id, amount, reason_text)
 
         msg = (
             f"Added **{amount} DKP** to {member.mention}. "
@@ -58,7 +478,7 @@ class DKPCog(commands.Cog):
             return
 
         reason_text = " ".join(reason) if reason else None
-        new_total = remove_dkp(ctx.guild.id, member.id, amount, reason_text)
+        new_total = await remove_dkp(ctx.guild.id, member.id, amount, reason_text)
 
         msg = (
             f"Removed **{amount} DKP** from {member.mention}. "
@@ -69,6 +489,104 @@ class DKPCog(commands.Cog):
 
         await ctx.send(msg)
 
+    async def _bulk_award(
+        self,
+        ctx: commands.Context,
+        members: list[discord.Member],
+        amount: int,
+        reason: tuple[str, ...],
+        source: str,
+    ):
+        """Award the same amount to many members and post one summary."""
+        if amount <= 0:
+            await ctx.send("Amount must be a positive number.")
+            return
+
+        members = list({m.id: m for m in members if not m.bot}.values())
+        if not members:
+            await ctx.send(f"No members to award in {source}.")
+            return
+
+        reason_text = " ".join(reason) if reason else None
+        totals = await add_dkp_bulk(
+            ctx.guild.id,
+            [m.id for m in members],
+            amount,
+            reason_text,
+        )
+
+        lines = []
+        for member in sorted(members, key=lambda m: m.display_name.lower()):
+            lines.append(
+                f"{member.display_name} — **{totals[member.id]} DKP**"
+            )
+
+        # Embed descriptions are capped at 4096 characters.
+        description = ""
+        for i, line in enumerate(lines):
+            if len(description) + len(line) + 40 > 4096:
+                description += f"… and {len(lines) - i} more"
+                break
+            description += line + "\n"
+
+        embed = discord.Embed(
+            title=f"Added {amount} DKP to {len(members)} members",
+            description=description,
+            color=discord.Color.green(),
+        )
+        embed.add_field(name="Source", value=source, inline=True)
+        if reason_text:
+            embed.add_field(name="Reason", value=reason_text, inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command(name="dkp_add_many")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_add_many(
+        self,
+        ctx: commands.Context,
+        members: commands.Greedy[discord.Member],
+        amount: int,
+        *reason: str,
+    ):
+        """Add DKP to every mentioned user."""
+        await self._bulk_award(ctx, members, amount, reason, "mentions")
+
+    @commands.command(name="dkp_add_role")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_add_role(
+        self,
+        ctx: commands.Context,
+        role: discord.Role,
+        amount: int,
+        *reason: str,
+    ):
+        """Add DKP to every member of a role."""
+        await self._bulk_award(ctx, role.members, amount, reason, role.mention)
+
+    @commands.command(name="dkp_add_voice")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_add_voice(
+        self,
+        ctx: commands.Context,
+        channel: Optional[discord.VoiceChannel],
+        amount: int,
+        *reason: str,
+    ):
+        """Add DKP to everyone in a voice channel (default: yours)."""
+        if channel is None:
+            voice = ctx.author.voice
+            if voice is None or voice.channel is None:
+                await ctx.send(
+                    "Join a voice channel or name one, e.g. "
+                    "`!dkp_add_voice #Raid 10`."
+                )
+                return
+            channel = voice.channel
+
+        await self._bulk_award(
+            ctx, channel.members, amount, reason, channel.mention
+        )
+
     @commands.command(name="dkp")
     async def dkp_check(
         self,
@@ -77,34 +595,304 @@ class DKPCog(commands.Cog):
     ):
         """Check DKP for yourself or another user."""
         target = member or ctx.author
-        points = get_dkp(ctx.guild.id, target.id)
+        points = await get_dkp(ctx.guild.id, target.id)
         await ctx.send(f"{target.mention} has **{points} DKP**.")
 
     @commands.command(name="dkp_top")
-    async def dkp_top(self, ctx: commands.Context, limit: int = 10):
+    async def dkp_top(self, ctx: commands.Context, page: int = 1):
         """Show DKP leaderboard for this server."""
-        limit = max(1, min(limit, 25))
-        data = get_leaderboard(ctx.guild.id, limit)
-
-        if not data:
+        embed, page, pages = await leaderboard_embed(ctx.guild, page)
+        if embed is None:
             await ctx.send("No DKP data for this server yet.")
             return
 
-        lines = []
-        for rank, (user_id, points) in enumerate(data, start=1):
-            member = ctx.guild.get_member(user_id)
-            name = member.display_name if member else f"<left server> ({user_id})"
-            lines.append(f"**{rank}.** {name} — **{points} DKP**")
+        view = LeaderboardView(ctx.guild, page, pages) if pages > 1 else None
+        await ctx.send(embed=embed, view=view)
 
-        embed = discord.Embed(
-            title=f"{ctx.guild.name} DKP Leaderboard",
-            description="\n".join(lines),
-            color=discord.Color.gold(),
+    @commands.command(name="dkp_rank")
+    async def dkp_rank(
+        self,
+        ctx: commands.Context,
+        member: Optional[discord.Member] = None,
+    ):
+        """Show your (or another user's) DKP rank in this server."""
+        target = member or ctx.author
+        rank, points, total = await get_rank(ctx.guild.id, target.id)
+        if rank is None:
+            await ctx.send(f"{target.mention} has no DKP yet.")
+            return
+        await ctx.send(
+            f"{target.mention} is ranked **#{rank}** of {total} "
+            f"with **{points} DKP**."
         )
-        await ctx.send(embed=embed)
+
+    async def _send_log_pages(
+        self,
+        ctx: commands.Context,
+        fetch: Callable[[Any], Awaitable[tuple[list[dict], Any]]],
+        title: str,
+        show_member: bool,
+    ):
+        entries, next_cursor = await fetch(None)
+        if not entries:
+            await ctx.send("No DKP history found.")
+            return
+
+        def render(entries: list[dict], page: int) -> discord.Embed:
+            embed = discord.Embed(
+                title=title,
+                description="\n".join(
+                    format_log_entry(ctx.guild, e, show_member) for e in entries
+                ),
+                color=discord.Color.gold(),
+            )
+            embed.set_footer(text=f"Page {page} • times in UTC")
+            return embed
+
+        view = None
+        if next_cursor is not None:
+            view = LogPageView(fetch, render, next_cursor)
+        await ctx.send(embed=render(entries, 1), view=view)
+
+    @commands.command(name="dkp_history")
+    async def dkp_history(
+        self,
+        ctx: commands.Context,
+        member: Optional[discord.Member] = None,
+    ):
+        """Show DKP changes for yourself or another user."""
+        target = member or ctx.author
+
+        async def fetch(cursor: Optional[int]):
+            return await get_history(
+                ctx.guild.id, target.id, cursor, HISTORY_PAGE_SIZE
+            )
+
+        await self._send_log_pages(
+            ctx, fetch, f"DKP history for {target.display_name}", False
+        )
+
+    @commands.command(name="dkp_audit")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_audit(self, ctx: commands.Context, *, flags: AuditFlags):
+        """Show the server's DKP log.
+
+        Filters: reason: <exact reason> since: YYYY-MM-DD until: YYYY-MM-DD
+        (dates are UTC; until is inclusive).
+        """
+        try:
+            since = until = None
+            if flags.since:
+                since = datetime.strptime(flags.since, "%Y-%m-%d")
+            if flags.until:
+                until = datetime.strptime(flags.until, "%Y-%m-%d")
+        except ValueError:
+            await ctx.send("Dates must look like `YYYY-MM-DD`.")
+            return
+        if until is not None:
+            until += timedelta(days=1)
+
+        async def fetch(cursor: Optional[tuple[str, int]]):
+            return await get_audit_log(
+                ctx.guild.id,
+                reason=flags.reason,
+                since=since,
+                until=until,
+                before=cursor,
+                limit=HISTORY_PAGE_SIZE,
+            )
+
+        await self._send_log_pages(ctx, fetch, f"{ctx.guild.name} DKP audit log", True)
+
+    # ----------------- export / import -----------------
+
+    @commands.command(name="dkp_export")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_export(
+        self,
+        ctx: commands.Context,
+        what: str = "all",
+        fmt: str = "csv",
+    ):
+        """Export DKP: !dkp_export [balances|log|all] [csv|jsonl]."""
+        what, fmt = what.lower(), fmt.lower()
+        if what not in ("balances", "log", "all"):
+            await ctx.send("Choose `balances`, `log` or `all`.")
+            return
+        if fmt not in transfer_db.EXPORT_FORMATS:
+            await ctx.send("Format must be `csv` or `jsonl`.")
+            return
+
+        tables = ["balances", "log"] if what == "all" else [what]
+        limit = ctx.guild.filesize_limit
+        async with ctx.typing():
+            for table in tables:
+                fp, count = await transfer_db.export(ctx.guild.id, table, fmt)
+                try:
+                    name = f"dkp_{table}_{ctx.guild.id}.{fmt}"
+                    if fp.seek(0, 2) > limit:
+                        fp = await asyncio.to_thread(transfer_db.compress, fp)
+                        name += ".gz"
+                    size = fp.seek(0, 2)
+                    fp.seek(0)
+                    if size > limit:
+                        await ctx.send(
+                            f"The {table} export ({count} rows, {size // 1024} KiB "
+                            f"compressed) is over this server's upload limit."
+                        )
+                        continue
+                    await ctx.send(
+                        f"DKP {table}: {count} row(s).",
+                        file=discord.File(fp, filename=name),
+                    )
+                finally:
+                    fp.close()
+
+    @commands.command(name="dkp_import")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_import(self, ctx: commands.Context):
+        """Import an attached !dkp_export file (CSV/JSONL, optionally .gz).
+
+        Shows a dry-run diff first; nothing changes until it is confirmed.
+        A balances file sets totals, a log file is appended and replayed.
+        """
+        if not ctx.message.attachments:
+            await ctx.send(
+                "Attach a balances or log file from `!dkp_export` "
+                "(CSV or JSONL, optionally gzipped)."
+            )
+            return
+
+        attachment = ctx.message.attachments[0]
+        raw = transfer_db.spool()
+        try:
+            async with ctx.typing():
+                await download_attachment(attachment, raw)
+                preview = await transfer_db.preview_import(ctx.guild.id, raw)
+        except (transfer_db.TransferError, UnicodeDecodeError, aiohttp.ClientError) as e:
+            raw.close()
+            await ctx.send(f"Can't import {attachment.filename}: {e}")
+            return
+        except BaseException:
+            raw.close()
+            raise
+
+        embed = import_preview_embed(ctx.guild, attachment.filename, preview)
+        if preview["errors"] or not preview["rows"]:
+            raw.close()
+            await ctx.send(embed=embed)
+            return
+        await ctx.send(embed=embed, view=ImportConfirmView(self, ctx, raw))
+
+    async def apply_import(self, guild: discord.Guild, raw: IO[bytes]) -> tuple[str, int]:
+        """Apply a file whose preview showed no errors."""
+        try:
+            return await transfer_db.apply_import(guild.id, raw, checked=True)
+        finally:
+            bus = getattr(self.bot, "bus", None)
+            if bus is not None:
+                await bus.publish("standings_invalidate", {"server_ids": [guild.id]})
+
+    # ----------------- stats -----------------
+
+    @app_commands.command(
+        name="dkp_stats",
+        description="DKP statistics for a time window.",
+    )
+    @command_scope()
+    @app_commands.describe(
+        view="What to show",
+        days="How many days back, including today",
+        member="Member for the member view (default: you)",
+        chart="Attach a chart",
+    )
+    async def dkp_stats(
+        self,
+        interaction: discord.Interaction,
+        view: Literal["top", "reasons", "activity", "member"] = "top",
+        days: app_commands.Range[int, 1, 365] = 30,
+        member: Optional[discord.Member] = None,
+        chart: bool = False,
+    ):
+        await interaction.response.defer(thinking=True)
+        embed, png = await stats_embed(
+            interaction.guild, view, days, member or interaction.user, chart
+        )
+        if png is None:
+            await interaction.followup.send(embed=embed)
+        else:
+            await interaction.followup.send(
+                embed=embed,
+                file=discord.File(io.BytesIO(png), filename=STATS_CHART_NAME),
+            )
+
+    # ----------------- decay -----------------
+
+    @commands.command(name="dkp_decay")
+    async def dkp_decay(self, ctx: commands.Context):
+        """Show this server's DKP decay policy."""
+        policy = await decay_db.get_policy(ctx.guild.id)
+        if policy is None:
+            await ctx.send("DKP decay is off for this server.")
+            return
+
+        amount = (
+            f"{policy['amount']}%" if policy["mode"] == "percent"
+            else f"{policy['amount']} DKP"
+        )
+        await ctx.send(
+            f"DKP decays by **{amount}** every **{policy['interval_hours']:g}h** "
+            f"(floor {policy['floor']}). Next run: {policy['next_run']} UTC."
+        )
+
+    @commands.command(name="dkp_decay_set")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_decay_set(
+        self,
+        ctx: commands.Context,
+        mode: str,
+        amount: int,
+        interval_hours: float,
+        floor: int = 0,
+    ):
+        """Set decay: !dkp_decay_set <percent|flat> <amount> <hours> [floor]."""
+        mode = mode.lower()
+        if mode not in ("percent", "flat"):
+            await ctx.send("Mode must be `percent` or `flat`.")
+            return
+        if amount <= 0 or (mode == "percent" and amount > 100):
+            await ctx.send("Amount must be positive (and at most 100 for percent).")
+            return
+        if interval_hours < 1:
+            await ctx.send("Interval must be at least 1 hour.")
+            return
+
+        first_run = await decay_db.set_policy(
+            ctx.guild.id, mode, amount, interval_hours, floor
+        )
+        await ctx.send(
+            f"DKP decay set. First run: {first_run:%Y-%m-%d %H:%M} UTC."
+        )
+
+    @commands.command(name="dkp_decay_off")
+    @commands.has_permissions(manage_guild=True)
+    async def dkp_decay_off(self, ctx: commands.Context):
+        """Turn DKP decay off for this server."""
+        if await decay_db.delete_policy(ctx.guild.id):
+            await ctx.send("DKP decay turned off.")
+        else:
+            await ctx.send("DKP decay was not enabled.")
 
     @dkp_add.error
     @dkp_remove.error
+    @dkp_audit.error
+    @dkp_decay_set.error
+    @dkp_decay_off.error
+    @dkp_add_many.error
+    @dkp_add_role.error
+    @dkp_add_voice.error
+    @dkp_export.error
+    @dkp_import.error
     async def dkp_perm_error(
         self,
         ctx: commands.Context,
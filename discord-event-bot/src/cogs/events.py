@@ -1,149 +1,901 @@
-import os
-import json
-import random
-import string
-from datetime import datetime
+import time
+import asyncio
+from datetime import datetime, timedelta
 from typing import Optional, Literal
 
+import aiohttp
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 
-from db.dkp_db import add_dkp
-
-SERVER_IDS = [
-    1443658842008195205,
-]
-
-PREFS_FILE = "server_prefs.json"
-EVENTS: dict[int, dict] = {}  # event_id -> data
-
-# code -> {guild_id, event_id, amount, creator_id, used_by: set(user_ids)}
-REWARD_CODES: dict[str, dict] = {}
-
-# Load server preferences from JSON
-if os.path.exists(PREFS_FILE):
-    with open(PREFS_FILE, "r", encoding="utf-8") as f:
-        SERVER_PREFS = json.load(f)
-else:
-    SERVER_PREFS = {}
-
-
-def save_prefs() -> None:
-    with open(PREFS_FILE, "w", encoding="utf-8") as f:
-        json.dump(SERVER_PREFS, f, indent=4)
+import config
+from db import attendance_db, events_db, guild_db, outbox_db
+from utils import metrics
+from utils.coalesce import Coalescer
+from utils.commands import command_scope
+from utils.log import get_logger
+from utils.lru import LRUCache
+from utils.prefix_index import PrefixIndex
+from utils.broadcast import BroadcastScheduler, DeliveryFailed
+from utils.scheduler import DeadlineScheduler
+from utils.subscriptions import SubscriptionIndex, load_aliases
+
+
+log = get_logger("events")
+broadcast_log = get_logger("broadcast")
+
+# Outbox rows claimed (and results written) per round trip.
+OUTBOX_BATCH = 100
+# Longest the outbox worker sleeps when nothing is due (seconds).
+OUTBOX_IDLE = 60.0
+# How often finished outbox rows are pruned (seconds).
+OUTBOX_PRUNE_INTERVAL = 3600.0
+# Broadcasts created this recently are re-queued for our guilds on startup,
+# covering a cluster that was down when they were published (seconds).
+OUTBOX_CATCH_UP = 3600.0
+WEBHOOK_NAME = "Event broadcasts"
+# Delay before retrying an attendance payout that failed (seconds).
+ATTENDANCE_RETRY = 30
+
+# Identical /events and /event_search lists asked for at the same time are
+# looked up and rendered once.
+_event_lists = Coalescer("event_list")
+
+
+def parse_day(value: str, end: bool = False) -> Optional[datetime]:
+    """Parse "YYYY-MM-DD" or "YYYY-MM-DD HH:MM" for search windows. A bare
+    date used as the end of a window covers that whole day."""
+    value = value.strip()
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M")
+    except ValueError:
+        pass
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return day + timedelta(days=1) if end else day
+
+
+def pays_attendance(event: dict) -> bool:
+    """Whether an event's DKP reward is paid by voice attendance."""
+    return bool(event.get("voice_channel_id")) and event["dkp_reward"] > 0
+
+
+def participants_text(count: int, limit: Optional[int]) -> str:
+    return f"{count}/{limit}" if limit else str(count)
+
+
+def with_participants(embed: discord.Embed, text: str) -> discord.Embed:
+    """Copy of an event embed with its Participants field set to text."""
+    embed = embed.copy()
+    for index, field in enumerate(embed.fields):
+        if field.name == "Participants":
+            embed.set_field_at(index, name="Participants", value=text, inline=True)
+            return embed
+    return embed.add_field(name="Participants", value=text, inline=True)
+
+
+class RSVPButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"rsvp:(?P<action>join|leave):(?P<event_id>[0-9]+)",
+):
+    """Join/Leave button on event posts.
+
+    The event and action live in the custom_id, so the buttons keep
+    working on every copy of an event (including broadcasts) across
+    restarts without re-registering a view per message.
+    """
+
+    def __init__(self, action: str, event_id: int):
+        joining = action == "join"
+        super().__init__(
+            discord.ui.Button(
+                label="Join" if joining else "Leave",
+                emoji="✅" if joining else "🚪",
+                style=discord.ButtonStyle.success if joining else discord.ButtonStyle.secondary,
+                custom_id=f"rsvp:{action}:{event_id}",
+            )
+        )
+        self.action = action
+        self.event_id = event_id
 
+    @classmethod
+    async def from_custom_id(
+        cls,
+        interaction: discord.Interaction,
+        item: discord.ui.Button,
+        match,
+    ):
+        return cls(match["action"], int(match["event_id"]))
 
-def generate_reward_code(length: int = 8) -> str:
-    alphabet = string.ascii_uppercase + string.digits
-    code = "".join(random.choices(alphabet, k=length))
-    while code in REWARD_CODES:
-        code = "".join(random.choices(alphabet, k=length))
-    return code
+    async def callback(self, interaction: discord.Interaction):
+        cog = interaction.client.get_cog("Events")
+        await cog.handle_rsvp(interaction, self.action, self.event_id)
 
 
-def guild_objects() -> list[discord.Object]:
-    return [discord.Object(id=g_id) for g_id in SERVER_IDS]
+def rsvp_view(event_id: int) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    view.add_item(RSVPButton("join", event_id))
+    view.add_item(RSVPButton("leave", event_id))
+    return view
 
 
 class Events(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.broadcaster = BroadcastScheduler(
+            concurrency=config.BROADCAST_CONCURRENCY,
+            rate=config.BROADCAST_RATE,
+        )
+        self.subscriptions = SubscriptionIndex(load_aliases(config.GAME_ALIASES_FILE))
+        # guild_id -> preferred games (persisted in guild_games)
+        self.prefs: dict[int, list[str]] = {}
+        # guild_id -> events channel id (persisted in guild_settings)
+        self.events_channels: dict[int, int] = {}
+        # guild_id -> whether we may post in that guild's events channel
+        self.can_post: dict[int, bool] = {}
+        # Guilds already set up by on_ready / on_guild_join
+        self.warmed: set[int] = set()
+        # Event reminders, start/end and reward code closing, keyed by
+        # (kind, event_id); rebuilt from the events table on load.
+        self.scheduler = DeadlineScheduler()
+        self.scheduler_task: Optional[asyncio.Task] = None
+        # Events already under way at load whose voice attendance is
+        # counted again once the gateway is ready
+        self.resume_attendance: list[dict] = []
+        # message_id -> last known event message, so RSVP count edits
+        # don't have to fetch it first
+        self.rsvp_messages: LRUCache[int, discord.Message] = LRUCache(
+            config.RSVP_CACHE_SIZE
+        )
+        # event_id -> pending debounced participant count edit
+        self.rsvp_refresh: dict[int, asyncio.Task] = {}
+        # Broadcast outbox worker; woken when deliveries are queued
+        self.outbox_task: Optional[asyncio.Task] = None
+        self.outbox_wake = asyncio.Event()
+        # guild_id -> (webhook id, token) used for broadcasts
+        # (persisted in guild_settings)
+        self.webhooks: dict[int, tuple[int, str]] = {}
+        self.webhook_lock = asyncio.Lock()
+        # Games and genres of known events, for slash command autocomplete
+        self.game_index = PrefixIndex()
+        self.genre_index = PrefixIndex()
+
+    async def cog_load(self):
+        await guild_db.init_db()
+        await events_db.init_db()
+        await outbox_db.init_db()
+        await attendance_db.init_db()
+        self.events_channels = await guild_db.get_events_channels()
+        self.webhooks = await guild_db.get_webhooks()
+        self.prefs = await guild_db.get_all_games()
+        for event in await events_db.get_scheduled_events():
+            self.schedule_event(event)
+            if event["status"] == "started" and pays_attendance(event):
+                self.resume_attendance.append(event)
+        games, genres = await events_db.get_event_terms()
+        self.game_index = PrefixIndex(games)
+        self.genre_index = PrefixIndex(genres)
+        self.scheduler_task = asyncio.create_task(self.run_scheduler())
+        self.outbox_task = asyncio.create_task(self.run_outbox())
+        self.checkpoint_attendance.change_interval(
+            seconds=config.ATTENDANCE_CHECKPOINT_SECONDS
+        )
+        self.checkpoint_attendance.start()
+        self.bot.add_dynamic_items(RSVPButton)
+        bus = getattr(self.bot, "bus", None)
+        if bus is not None:
+            bus.subscribe("event_broadcast", self.on_bus_broadcast)
+            bus.subscribe("rsvp_changed", self.on_bus_rsvp)
+
+    async def cog_unload(self):
+        self.scheduler_task.cancel()
+        self.outbox_task.cancel()
+        self.bot.remove_dynamic_items(RSVPButton)
+        for task in self.rsvp_refresh.values():
+            task.cancel()
+        self.checkpoint_attendance.cancel()
+        # Runs before EventBot.close() stops the DB thread.
+        await attendance_db.checkpoint()
+
+    def index_guild(self, guild: discord.Guild) -> None:
+        """(Re)index a guild's game preferences for broadcast targeting."""
+        self.subscriptions.set_games(guild.id, self.prefs.get(guild.id, []))
 
     # ----------------- helpers -----------------
 
+    async def remember_events_channel(
+        self,
+        guild: discord.Guild,
+        channel: Optional[discord.TextChannel],
+    ) -> None:
+        """Cache (and persist) a guild's events channel; None forgets it."""
+        self.can_post.pop(guild.id, None)
+        channel_id = channel.id if channel else None
+        if self.events_channels.get(guild.id) == channel_id:
+            return
+        if channel_id is None:
+            self.events_channels.pop(guild.id, None)
+        else:
+            self.events_channels[guild.id] = channel_id
+        await guild_db.set_events_channel(guild.id, channel_id)
+        # A broadcast webhook posts to the channel it was made in.
+        await self.forget_broadcast_webhook(guild.id)
+
     async def get_or_create_events_channel(
         self,
         guild: discord.Guild,
     ) -> Optional[discord.TextChannel]:
+        channel_id = self.events_channels.get(guild.id)
+        if channel_id is not None:
+            channel = guild.get_channel(channel_id)
+            if isinstance(channel, discord.TextChannel):
+                return channel
+
         channel = discord.utils.get(guild.text_channels, name="events")
 
         if channel is None:
-            print("events channel doesn't exist")
             try:
                 channel = await guild.create_text_channel("events")
-                print(f"[AUTO] Created 'events' channel in {guild.name}")
+                log.info("Created 'events' channel", extra={"guild_id": guild.id})
             except discord.Forbidden:
-                print(
-                    f"[WARN] Missing permission to create 'events' channel in "
-                    f"{guild.name}"
+                log.warning(
+                    "Missing permission to create 'events' channel",
+                    extra={"guild_id": guild.id},
                 )
                 return None
-            except Exception as e:
-                print(
-                    f"[ERROR] Failed to create 'events' channel in "
-                    f"{guild.name}: {e}"
+            except Exception:
+                log.exception(
+                    "Failed to create 'events' channel", extra={"guild_id": guild.id}
                 )
                 return None
 
+        await self.remember_events_channel(guild, channel)
         return channel
 
+    def can_send(self, channel: discord.TextChannel) -> bool:
+        """Cached send_messages check for a guild's events channel."""
+        allowed = self.can_post.get(channel.guild.id)
+        if allowed is None:
+            allowed = channel.permissions_for(channel.guild.me).send_messages
+            self.can_post[channel.guild.id] = allowed
+        return allowed
+
     async def broadcast_event(
         self,
+        event_id: int,
         game_name: str,
         embed: discord.Embed,
         origin_guild: discord.Guild,
-    ):
-        """Send the event embed to all other guilds that want this game."""
-        for guild in self.bot.guilds:
-            if guild.id == origin_guild.id:
-                continue
-
-            prefs = SERVER_PREFS.get(str(guild.id), [])
-            if prefs and game_name not in prefs:
-                continue
-
-            channel = await self.get_or_create_events_channel(guild)
-            if not channel:
-                print(
-                    f"[BROADCAST] Skipping {guild.name}: "
-                    "no events channel or missing permissions"
+    ) -> int:
+        """Queue the event embed for all other guilds that want this game.
+
+        Deliveries go into the broadcast outbox and are posted by
+        run_outbox, so this returns once they're committed. When running
+        as one of several clusters, the other clusters are told over the
+        bus and queue their own guilds. Returns how many deliveries this
+        process queued.
+        """
+        broadcast_embed = embed.copy()
+        footer_text = broadcast_embed.footer.text or ""
+        if footer_text:
+            footer_text += " • "
+        footer_text += f"From: {origin_guild.name}"
+        broadcast_embed.set_footer(text=footer_text)
+
+        queued = await self.enqueue_broadcast(
+            event_id,
+            {
+                "origin_id": origin_guild.id,
+                "game": game_name,
+                "embed": broadcast_embed.to_dict(),
+            },
+        )
+
+        bus = getattr(self.bot, "bus", None)
+        if bus is not None:
+            await bus.publish("event_broadcast", {"event_id": event_id})
+        return queued
+
+    async def on_bus_broadcast(self, data: dict) -> None:
+        """Queue this process's guilds for a broadcast from another cluster."""
+        broadcast = await outbox_db.get_broadcast(data["event_id"])
+        if broadcast is None:
+            return
+        self.game_index.add(broadcast["game"])
+        await self.enqueue_broadcast(data["event_id"], broadcast)
+
+    async def enqueue_broadcast(self, event_id: int, broadcast: dict) -> int:
+        """Add outbox rows for the guilds this process holds that want it."""
+        targets = [
+            guild_id
+            for guild_id in self.subscriptions.targets(broadcast["game"])
+            if guild_id != broadcast["origin_id"]
+            and self.bot.get_guild(guild_id) is not None
+        ]
+        queued = await outbox_db.enqueue(event_id, targets, broadcast)
+        if queued:
+            broadcast_log.info(
+                "Queued broadcast", extra={"event_id": event_id, "guilds": queued}
+            )
+            self.outbox_wake.set()
+        return queued
+
+    async def catch_up_broadcasts(self) -> None:
+        """Queue recent broadcasts this process may have missed while down.
+
+        Deliveries already in the outbox are left alone, so this only adds
+        guilds whose cluster wasn't running when the event was created.
+        """
+        since = time.time() - OUTBOX_CATCH_UP
+        for broadcast in await outbox_db.get_broadcasts_since(since):
+            await self.enqueue_broadcast(broadcast["event_id"], broadcast)
+
+    # ----------------- broadcast outbox -----------------
+
+    def local_shards(self) -> outbox_db.Shards:
+        """The shards whose guilds this process delivers to (None = all)."""
+        shard_ids = getattr(self.bot, "shard_ids", None)
+        if shard_ids is None or not self.bot.shard_count:
+            return None
+        return self.bot.shard_count, list(shard_ids)
+
+    async def run_outbox(self) -> None:
+        """Deliver queued broadcasts until the cog is unloaded."""
+        await self.bot.wait_until_ready()
+        shards = self.local_shards()
+        released = await outbox_db.release_in_doubt(shards)
+        if released:
+            broadcast_log.info(
+                "Resuming interrupted deliveries", extra={"deliveries": released}
+            )
+
+        pruned_at = 0.0
+        while True:
+            try:
+                if time.monotonic() - pruned_at > OUTBOX_PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    await outbox_db.prune(
+                        time.time() - config.BROADCAST_OUTBOX_DAYS * 86400
+                    )
+
+                # Cleared before looking, so an enqueue that lands while we
+                # deliver or query isn't slept through.
+                self.outbox_wake.clear()
+                rows = await outbox_db.claim(shards, OUTBOX_BATCH)
+                if rows:
+                    await self.deliver_outbox(rows)
+                    continue
+
+                due = await outbox_db.next_due(shards)
+                delay = OUTBOX_IDLE if due is None else due - time.time()
+            except Exception:
+                broadcast_log.exception("Outbox worker error")
+                delay = OUTBOX_IDLE
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(
+                        self.outbox_wake.wait(), timeout=min(delay, OUTBOX_IDLE)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def deliver_outbox(self, rows: list[dict]) -> None:
+        """Post one claimed batch and record every outcome in one write."""
+        broadcasts = {}
+        for event_id in {row["event_id"] for row in rows}:
+            broadcast = await outbox_db.get_broadcast(event_id)
+            if broadcast is not None:
+                broadcasts[event_id] = (
+                    discord.Embed.from_dict(broadcast["embed"]),
+                    rsvp_view(event_id),
+                )
+
+        results: list[dict] = []
+
+        async def deliver(row: dict) -> bool:
+            try:
+                result = await self.deliver_row(row, broadcasts.get(row["event_id"]))
+            except Exception as e:
+                # Anything deliver_row didn't expect (network errors,
+                # timeouts, bugs) must still release the claimed row, or it
+                # stays 'sending' until the next start.
+                results.append(
+                    {**row, "outcome": "retry", "error": repr(e), "in_doubt": True}
                 )
-                continue
+                raise DeliveryFailed(repr(e)) from e
+            results.append({**row, **result})
+            if result["outcome"] in ("retry", "failed"):
+                raise DeliveryFailed(result["error"])
+            return result["outcome"] == "sent"
+
+        try:
+            stats = await self.broadcaster.fan_out(rows, deliver)
+        finally:
+            await outbox_db.record(results)
+        broadcast_log.info(
+            "Outbox batch delivered",
+            extra={
+                "sent": stats.sent,
+                "skipped": stats.skipped,
+                "failed": stats.failed,
+                "rate_limited": stats.rate_limited,
+                "latency_ms": round(stats.elapsed * 1000, 1),
+            },
+        )
 
-            broadcast_embed = embed.copy()
-            footer_text = broadcast_embed.footer.text or ""
-            if footer_text:
-                footer_text += " • "
-            footer_text += f"From: {origin_guild.name}"
-            broadcast_embed.set_footer(text=footer_text)
+    async def deliver_row(
+        self,
+        row: dict,
+        broadcast: Optional[tuple[discord.Embed, discord.ui.View]],
+    ) -> dict:
+        """Post one outbox row; returns its outcome for outbox_db.record."""
+        guild = self.bot.get_guild(row["guild_id"])
+        if guild is None or broadcast is None:
+            return {"outcome": "skipped", "error": "guild or broadcast is gone"}
+        embed, view = broadcast
+
+        channel = await self.get_or_create_events_channel(guild)
+        if channel is None:
+            broadcast_log.info(
+                "Skipping guild without events channel",
+                extra={"guild_id": guild.id, "event_id": row["event_id"], "sample": "no_channel"},
+            )
+            return {"outcome": "skipped", "error": "no events channel"}
+        if not self.can_send(channel):
+            broadcast_log.info(
+                "Cannot send messages in events channel",
+                extra={
+                    "guild_id": guild.id,
+                    "channel_id": channel.id,
+                    "event_id": row["event_id"],
+                    "sample": "no_permission",
+                },
+            )
+            return {"outcome": "skipped", "error": "missing permissions"}
+
+        webhook = None
+        try:
+            message = None
+            if row["in_doubt"]:
+                # An earlier attempt may have been posted after all.
+                message = await self.find_broadcast(channel, row["event_id"])
+            if message is None:
+                if config.BROADCAST_WEBHOOKS:
+                    webhook = await self.get_broadcast_webhook(channel)
+                if webhook is not None:
+                    message = await webhook.send(embed=embed, view=view, wait=True)
+                else:
+                    message = await channel.send(
+                        embed=embed,
+                        view=view,
+                        nonce=outbox_db.delivery_nonce(row["event_id"], guild.id),
+                    )
+        except discord.RateLimited as e:
+            metrics.RATE_LIMITED.inc(source="broadcast")
+            return {"outcome": "retry", "error": f"rate limited ({e.retry_after:.0f}s)"}
+        except discord.HTTPException as e:
+            error = f"{e.status} {e.text}"
+            if e.status >= 500:
+                return {"outcome": "retry", "error": error, "in_doubt": True}
+            if webhook is not None and e.status in (401, 403, 404):
+                # Webhook deleted or revoked; the retry makes a new one.
+                await self.forget_broadcast_webhook(guild.id)
+                return {"outcome": "retry", "error": error}
+            if e.status == 403:
+                # Re-checked on the next attempt, which skips if still denied.
+                self.can_post.pop(guild.id, None)
+                return {"outcome": "retry", "error": error}
+            if e.status == 404:
+                await self.remember_events_channel(guild, None)
+                return {"outcome": "retry", "error": error}
+            return {"outcome": "failed", "error": error}
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            # The request may or may not have reached Discord.
+            return {"outcome": "retry", "error": repr(e), "in_doubt": True}
+
+        self.rsvp_messages.set(message.id, message)
+        broadcast_log.debug(
+            "Broadcast sent",
+            extra={"guild_id": guild.id, "event_id": row["event_id"], "sample": "sent"},
+        )
+        return {
+            "outcome": "sent",
+            "channel_id": channel.id,
+            "message_id": message.id,
+            "webhook_id": message.webhook_id,
+        }
 
-            if channel.permissions_for(guild.me).send_messages:
+    async def find_broadcast(
+        self,
+        channel: discord.TextChannel,
+        event_id: int,
+    ) -> Optional[discord.Message]:
+        """Look for an already posted copy of an event in recent history."""
+        marker = f"Event ID: {event_id} "
+        webhook = self.webhooks.get(channel.guild.id)
+        try:
+            async for message in channel.history(limit=50):
+                if message.author.id != self.bot.user.id and (
+                    webhook is None or message.webhook_id != webhook[0]
+                ):
+                    continue
+                if any((e.footer.text or "").startswith(marker) for e in message.embeds):
+                    return message
+        except discord.Forbidden:
+            pass
+        return None
+
+    async def get_broadcast_webhook(
+        self,
+        channel: discord.TextChannel,
+    ) -> Optional[discord.Webhook]:
+        """The guild's broadcast webhook, created on first use if allowed."""
+        async with self.webhook_lock:
+            stored = self.webhooks.get(channel.guild.id)
+            if stored is not None:
+                return discord.Webhook.partial(*stored, client=self.bot)
+            if not channel.permissions_for(channel.guild.me).manage_webhooks:
+                return None
+            try:
+                # Reuse one we made before (e.g. if the database was reset)
+                # rather than piling up webhooks in the channel.
+                webhook = discord.utils.find(
+                    lambda w: w.name == WEBHOOK_NAME
+                    and w.token is not None
+                    and w.user is not None
+                    and w.user.id == self.bot.user.id,
+                    await channel.webhooks(),
+                )
+                if webhook is None:
+                    webhook = await channel.create_webhook(
+                        name=WEBHOOK_NAME, reason="Event broadcasts"
+                    )
+            except discord.HTTPException as e:
+                broadcast_log.warning(
+                    "Could not create webhook: %s", e, extra={"guild_id": channel.guild.id}
+                )
+                return None
+            self.webhooks[channel.guild.id] = (webhook.id, webhook.token)
+            await guild_db.set_webhook(channel.guild.id, (webhook.id, webhook.token))
+            return webhook
+
+    async def forget_broadcast_webhook(self, guild_id: int) -> None:
+        if self.webhooks.pop(guild_id, None) is not None:
+            await guild_db.set_webhook(guild_id, None)
+
+    # ----------------- event lifecycle -----------------
+
+    def schedule_event(self, event: dict) -> None:
+        """Queue an event's pending reminder, start, end and code closing.
+
+        `event` is a dict as returned by events_db.get_scheduled_events().
+        """
+        key = event["id"]
+        lead = timedelta(minutes=config.EVENT_REMINDER_MINUTES)
+        if event["start"] and event["status"] == "scheduled":
+            if lead and not event["reminder_sent"]:
+                self.scheduler.schedule(("remind", key), event["start"] - lead, event)
+            self.scheduler.schedule(("start", key), event["start"], event)
+        if event["end"] and event["status"] != "ended":
+            self.scheduler.schedule(("end", key), event["end"], event)
+        if event["code_expires_at"]:
+            self.scheduler.schedule(("close", key), event["code_expires_at"], event)
+
+    async def run_scheduler(self) -> None:
+        await self.bot.wait_until_ready()
+        # Needs the voice channels' members, so only once we're ready.
+        for event in self.resume_attendance:
+            if self.holds_guild(event["guild_id"]):
+                await self.track_attendance(event)
+        self.resume_attendance = []
+        log.info("Event deadlines loaded", extra={"pending": len(self.scheduler)})
+        await self.scheduler.run(self.on_deadline)
+
+    async def notify(self, guild: Optional[discord.Guild], text: str) -> None:
+        """Post a lifecycle notice to a guild's events channel, if possible."""
+        if guild is None:
+            return
+        channel = await self.get_or_create_events_channel(guild)
+        if channel is None or not self.can_send(channel):
+            return
+        await channel.send(text)
+
+    def holds_guild(self, guild_id: int) -> bool:
+        """False if another cluster holds this guild and runs its deadlines."""
+        return (
+            self.bot.get_guild(guild_id) is not None
+            or getattr(self.bot, "cluster_id", None) is None
+        )
+
+    async def on_deadline(self, key: tuple[str, int], event: dict) -> None:
+        kind, event_id = key
+        guild = self.bot.get_guild(event["guild_id"])
+        if not self.holds_guild(event["guild_id"]):
+            return
+
+        now = datetime.now()
+        name = event["name"]
+
+        if kind == "remind":
+            await events_db.mark_reminded(event_id)
+            # Skip reminders that came due while the bot was offline.
+            if now < event["start"]:
+                minutes = max(1, round((event["start"] - now).total_seconds() / 60))
+                await self.notify(
+                    guild, f"⏰ **{name}** starts in {minutes} minute(s)."
+                )
+
+        elif kind == "start":
+            await events_db.set_event_status(event_id, "started")
+            if event["end"] is None or now < event["end"]:
+                if pays_attendance(event):
+                    await self.track_attendance(event)
+                await self.notify(guild, f"▶️ **{name}** is starting now!")
+
+        elif kind == "end":
+            text = f"🏁 **{name}** has ended."
+            if pays_attendance(event):
                 try:
-                    await channel.send(embed=broadcast_embed)
-                    print(f"[BROADCAST] Event sent to {guild.name}")
-                except discord.Forbidden:
-                    print(
-                        f"[ERROR] Cannot send message to events channel in "
-                        f"{guild.name}"
+                    awards = await self.award_attendance(event)
+                except Exception:
+                    log.exception("Failed to award attendance", extra={"event_id": event_id})
+                    self.scheduler.schedule(
+                        key, now + timedelta(seconds=ATTENDANCE_RETRY), event
                     )
-            else:
-                print(
-                    f"[WARN] Cannot send messages in "
-                    f"{guild.name}#{channel.name}"
+                    return
+                if awards:
+                    text += (
+                        f" {len(awards)} member(s) earned "
+                        f"{sum(a for a, _ in awards.values())} DKP for attending."
+                    )
+            await events_db.set_event_status(event_id, "ended")
+            if event["code_expires_at"] and event["code_expires_at"] > now:
+                text += (
+                    " Reward codes can be redeemed until "
+                    f"{event['code_expires_at'].strftime('%Y-%m-%d %H:%M')}."
                 )
+            await self.notify(guild, text)
+
+        elif kind == "close":
+            closed = await events_db.close_reward_codes(event_id)
+            if closed:
+                log.info("Closed reward codes", extra={"event_id": event_id, "codes": closed})
+
+    # ----------------- voice attendance -----------------
+
+    async def track_attendance(self, event: dict) -> None:
+        """Start counting who is in an event's voice channel."""
+        channel = self.bot.get_channel(event["voice_channel_id"])
+        members = [m.id for m in getattr(channel, "members", []) if not m.bot]
+        await attendance_db.track(event, members)
+
+    async def award_attendance(self, event: dict) -> dict[int, tuple[int, int]]:
+        """Pay an event's attendance DKP; returns {user_id: (DKP, new total)}.
+
+        Ends the event in the same transaction, so a retry after a crash
+        or by another deadline never pays twice.
+        """
+        # Not tracked if the bot was down for the whole event; whatever was
+        # checkpointed is still paid.
+        await attendance_db.track(event, [])
+        _, awards = await attendance_db.finish(event["id"])
+        log.info(
+            "Awarded attendance DKP",
+            extra={
+                "guild_id": event["guild_id"],
+                "event_id": event["id"],
+                "members": len(awards),
+            },
+        )
+        return awards
+
+    @tasks.loop(seconds=60)
+    async def checkpoint_attendance(self):
+        try:
+            await attendance_db.checkpoint()
+        except Exception:
+            log.exception("Failed to save attendance")
+
+    # ----------------- RSVPs -----------------
+
+    async def handle_rsvp(
+        self,
+        interaction: discord.Interaction,
+        action: str,
+        event_id: int,
+    ) -> None:
+        # Acknowledge first: a click must be answered within 3 seconds
+        # even while the DB thread is busy with a burst of them.
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if interaction.message is not None:
+            self.rsvp_messages.set(interaction.message.id, interaction.message)
+
+        user_id = interaction.user.id
+        if action == "join":
+            status, roster = await events_db.join_event(event_id, user_id)
+        else:
+            status, roster = await events_db.leave_event(event_id, user_id)
+
+        if roster is None:
+            await interaction.followup.send(
+                "❌ This event no longer exists.", ephemeral=True
+            )
+            return
+
+        name = roster["name"]
+        count = participants_text(len(roster["members"]), roster["limit"])
+        replies = {
+            "ok": (
+                f"✅ You're signed up for **{name}** ({count})."
+                if action == "join"
+                else f"🚪 You left **{name}** ({count})."
+            ),
+            "already": f"You're already signed up for **{name}**.",
+            "not_joined": f"You weren't signed up for **{name}**.",
+            "full": f"❌ **{name}** is full ({count}).",
+            "closed": f"❌ **{name}** has already ended.",
+        }
+        await interaction.followup.send(replies[status], ephemeral=True)
+
+        if status == "ok":
+            self.schedule_rsvp_refresh(event_id)
+            bus = getattr(self.bot, "bus", None)
+            if bus is not None:
+                await bus.publish("rsvp_changed", {"event_id": event_id})
+
+    async def on_bus_rsvp(self, data: dict) -> None:
+        """Another cluster changed an event's roster: reload and re-render."""
+        events_db.forget_roster(data["event_id"])
+        self.schedule_rsvp_refresh(data["event_id"])
+
+    def schedule_rsvp_refresh(self, event_id: int) -> None:
+        """Edit the event's posts after RSVP_EDIT_DELAY, batching changes."""
+        if event_id not in self.rsvp_refresh:
+            self.rsvp_refresh[event_id] = asyncio.create_task(
+                self.refresh_rsvp(event_id)
+            )
+
+    async def refresh_rsvp(self, event_id: int) -> None:
+        try:
+            await asyncio.sleep(config.RSVP_EDIT_DELAY)
+        finally:
+            # Changes from here on schedule another refresh.
+            self.rsvp_refresh.pop(event_id, None)
+
+        roster = await events_db.get_roster(event_id)
+        if roster is None:
+            return
+        text = participants_text(len(roster["members"]), roster["limit"])
+
+        targets = [
+            target
+            for target in await events_db.get_event_messages(event_id)
+            if self.bot.get_guild(target[0]) is not None
+        ]
+
+        async def edit(target: events_db.EventMessage) -> bool:
+            guild_id, channel_id, message_id, webhook_id = target
+            webhook = None
+            if webhook_id is not None:
+                # Webhook posts can only be edited through that webhook.
+                stored = self.webhooks.get(guild_id)
+                if stored is None or stored[0] != webhook_id:
+                    return False
+                webhook = discord.Webhook.partial(*stored, client=self.bot)
+
+            message = self.rsvp_messages.get(message_id)
+            if message is None:
+                if webhook is not None:
+                    message = await webhook.fetch_message(message_id)
+                else:
+                    channel = self.bot.get_channel(channel_id)
+                    if channel is None:
+                        return False
+                    message = await channel.fetch_message(message_id)
+            if not message.embeds:
+                return False
+
+            embed = with_participants(message.embeds[0], text)
+            if webhook is not None:
+                message = await webhook.edit_message(message_id, embed=embed)
+            else:
+                message = await message.edit(embed=embed)
+            self.rsvp_messages.set(message_id, message)
+            return True
+
+        await self.broadcaster.fan_out(targets, edit)
 
     # ----------------- listeners -----------------
 
+    async def warm_guild(self, guild: discord.Guild) -> None:
+        """Index a guild's preferences and resolve its events channel."""
+        self.index_guild(guild)
+        await self.get_or_create_events_channel(guild)
+        self.warmed.add(guild.id)
+
     @commands.Cog.listener()
     async def on_ready(self):
-        # Create events channel + sync slash commands in each guild
-        for guild in self.bot.guilds:
-            await self.get_or_create_events_channel(guild)
-            try:
-                await self.bot.tree.sync(guild=guild)
-                print(f"[SLASH] Synced commands for {guild.name} ({guild.id})")
-            except Exception as e:
-                print(f"[SLASH] Failed to sync for {guild.name}: {e}")
+        # on_ready fires again after reconnects; only warm guilds we haven't
+        # seen yet. Slash commands are synced once in EventBot.setup_hook.
+        pending = [g for g in self.bot.guilds if g.id not in self.warmed]
+        if not pending:
+            return
+
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(config.STARTUP_CONCURRENCY)
+
+        async def warm(guild: discord.Guild) -> None:
+            async with semaphore:
+                try:
+                    await self.warm_guild(guild)
+                except Exception:
+                    log.exception("Failed to warm guild", extra={"guild_id": guild.id})
+
+        await asyncio.gather(*(warm(g) for g in pending))
+        log.info(
+            "Warmed guilds",
+            extra={
+                "guilds": len(pending),
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            },
+        )
+        # Needs the guilds indexed to know who wants what.
+        await self.catch_up_broadcasts()
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
-        await self.get_or_create_events_channel(guild)
-        try:
-            await self.bot.tree.sync(guild=guild)
-            print(f"[SLASH] Synced commands for new guild {guild.name}")
-        except Exception as e:
-            print(f"[SLASH] Failed to sync for new guild {guild.name}: {e}")
+        await self.warm_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.warmed.discard(guild.id)
+        self.subscriptions.remove_guild(guild.id)
+        self.can_post.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        if self.events_channels.get(channel.guild.id) == channel.id:
+            await self.remember_events_channel(channel.guild, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(
+        self,
+        before: discord.abc.GuildChannel,
+        after: discord.abc.GuildChannel,
+    ):
+        if self.events_channels.get(after.guild.id) == after.id:
+            # Overwrites may have changed; re-check on next use.
+            self.can_post.pop(after.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if after.permissions != before.permissions:
+            self.can_post.pop(after.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        # Mutes, deafens and streams come through here too; only moves
+        # between channels matter, and they only touch memory.
+        if member.bot or before.channel == after.channel:
+            return
+        attendance_db.moved(
+            member.id,
+            before.channel.id if before.channel else None,
+            after.channel.id if after.channel else None,
+        )
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after.id == self.bot.user.id and before.roles != after.roles:
+            self.can_post.pop(after.guild.id, None)
 
     # ----------------- prefix debug -----------------
 
@@ -157,7 +909,7 @@ class Events(commands.Cog):
         name="set_games",
         description="Set games your server wants events for.",
     )
-    @app_commands.guilds(*guild_objects())
+    @command_scope()
     @app_commands.describe(
         games="Comma-separated list of games (e.g. Valorant, LoL, CS2)"
     )
@@ -174,21 +926,72 @@ class Events(commands.Cog):
             )
             return
 
-        SERVER_PREFS[str(interaction.guild.id)] = game_list
-        save_prefs()
+        await guild_db.set_games(interaction.guild.id, game_list)
+        self.prefs[interaction.guild.id] = game_list
+        self.subscriptions.set_games(interaction.guild.id, game_list)
 
         await interaction.response.send_message(
             f"✅ Event preferences updated: {', '.join(game_list)}",
             ephemeral=True,
         )
 
+    # ----------------- /set_events_channel -----------------
+
+    @app_commands.command(
+        name="set_events_channel",
+        description="Choose the channel events are posted to.",
+    )
+    @command_scope()
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.describe(channel="Channel for event announcements")
+    async def set_events_channel(
+        self,
+        interaction: discord.Interaction,
+        channel: discord.TextChannel,
+    ):
+        if not channel.permissions_for(interaction.guild.me).send_messages:
+            await interaction.response.send_message(
+                f"❌ I can't send messages in {channel.mention}.",
+                ephemeral=True,
+            )
+            return
+
+        await self.remember_events_channel(interaction.guild, channel)
+
+        await interaction.response.send_message(
+            f"✅ Events will be posted in {channel.mention}.",
+            ephemeral=True,
+        )
+
+    # ----------------- autocomplete -----------------
+
+    async def game_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in self.game_index.complete(current)
+        ]
+
+    async def genre_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in self.genre_index.complete(current)
+        ]
+
     # ----------------- /create_event -----------------
 
     @app_commands.command(
         name="create_event",
         description="Create a gaming event.",
     )
-    @app_commands.guilds(*guild_objects())
+    @command_scope()
     @app_commands.describe(
         event_name="Name of the event",
         genre="Genre of the event",
@@ -199,7 +1002,9 @@ class Events(commands.Cog):
         start_time="Start time (YYYY-MM-DD HH:MM)",
         end_time="End time (YYYY-MM-DD HH:MM)",
         dkp_reward="DKP reward for this event (0 = none)",
+        voice_channel="Pay the DKP reward by time spent in this voice channel",
     )
+    @app_commands.autocomplete(genre=genre_autocomplete, game_name=game_autocomplete)
     async def create_event(
         self,
         interaction: discord.Interaction,
@@ -212,6 +1017,7 @@ class Events(commands.Cog):
         start_time: Optional[str] = None,
         end_time: Optional[str] = None,
         dkp_reward: Optional[int] = None,
+        voice_channel: Optional[discord.VoiceChannel] = None,
     ):
         # Parse start time
         if start_time is not None:
@@ -249,33 +1055,60 @@ class Events(commands.Cog):
             )
             return
 
-        event_id = len(EVENTS) + 1
-
-        EVENTS[event_id] = {
-            "name": event_name,
-            "genre": genre,
-            "game": game_name,
-            "start": start_dt,
-            "end": end_dt,
-            "limit": user_limit,
-            "type": event_type,
-            "creator": interaction.user.id,
-            "description": description,
-            "dkp_reward": dkp_reward,
-            "reward_code": None,
-        }
+        if voice_channel is not None:
+            if start_dt is None or end_dt is None or end_dt <= start_dt:
+                await interaction.response.send_message(
+                    "❌ Voice attendance needs a start time and a later end time.",
+                    ephemeral=True,
+                )
+                return
+            if dkp_reward == 0:
+                await interaction.response.send_message(
+                    "❌ Set a DKP reward to pay for voice attendance.",
+                    ephemeral=True,
+                )
+                return
 
-        reward_code: Optional[str] = None
-        if dkp_reward > 0:
-            reward_code = generate_reward_code()
-            EVENTS[event_id]["reward_code"] = reward_code
-            REWARD_CODES[reward_code] = {
+        # Everything below may take a while (broadcasts), so acknowledge the
+        # interaction now instead of racing the 3-second deadline.
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        event_id, reward_code = await events_db.create_event(
+            {
                 "guild_id": interaction.guild.id,
-                "event_id": event_id,
-                "amount": dkp_reward,
-                "creator_id": interaction.user.id,
-                "used_by": set(),
+                "name": event_name,
+                "genre": genre,
+                "game": game_name,
+                "start": start_dt,
+                "end": end_dt,
+                "limit": user_limit,
+                "type": event_type,
+                "creator": interaction.user.id,
+                "description": description,
+                "dkp_reward": dkp_reward,
+                "voice_channel_id": voice_channel.id if voice_channel else None,
             }
+        )
+
+        self.game_index.add(game_name)
+        self.genre_index.add(genre)
+
+        # Also warms the code cache for the redemptions that will follow.
+        code_info = await events_db.get_reward_code(reward_code) if reward_code else None
+        self.schedule_event(
+            {
+                "id": event_id,
+                "guild_id": interaction.guild.id,
+                "name": event_name,
+                "start": start_dt,
+                "end": end_dt,
+                "status": "scheduled",
+                "reminder_sent": False,
+                "dkp_reward": dkp_reward,
+                "voice_channel_id": voice_channel.id if voice_channel else None,
+                "code_expires_at": code_info["expires_at"] if code_info else None,
+            }
+        )
 
         embed = discord.Embed(
             title=f"🎮 Event: {event_name}",
@@ -301,12 +1134,11 @@ class Events(commands.Cog):
                 inline=False,
             )
 
-        if user_limit:
-            embed.add_field(
-                name="Participants",
-                value=str(user_limit),
-                inline=True,
-            )
+        embed.add_field(
+            name="Participants",
+            value=participants_text(0, user_limit),
+            inline=True,
+        )
 
         embed.add_field(
             name="Event Type",
@@ -317,7 +1149,11 @@ class Events(commands.Cog):
         if dkp_reward > 0:
             embed.add_field(
                 name="DKP Reward",
-                value=f"{dkp_reward} DKP (via reward code)",
+                value=(
+                    f"{dkp_reward} DKP (by attendance in {voice_channel.mention})"
+                    if voice_channel
+                    else f"{dkp_reward} DKP (via reward code)"
+                ),
                 inline=True,
             )
 
@@ -333,29 +1169,193 @@ class Events(commands.Cog):
 
         channel = await self.get_or_create_events_channel(interaction.guild)
         if channel is None:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "Events channel not found or cannot be created.",
                 ephemeral=True,
             )
             return
 
-        await channel.send(embed=embed)
-
-        if event_type.lower() == "public":
-            await self.broadcast_event(game_name, embed, interaction.guild)
+        posted = await channel.send(embed=embed, view=rsvp_view(event_id))
+        self.rsvp_messages.set(posted.id, posted)
+        await events_db.add_event_messages(
+            event_id, [(interaction.guild.id, channel.id, posted.id, None)]
+        )
 
+        message = "✅ Event created."
         if reward_code:
-            await interaction.response.send_message(
-                "✅ Event created.\n"
+            message += (
+                "\n"
                 f"Your DKP reward code is: `{reward_code}`\n"
-                "Share this code with participants you want to reward.",
-                ephemeral=True,
+                "Share this code with participants you want to reward."
             )
-        else:
+
+        if event_type.lower() == "public":
+            queued = await self.broadcast_event(
+                event_id, game_name, embed, interaction.guild
+            )
+            message += f"\n📣 Broadcast queued for {queued} server(s)."
+            if getattr(self.bot, "bus", None) is not None:
+                message += " Other clusters were notified."
+
+        await interaction.followup.send(message, ephemeral=True)
+
+    # ----------------- /events, /event_search -----------------
+
+    async def send_event_list(
+        self,
+        interaction: discord.Interaction,
+        title: str,
+        empty: str,
+        text: Optional[str],
+        game: Optional[str],
+        genre: Optional[str],
+        event_type: Optional[str],
+        from_date: Optional[str],
+        to_date: Optional[str],
+    ) -> None:
+        """Shared body of /events and /event_search."""
+        after = parse_day(from_date) if from_date else None
+        before = parse_day(to_date, end=True) if to_date else None
+        if (from_date and after is None) or (to_date and before is None):
             await interaction.response.send_message(
-                "✅ Event created.",
+                "❌ Invalid date. Use: `YYYY-MM-DD` or `YYYY-MM-DD HH:MM`",
                 ephemeral=True,
             )
+            return
+
+        key = (interaction.guild.id, title, text, game, genre, event_type, after, before)
+        embed = await _event_lists.run(
+            key,
+            lambda: self.event_list_embed(
+                interaction.guild.id, title, text, game, genre, event_type, after, before
+            ),
+        )
+        if embed is None:
+            await interaction.response.send_message(empty, ephemeral=True)
+            return
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    async def event_list_embed(
+        self,
+        guild_id: int,
+        title: str,
+        text: Optional[str],
+        game: Optional[str],
+        genre: Optional[str],
+        event_type: Optional[str],
+        after: Optional[datetime],
+        before: Optional[datetime],
+    ) -> Optional[discord.Embed]:
+        """Look up and render an event list; None if nothing matches."""
+        # One extra row tells us whether there are more than we show.
+        found = await events_db.search_events(
+            guild_id,
+            text=text,
+            game=game,
+            genre=genre,
+            event_type=event_type,
+            after=after,
+            before=before,
+            limit=events_db.SEARCH_LIMIT + 1,
+        )
+        if not found:
+            return None
+
+        embed = discord.Embed(title=title, color=discord.Color.blurple())
+        for event in found[: events_db.SEARCH_LIMIT]:
+            when = event["start"].strftime("%Y-%m-%d %H:%M") if event["start"] else "No start time"
+            details = [
+                event["game"] or "Any game",
+                event["genre"] or "Any genre",
+                when,
+                event["type"].capitalize(),
+            ]
+            if event["status"] != "scheduled":
+                details.append(event["status"].capitalize())
+            if event["guild_id"] != guild_id:
+                origin = self.bot.get_guild(event["guild_id"])
+                if origin is not None:
+                    details.append(f"From: {origin.name}")
+            embed.add_field(
+                name=f"#{event['id']} {event['name']}"[:256],
+                value=" • ".join(details)[:1024],
+                inline=False,
+            )
+        if len(found) > events_db.SEARCH_LIMIT:
+            embed.set_footer(
+                text=f"Showing the first {events_db.SEARCH_LIMIT}; narrow the filters to see more."
+            )
+        return embed
+
+    @app_commands.command(
+        name="events",
+        description="List upcoming events, or events in a date range.",
+    )
+    @command_scope()
+    @app_commands.describe(
+        game="Only events for this game",
+        genre="Only events of this genre",
+        event_type="Only public or private events",
+        from_date="Events starting on or after (YYYY-MM-DD)",
+        to_date="Events starting on or before (YYYY-MM-DD)",
+    )
+    @app_commands.autocomplete(game=game_autocomplete, genre=genre_autocomplete)
+    async def list_events(
+        self,
+        interaction: discord.Interaction,
+        game: Optional[str] = None,
+        genre: Optional[str] = None,
+        event_type: Optional[Literal["public", "private"]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ):
+        await self.send_event_list(
+            interaction,
+            "📅 Events",
+            "No events found.",
+            None,
+            game,
+            genre,
+            event_type,
+            from_date,
+            to_date,
+        )
+
+    @app_commands.command(
+        name="event_search",
+        description="Search events by name and description.",
+    )
+    @command_scope()
+    @app_commands.describe(
+        query="Words to look for in event names and descriptions",
+        game="Only events for this game",
+        genre="Only events of this genre",
+        event_type="Only public or private events",
+        from_date="Events starting on or after (YYYY-MM-DD)",
+        to_date="Events starting on or before (YYYY-MM-DD)",
+    )
+    @app_commands.autocomplete(game=game_autocomplete, genre=genre_autocomplete)
+    async def event_search(
+        self,
+        interaction: discord.Interaction,
+        query: str,
+        game: Optional[str] = None,
+        genre: Optional[str] = None,
+        event_type: Optional[Literal["public", "private"]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ):
+        await self.send_event_list(
+            interaction,
+            f"🔎 Events matching “{query}”"[:256],
+            f"No events match “{query}”.",
+            query,
+            game,
+            genre,
+            event_type,
+            from_date,
+            to_date,
+        )
 
     # ----------------- /redeem_dkp -----------------
 
@@ -363,7 +1363,7 @@ class Events(commands.Cog):
         name="redeem_dkp",
         description="Redeem a DKP reward code from an event.",
     )
-    @app_commands.guilds(*guild_objects())
+    @command_scope()
     @app_commands.describe(
         code="The DKP reward code you received from an event."
     )
@@ -374,44 +1374,42 @@ class Events(commands.Cog):
     ):
         code = code.strip().upper()
 
-        if code not in REWARD_CODES:
-            await interaction.response.send_message(
+        # The redemption is a DB write (possibly queued behind a
+        # write-behind batch); acknowledge first so a burst of redemptions
+        # can't run past the 3-second deadline.
+        await interaction.response.defer(ephemeral=True)
+
+        status, info, new_total = await events_db.redeem_code(
+            code,
+            interaction.guild.id,
+            interaction.user.id,
+        )
+
+        if status in ("invalid", "expired"):
+            await interaction.followup.send(
                 "❌ Invalid or expired code.",
                 ephemeral=True,
             )
             return
 
-        info = REWARD_CODES[code]
-
-        if info["guild_id"] != interaction.guild.id:
-            await interaction.response.send_message(
+        if status == "wrong_guild":
+            await interaction.followup.send(
                 "❌ This code does not belong to this server.",
                 ephemeral=True,
             )
             return
 
-        if interaction.user.id in info["used_by"]:
-            await interaction.response.send_message(
+        if status == "already":
+            await interaction.followup.send(
                 "❌ You have already redeemed this code.",
                 ephemeral=True,
             )
             return
 
         amount = info["amount"]
-        event_id = info["event_id"]
-        event_data = EVENTS.get(event_id)
-        event_name = event_data["name"] if event_data else f"Event {event_id}"
-
-        new_total = add_dkp(
-            server_id=interaction.guild.id,
-            user_id=interaction.user.id,
-            amount=amount,
-            reason=f"Event reward ({event_name})",
-        )
-
-        info["used_by"].add(interaction.user.id)
+        event_name = info["event_name"]
 
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"✅ You received **{amount} DKP** for `{event_name}`.\n"
             f"Your new total DKP: **{new_total}**.",
             ephemeral=True,
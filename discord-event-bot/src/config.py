@@ -0,0 +1,195 @@
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env
+load_dotenv()
+
+
+# src/, where bot.py lives.
+SRC_DIR = Path(__file__).resolve().parent
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_ids(name: str) -> list[int]:
+    value = os.getenv(name, "")
+    return [int(v) for v in value.replace(" ", "").split(",") if v]
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# ----------------- storage -----------------
+
+# Where dkp.sqlite3 (and the legacy server_prefs.json) live. Relative paths
+# are resolved against src/, never the process working directory.
+DATA_DIR = SRC_DIR / os.getenv("DATA_DIR", ".")
+
+
+# ----------------- startup -----------------
+
+# Guilds slash commands are registered in. Empty means global registration.
+COMMAND_GUILD_IDS = _env_ids("COMMAND_GUILD_IDS")
+# Sync the command tree on startup even if its hash hasn't changed.
+FORCE_COMMAND_SYNC = _env_bool("FORCE_COMMAND_SYNC")
+# Guilds warmed up (events channel + subscriptions) at the same time.
+STARTUP_CONCURRENCY = _env_int("STARTUP_CONCURRENCY", 16)
+
+
+# ----------------- DKP storage -----------------
+
+# Queue DKP writes and commit them in groups instead of one transaction each.
+DKP_WRITE_BEHIND = _env_bool("DKP_WRITE_BEHIND")
+# Longest a queued write waits for others to join its batch.
+DKP_WRITE_BEHIND_DELAY = _env_float("DKP_WRITE_BEHIND_DELAY", 0.05)
+# A batch is committed as soon as it holds this many writes.
+DKP_WRITE_BEHIND_MAX_BATCH = _env_int("DKP_WRITE_BEHIND_MAX_BATCH", 256)
+# How often guild decay policies are checked for due runs.
+DKP_DECAY_CHECK_MINUTES = _env_float("DKP_DECAY_CHECK_MINUTES", 5)
+# !dkp_export / !dkp_import buffer files in memory up to this size and
+# spill to a temp file beyond it.
+DKP_TRANSFER_SPOOL_MB = _env_float("DKP_TRANSFER_SPOOL_MB", 8)
+# Rows parsed and written per transaction by !dkp_import.
+DKP_IMPORT_CHUNK = _env_int("DKP_IMPORT_CHUNK", 20000)
+
+
+# ----------------- events & reward codes -----------------
+
+# Reward codes stay valid this long after their event's end time...
+REWARD_CODE_GRACE = timedelta(hours=_env_float("REWARD_CODE_GRACE_HOURS", 24))
+# ...or this long after creation if the event has no end time.
+REWARD_CODE_TTL = timedelta(hours=_env_float("REWARD_CODE_TTL_HOURS", 168))
+# Reward codes kept in the in-memory lookup cache.
+REWARD_CODE_CACHE_SIZE = _env_int("REWARD_CODE_CACHE_SIZE", 1024)
+# Post a reminder to the events channel this long before an event starts
+# (0 = only announce the start itself).
+EVENT_REMINDER_MINUTES = _env_float("EVENT_REMINDER_MINUTES", 15)
+# Event embeds show the RSVP count; after a join/leave they are edited at
+# most once per this many seconds.
+RSVP_EDIT_DELAY = _env_float("RSVP_EDIT_DELAY", 3)
+# Event rosters and event messages kept in memory for RSVPs.
+RSVP_CACHE_SIZE = _env_int("RSVP_CACHE_SIZE", 1024)
+# Events linked to a voice channel pay their DKP reward by attendance:
+# time in the channel between start and end, as a share of the event's
+# length. Running totals are saved this often, so a restart loses at most
+# this many seconds of attendance.
+ATTENDANCE_CHECKPOINT_SECONDS = _env_float("ATTENDANCE_CHECKPOINT_SECONDS", 60)
+# Members who attended less than this percentage of an event get nothing.
+ATTENDANCE_MIN_PERCENT = _env_float("ATTENDANCE_MIN_PERCENT", 10)
+
+
+# ----------------- auctions -----------------
+
+# A bid must beat the current top bid by at least this much DKP.
+AUCTION_MIN_INCREMENT = _env_int("AUCTION_MIN_INCREMENT", 1)
+# A bid placed in the last AUCTION_SNIPE_WINDOW seconds pushes the end
+# back to AUCTION_SNIPE_EXTENSION seconds after the bid.
+AUCTION_SNIPE_WINDOW = _env_float("AUCTION_SNIPE_WINDOW", 30)
+AUCTION_SNIPE_EXTENSION = _env_float("AUCTION_SNIPE_EXTENSION", 30)
+# Accepted bids are written to the database in one batch this often, so
+# a crash loses at most this many seconds of bids.
+AUCTION_FLUSH_INTERVAL = _env_float("AUCTION_FLUSH_INTERVAL", 1)
+# Auction posts are edited at most once per this many seconds.
+AUCTION_EDIT_DELAY = _env_float("AUCTION_EDIT_DELAY", 2)
+
+# ----------------- command rate limits -----------------
+
+# Token buckets every prefix and slash command is checked against, per user,
+# per guild and for the whole process (per cluster under cluster.py).
+# Each is "<uses>/<seconds>": a burst of <uses>, refilled over <seconds>;
+# "0" turns that scope off.
+RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "5/10")
+RATE_LIMIT_GUILD = os.getenv("RATE_LIMIT_GUILD", "30/10")
+RATE_LIMIT_GLOBAL = os.getenv("RATE_LIMIT_GLOBAL", "30/1")
+# Per-command overrides of the scopes above, as
+# "command:scope=rate,scope=rate;command:...".
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "redeem_dkp:user=3/60;"
+    "dkp_stats:user=3/30,guild=20/60;"
+    "dkp_export:user=1/60,guild=2/60;"
+    "dkp_import:user=1/60,guild=2/60;"
+    "bid:user=10/10,guild=0",
+)
+# Buckets kept in memory; the least recently used are dropped (and start
+# full again if needed later).
+RATE_LIMIT_CACHE_SIZE = _env_int("RATE_LIMIT_CACHE_SIZE", 10000)
+
+
+# ----------------- broadcasts -----------------
+
+# Guilds a public event is delivered to at the same time.
+BROADCAST_CONCURRENCY = _env_int("BROADCAST_CONCURRENCY", 8)
+# Upper bound on broadcast sends started per second (Discord's global
+# limit is 50 requests/second per bot).
+BROADCAST_RATE = _env_float("BROADCAST_RATE", 40.0)
+# Post broadcasts through a webhook the bot creates in each guild's events
+# channel instead of as the bot (needs Manage Webhooks; falls back to a
+# normal send where it can't create one). Webhook posts can't carry a
+# nonce, so a send retried after a Discord 5xx may rarely post twice.
+BROADCAST_WEBHOOKS = _env_bool("BROADCAST_WEBHOOKS", False)
+# A failed delivery is retried with exponential backoff starting at
+# BROADCAST_RETRY_BASE seconds, capped at BROADCAST_RETRY_MAX, and given
+# up after BROADCAST_MAX_ATTEMPTS tries.
+BROADCAST_RETRY_BASE = _env_float("BROADCAST_RETRY_BASE", 5)
+BROADCAST_RETRY_MAX = _env_float("BROADCAST_RETRY_MAX", 1800)
+BROADCAST_MAX_ATTEMPTS = _env_int("BROADCAST_MAX_ATTEMPTS", 8)
+# Finished deliveries are kept in the outbox this long.
+BROADCAST_OUTBOX_DAYS = _env_float("BROADCAST_OUTBOX_DAYS", 7)
+# Optional JSON file of {"alias": "game"} pairs merged into the built-in
+# table used to match /set_games preferences against event games.
+GAME_ALIASES_FILE = Path(os.getenv("GAME_ALIASES_FILE", SRC_DIR / "game_aliases.json"))
+
+
+# ----------------- clustering -----------------
+
+# Total gateway shards; 0 asks Discord for the recommended count.
+SHARD_COUNT = _env_int("SHARD_COUNT", 0)
+# Worker processes started by cluster.py; shards are split evenly.
+CLUSTER_COUNT = _env_int("CLUSTER_COUNT", 1)
+# Unix socket used by the cross-cluster bus.
+BUS_SOCKET = os.getenv("BUS_SOCKET", str(DATA_DIR / "eventbot-bus.sock"))
+# Base URL of tools/fake_discord.py; only set when testing locally.
+FAKE_DISCORD_URL = os.getenv("FAKE_DISCORD_URL", "")
+
+
+# ----------------- logging -----------------
+
+# Lowest level logged, plus per-logger overrides as "logger=LEVEL,...".
+# The bot's loggers are eventbot.<subsystem> (broadcast, events, dkp,
+# auctions, bus, cluster, ...); discord.py logs under "discord".
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "json" (one object per line) or "text".
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Write logs to this file instead of stdout.
+LOG_FILE = os.getenv("LOG_FILE", "")
+# Only 1 in this many high-volume records (per-guild deliveries, command
+# timings) is kept; 1 keeps them all.
+LOG_SAMPLE_EVERY = _env_int("LOG_SAMPLE_EVERY", 10)
+# Records waiting for the log writer thread; beyond this they're dropped.
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)
+
+
+# ----------------- metrics -----------------
+
+# Serve Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics.
+# Under cluster.py each cluster listens on METRICS_PORT + cluster id.
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", False)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _env_int("METRICS_PORT", 9108)
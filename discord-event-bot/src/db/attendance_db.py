@@ -0,0 +1,247 @@
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from db.dkp_db import _apply_changes, publish_totals, run_db, run_write, write_dkp
+
+# Attendance of events linked to a voice channel is counted in memory:
+# joins and leaves only touch the dicts below, checkpoint() writes the
+# running totals of every event in one transaction per
+# ATTENDANCE_CHECKPOINT_SECONDS, and finish() awards the DKP for a whole
+# event in one ledger transaction. A restart loses at most the time since
+# the last checkpoint (and whatever happened while the bot was down).
+
+
+@dataclass
+class Attendance:
+    """Voice attendance of one running event; times are unix timestamps."""
+
+    event_id: int
+    guild_id: int
+    channel_id: int
+    name: str
+    reward: int
+    starts_at: float
+    ends_at: float
+    # user_id -> seconds attended in finished stays
+    seconds: Dict[int, float] = field(default_factory=dict)
+    # user_id -> when they joined, for members in the channel right now
+    present: Dict[int, float] = field(default_factory=dict)
+    # users whose seconds changed since the last checkpoint
+    dirty: Set[int] = field(default_factory=set)
+
+    def _stay(self, joined: float, now: float) -> float:
+        return max(0.0, min(now, self.ends_at) - max(joined, self.starts_at))
+
+    def totals(self, now: float) -> Dict[int, float]:
+        """Seconds attended per user up to `now`, open stays included."""
+        totals = dict(self.seconds)
+        for user_id, joined in self.present.items():
+            totals[user_id] = totals.get(user_id, 0.0) + self._stay(joined, now)
+        return totals
+
+
+# event_id -> attendance being counted by this process
+_tracked: Dict[int, Attendance] = {}
+# voice channel_id -> event_ids counting it
+_by_channel: Dict[int, Set[int]] = {}
+
+
+# ----------------- schema -----------------
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    # Checkpointed running totals; finish() pays out from memory, these
+    # only carry attendance over a restart.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS event_attendance (
+            event_id INTEGER NOT NULL,
+            user_id  INTEGER NOT NULL,
+            seconds  REAL NOT NULL,
+            PRIMARY KEY (event_id, user_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+async def init_db() -> None:
+    await run_write(_init_db)
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _get_seconds(conn: sqlite3.Connection, event_id: int) -> Dict[int, float]:
+    return {
+        int(r["user_id"]): float(r["seconds"])
+        for r in conn.execute(
+            "SELECT user_id, seconds FROM event_attendance WHERE event_id = ?;",
+            (event_id,),
+        )
+    }
+
+
+def _save_seconds(conn: sqlite3.Connection, rows: List[Tuple[int, int, float]]) -> None:
+    conn.executemany(
+        """
+        INSERT INTO event_attendance (event_id, user_id, seconds)
+        VALUES (?, ?, ?)
+        ON CONFLICT(event_id, user_id) DO UPDATE SET seconds = excluded.seconds;
+        """,
+        rows,
+    )
+
+
+def _award(
+    conn: sqlite3.Connection,
+    attendance: Attendance,
+    totals: Dict[int, float],
+    deltas: Dict[int, int],
+) -> Optional[Dict[Tuple[int, int], int]]:
+    """End the event and pay everyone's attendance DKP in one transaction.
+
+    Ending is conditional on the event not having ended yet, so an event
+    is never paid twice. Returns the new totals, or None if it had.
+    """
+    cur = conn.execute(
+        "UPDATE events SET status = 'ended' WHERE id = ? AND status <> 'ended';",
+        (attendance.event_id,),
+    )
+    if cur.rowcount == 0:
+        return None
+    _save_seconds(conn, [(attendance.event_id, u, s) for u, s in totals.items()])
+    reason = f"Event attendance ({attendance.name})"
+    return _apply_changes(
+        conn, [(attendance.guild_id, u, d, reason) for u, d in deltas.items()]
+    )
+
+
+# ----------------- tracking -----------------
+
+def _events_in(channel_id: Optional[int]) -> List[Attendance]:
+    if channel_id is None:
+        return []
+    return [_tracked[e] for e in _by_channel.get(channel_id, ())]
+
+
+async def track(event: dict, members: List[int]) -> Attendance:
+    """Start counting an event's voice channel.
+
+    `event` needs id, guild_id, name, start, end, dkp_reward and
+    voice_channel_id; `members` are the users in the channel right now.
+    Totals checkpointed before a restart are picked up again.
+    """
+    attendance = _tracked.get(event["id"])
+    if attendance is None:
+        attendance = Attendance(
+            event_id=event["id"],
+            guild_id=event["guild_id"],
+            channel_id=event["voice_channel_id"],
+            name=event["name"],
+            reward=event["dkp_reward"],
+            starts_at=event["start"].timestamp(),
+            ends_at=event["end"].timestamp(),
+            seconds=await run_db(_get_seconds, event["id"]),
+        )
+        _tracked[attendance.event_id] = attendance
+        _by_channel.setdefault(attendance.channel_id, set()).add(attendance.event_id)
+    now = time.time()
+    for user_id in members:
+        attendance.present.setdefault(user_id, now)
+    return attendance
+
+
+def _untrack(event_id: int) -> Optional[Attendance]:
+    attendance = _tracked.pop(event_id, None)
+    if attendance is not None:
+        events = _by_channel.get(attendance.channel_id, set())
+        events.discard(event_id)
+        if not events:
+            _by_channel.pop(attendance.channel_id, None)
+    return attendance
+
+
+def moved(user_id: int, before: Optional[int], after: Optional[int]) -> None:
+    """Record a user leaving voice channel `before` and/or joining `after`.
+
+    Only touches memory; called for every voice state change.
+    """
+    if before == after:
+        return
+    now = time.time()
+    for attendance in _events_in(before):
+        joined = attendance.present.pop(user_id, None)
+        if joined is not None:
+            attendance.seconds[user_id] = (
+                attendance.seconds.get(user_id, 0.0) + attendance._stay(joined, now)
+            )
+            attendance.dirty.add(user_id)
+    for attendance in _events_in(after):
+        attendance.present.setdefault(user_id, now)
+
+
+async def checkpoint() -> int:
+    """Write the running totals of every tracked event; returns rows written.
+
+    Users who left since the last checkpoint and users still in the
+    channel are written, everyone else's total hasn't changed.
+    """
+    now = time.time()
+    rows = []
+    for attendance in _tracked.values():
+        totals = attendance.totals(now)
+        for user_id in attendance.dirty | attendance.present.keys():
+            rows.append((attendance.event_id, user_id, totals[user_id]))
+    if not rows:
+        return 0
+    dirty = {a.event_id: a.dirty for a in _tracked.values()}
+    for attendance in _tracked.values():
+        attendance.dirty = set()
+    try:
+        await run_write(_save_seconds, rows)
+    except BaseException:
+        for event_id, users in dirty.items():
+            if event_id in _tracked:
+                _tracked[event_id].dirty |= users
+        raise
+    return len(rows)
+
+
+def award_for(attendance: Attendance, seconds: float) -> int:
+    """DKP earned for attending `seconds` of the event."""
+    duration = attendance.ends_at - attendance.starts_at
+    if duration <= 0:
+        return attendance.reward if seconds > 0 else 0
+    share = min(1.0, seconds / duration)
+    if share * 100 < config.ATTENDANCE_MIN_PERCENT:
+        return 0
+    return round(attendance.reward * share)
+
+
+async def finish(event_id: int) -> Tuple[Optional[Attendance], Dict[int, Tuple[int, int]]]:
+    """Stop counting an event and pay out its attendance DKP.
+
+    Returns (attendance, {user_id: (DKP awarded, new total)}); attendance
+    is None if the event wasn't tracked here, and the dict is empty if
+    nobody earned anything or the event had already ended.
+    """
+    attendance = _untrack(event_id)
+    if attendance is None:
+        return None, {}
+    totals = attendance.totals(time.time())
+    deltas = {u: award_for(attendance, s) for u, s in totals.items()}
+    deltas = {u: d for u, d in deltas.items() if d > 0}
+    try:
+        new_totals = await write_dkp(_award, attendance, totals, deltas)
+    except BaseException:
+        # Not ended in the DB; the caller may try again later.
+        _tracked[event_id] = attendance
+        _by_channel.setdefault(attendance.channel_id, set()).add(event_id)
+        raise
+    if not new_totals:
+        return attendance, {}
+    publish_totals(new_totals)
+    return attendance, {
+        u: (d, new_totals[(attendance.guild_id, u)]) for u, d in deltas.items()
+    }
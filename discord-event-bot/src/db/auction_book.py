@@ -0,0 +1,63 @@
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class OrderBook:
+    """Bids for one auction: every bidder's best bid, highest first.
+
+    Keeps a {user_id: (amount, seq)} map plus a list of (-amount, seq,
+    user_id) in sorted order, so the leader is O(1), placing a bid is
+    O(log n) and the ranked walk used at settlement is a plain iteration.
+    Equal amounts rank by seq, i.e. the earlier bid wins.
+    """
+
+    def __init__(self):
+        self._best: Dict[int, Tuple[int, int]] = {}
+        self._order: List[Tuple[int, int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def place(self, user_id: int, amount: int, seq: int) -> None:
+        """Record a bid, replacing the bidder's previous one."""
+        old = self._best.get(user_id)
+        if old is not None:
+            del self._order[bisect_left(self._order, (-old[0], old[1], user_id))]
+        self._best[user_id] = (amount, seq)
+        insort(self._order, (-amount, seq, user_id))
+
+    def bid_of(self, user_id: int) -> Optional[int]:
+        best = self._best.get(user_id)
+        return best[0] if best else None
+
+    def leader(self) -> Optional[Tuple[int, int]]:
+        """(user_id, amount) of the highest bid, or None without bids."""
+        if not self._order:
+            return None
+        amount, _, user_id = self._order[0]
+        return user_id, -amount
+
+    def ranked(self) -> Iterator[Tuple[int, int]]:
+        """(user_id, amount) for every bidder, highest bid first."""
+        for amount, _, user_id in self._order:
+            yield user_id, -amount
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        return [(u, -a) for a, _, u in self._order[:n]]
+
+
+@dataclass
+class Auction:
+    """A live auction; ends_at is a unix timestamp."""
+
+    id: int
+    guild_id: int
+    channel_id: int
+    message_id: Optional[int]
+    item: str
+    creator_id: int
+    min_bid: int
+    ends_at: float
+    book: OrderBook = field(default_factory=OrderBook)
+    bids: int = 0
@@ -0,0 +1,412 @@
+import itertools
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+from db.auction_book import Auction
+from db.dkp_db import (
+    _change_dkp,
+    get_dkp,
+    publish_totals,
+    run_db,
+    run_write,
+    write_dkp,
+)
+
+# Live auctions are held in memory and bids are checked against them
+# without touching SQLite: accepted bids are queued in _pending_bids and
+# written by flush() in one transaction per AUCTION_FLUSH_INTERVAL, so a
+# burst of bids costs one write lock instead of one each. A crash loses
+# at most the bids of the last interval; settlement flushes first, so the
+# recorded winning bid is always in auction_bids.
+
+# auction_id -> live (open) auction owned by this process
+_live: Dict[int, Auction] = {}
+
+# (guild_id, user_id) -> DKP held by the user's leading bids in that
+# guild's open auctions. A bid may only use balance minus this, so nobody
+# can win more than they can pay for across simultaneous auctions.
+_escrow: Dict[Tuple[int, int], int] = {}
+
+# (auction_id, user_id, amount, placed_at) rows not yet written
+_pending_bids: List[Tuple[int, int, int, float]] = []
+# auction_id -> ends_at moved by anti-snipe, not yet written
+_pending_ends: Dict[int, float] = {}
+
+_seq = itertools.count()
+
+
+# ----------------- schema -----------------
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS auctions (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id    INTEGER NOT NULL,
+            channel_id  INTEGER NOT NULL,
+            message_id  INTEGER,
+            item        TEXT NOT NULL,
+            creator_id  INTEGER NOT NULL,
+            min_bid     INTEGER NOT NULL,
+            ends_at     REAL NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'open',
+            winner_id   INTEGER,
+            price       INTEGER,
+            created_at  REAL NOT NULL
+        );
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_auctions_status
+        ON auctions (status, guild_id);
+        """
+    )
+
+    # Every accepted bid beats the previous top bid, so amounts are unique
+    # per auction and replaying them in order rebuilds the book.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS auction_bids (
+            auction_id INTEGER NOT NULL,
+            amount     INTEGER NOT NULL,
+            user_id    INTEGER NOT NULL,
+            placed_at  REAL NOT NULL,
+            PRIMARY KEY (auction_id, amount)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+async def init_db() -> None:
+    """Create the auction tables if they don't exist."""
+    await run_write(_init_db)
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _create_auction(
+    conn: sqlite3.Connection,
+    guild_id: int,
+    channel_id: int,
+    item: str,
+    creator_id: int,
+    min_bid: int,
+    ends_at: float,
+) -> int:
+    cur = conn.execute(
+        """
+        INSERT INTO auctions (
+            guild_id, channel_id, item, creator_id, min_bid, ends_at, created_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?);
+        """,
+        (guild_id, channel_id, item, creator_id, min_bid, ends_at, time.time()),
+    )
+    return int(cur.lastrowid)
+
+
+def _set_message(conn: sqlite3.Connection, auction_id: int, message_id: int) -> None:
+    conn.execute(
+        "UPDATE auctions SET message_id = ? WHERE id = ?;",
+        (message_id, auction_id),
+    )
+
+
+def _save_bids(
+    conn: sqlite3.Connection,
+    bids: List[Tuple[int, int, int, float]],
+    ends: Dict[int, float],
+) -> None:
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO auction_bids (auction_id, user_id, amount, placed_at)
+        VALUES (?, ?, ?, ?);
+        """,
+        bids,
+    )
+    conn.executemany(
+        "UPDATE auctions SET ends_at = ? WHERE id = ? AND status = 'open';",
+        [(ends_at, auction_id) for auction_id, ends_at in ends.items()],
+    )
+
+
+def _get_open_auctions(conn: sqlite3.Connection) -> List[Auction]:
+    auctions: Dict[int, Auction] = {}
+    for r in conn.execute("SELECT * FROM auctions WHERE status = 'open';"):
+        auctions[int(r["id"])] = Auction(
+            id=int(r["id"]),
+            guild_id=int(r["guild_id"]),
+            channel_id=int(r["channel_id"]),
+            message_id=int(r["message_id"]) if r["message_id"] is not None else None,
+            item=r["item"],
+            creator_id=int(r["creator_id"]),
+            min_bid=int(r["min_bid"]),
+            ends_at=float(r["ends_at"]),
+        )
+    rows = conn.execute(
+        """
+        SELECT b.auction_id, b.user_id, b.amount
+        FROM auction_bids b
+        JOIN auctions a ON a.id = b.auction_id
+        WHERE a.status = 'open'
+        ORDER BY b.auction_id, b.amount;
+        """
+    )
+    for r in rows:
+        auction = auctions[int(r["auction_id"])]
+        auction.book.place(int(r["user_id"]), int(r["amount"]), next(_seq))
+        auction.bids += 1
+    return list(auctions.values())
+
+
+def _close_auction(conn: sqlite3.Connection, auction_id: int, status: str) -> bool:
+    cur = conn.execute(
+        "UPDATE auctions SET status = ? WHERE id = ? AND status = 'open';",
+        (status, auction_id),
+    )
+    return cur.rowcount == 1
+
+
+def _settle(
+    conn: sqlite3.Connection,
+    auction: Auction,
+    candidates: List[Tuple[int, int, int]],
+) -> Optional[Tuple[int, int, int]]:
+    """Close an auction and debit the first bidder who can still pay.
+
+    candidates are (user_id, amount, DKP held by their other bids), best
+    bid first; balances are re-read here, inside the write transaction, so
+    a bidder whose DKP was removed since bidding is skipped. Returns
+    (winner_id, price, new total), or None if nobody could pay. Closing
+    is conditional on the auction still being open, so a settlement can
+    never debit twice.
+    """
+    if not _close_auction(conn, auction.id, "settled"):
+        return None
+    for user_id, amount, held in candidates:
+        row = conn.execute(
+            "SELECT points FROM dkp WHERE server_id = ? AND user_id = ?;",
+            (auction.guild_id, user_id),
+        ).fetchone()
+        points = int(row["points"]) if row else 0
+        if points - held < amount:
+            continue
+        total = _change_dkp(
+            conn, auction.guild_id, user_id, -amount, f"Auction: {auction.item}"
+        )
+        conn.execute(
+            "UPDATE auctions SET winner_id = ?, price = ? WHERE id = ?;",
+            (user_id, amount, auction.id),
+        )
+        return user_id, amount, total
+    return None
+
+
+# ----------------- escrow -----------------
+
+def _hold(guild_id: int, user_id: int, amount: int) -> None:
+    key = (guild_id, user_id)
+    _escrow[key] = _escrow.get(key, 0) + amount
+
+
+def _release(guild_id: int, user_id: int, amount: int) -> None:
+    key = (guild_id, user_id)
+    left = _escrow.get(key, 0) - amount
+    if left > 0:
+        _escrow[key] = left
+    else:
+        _escrow.pop(key, None)
+
+
+def held_by(guild_id: int, user_id: int) -> int:
+    """DKP a user has committed to leading bids in open auctions."""
+    return _escrow.get((guild_id, user_id), 0)
+
+
+def _track(auction: Auction) -> None:
+    _live[auction.id] = auction
+    leader = auction.book.leader()
+    if leader is not None:
+        _hold(auction.guild_id, *leader)
+
+
+def _untrack(auction_id: int) -> Optional[Auction]:
+    """Stop accepting bids on an auction; its escrow stays held."""
+    return _live.pop(auction_id, None)
+
+
+def _release_leader(auction: Auction) -> None:
+    leader = auction.book.leader()
+    if leader is not None:
+        _release(auction.guild_id, *leader)
+
+
+# ----------------- public API -----------------
+
+def get_auction(auction_id: int) -> Optional[Auction]:
+    return _live.get(auction_id)
+
+
+def get_guild_auctions(guild_id: int) -> List[Auction]:
+    """Open auctions of a guild, soonest ending first."""
+    auctions = [a for a in _live.values() if a.guild_id == guild_id]
+    auctions.sort(key=lambda a: a.ends_at)
+    return auctions
+
+
+async def load_live(owns: Callable[[int], bool]) -> List[Auction]:
+    """Rebuild open auctions (and their escrow) of guilds this process owns."""
+    auctions = [a for a in await run_db(_get_open_auctions) if owns(a.guild_id)]
+    for auction in auctions:
+        _track(auction)
+    return auctions
+
+
+async def create_auction(
+    guild_id: int,
+    channel_id: int,
+    item: str,
+    creator_id: int,
+    min_bid: int,
+    duration: float,
+) -> Auction:
+    """Open an auction ending `duration` seconds from now."""
+    ends_at = time.time() + duration
+    auction_id = await run_write(
+        _create_auction, guild_id, channel_id, item, creator_id, min_bid, ends_at
+    )
+    auction = Auction(
+        id=auction_id,
+        guild_id=guild_id,
+        channel_id=channel_id,
+        message_id=None,
+        item=item,
+        creator_id=creator_id,
+        min_bid=min_bid,
+        ends_at=ends_at,
+    )
+    _track(auction)
+    return auction
+
+
+async def set_message(auction: Auction, message_id: int) -> None:
+    auction.message_id = message_id
+    await run_write(_set_message, auction.id, message_id)
+
+
+def min_next_bid(auction: Auction) -> int:
+    leader = auction.book.leader()
+    if leader is None:
+        return auction.min_bid
+    return leader[1] + config.AUCTION_MIN_INCREMENT
+
+
+async def place_bid(auction_id: int, user_id: int, amount: int) -> Tuple[str, int]:
+    """Bid on an open auction.
+
+    Returns (status, value): "ok" or "extended" (accepted; "extended"
+    when anti-snipe pushed the end back) with the amount, "too_low" with
+    the minimum bid, "insufficient" with the DKP the user has available,
+    or "closed" with 0. Nothing is written here; see flush().
+    """
+    auction = _live.get(auction_id)
+    if auction is None:
+        return "closed", 0
+    balance = await get_dkp(auction.guild_id, user_id)
+
+    # No awaits from here on: checking the book and escrow and updating
+    # them happen atomically with respect to every other bid.
+    now = time.time()
+    if _live.get(auction_id) is not auction or now >= auction.ends_at:
+        return "closed", 0
+
+    minimum = min_next_bid(auction)
+    if amount < minimum:
+        return "too_low", minimum
+
+    leader = auction.book.leader()
+    # Raising your own leading bid only needs the difference.
+    own = leader[1] if leader is not None and leader[0] == user_id else 0
+    available = balance - held_by(auction.guild_id, user_id) + own
+    if amount > available:
+        return "insufficient", max(available, 0)
+
+    if leader is not None:
+        _release(auction.guild_id, *leader)
+    _hold(auction.guild_id, user_id, amount)
+    auction.book.place(user_id, amount, next(_seq))
+    auction.bids += 1
+    _pending_bids.append((auction_id, user_id, amount, now))
+
+    if auction.ends_at - now < config.AUCTION_SNIPE_WINDOW:
+        auction.ends_at = now + config.AUCTION_SNIPE_EXTENSION
+        _pending_ends[auction_id] = auction.ends_at
+        return "extended", amount
+    return "ok", amount
+
+
+async def flush() -> int:
+    """Write queued bids and end time changes; returns how many bids."""
+    global _pending_bids, _pending_ends
+    if not _pending_bids and not _pending_ends:
+        return 0
+    bids, ends = _pending_bids, _pending_ends
+    _pending_bids, _pending_ends = [], {}
+    try:
+        await run_write(_save_bids, bids, ends)
+    except BaseException:
+        # Put them back in front of anything queued meanwhile.
+        _pending_bids[:0] = bids
+        _pending_ends = {**ends, **_pending_ends}
+        raise
+    return len(bids)
+
+
+async def settle(auction_id: int) -> Tuple[Optional[Auction], Optional[Tuple[int, int, int]]]:
+    """End an auction and charge the winner.
+
+    Returns (auction, (winner_id, price, new total) or None if nobody who
+    bid can pay); auction is None if it wasn't open in this process.
+    """
+    auction = _untrack(auction_id)
+    if auction is None:
+        return None, None
+    try:
+        await flush()
+        candidates = []
+        for user_id, amount in auction.book.ranked():
+            held = held_by(auction.guild_id, user_id)
+            if auction.book.leader() == (user_id, amount):
+                held -= amount
+            candidates.append((user_id, amount, held))
+        result = await write_dkp(_settle, auction, candidates)
+    except BaseException:
+        # Still open in the DB; the caller may try again later.
+        _live[auction.id] = auction
+        raise
+    if result is not None:
+        winner_id, _, total = result
+        publish_totals({(auction.guild_id, winner_id): total})
+    # Only now: until the debit is visible in the standings the escrow is
+    # what keeps the winner from spending the DKP elsewhere.
+    _release_leader(auction)
+    return auction, result
+
+
+async def cancel(auction_id: int) -> Optional[Auction]:
+    """Close an auction without a winner; None if it wasn't open here."""
+    auction = _untrack(auction_id)
+    if auction is None:
+        return None
+    try:
+        await flush()
+        await run_write(_close_auction, auction_id, "cancelled")
+    except BaseException:
+        _live[auction.id] = auction
+        raise
+    _release_leader(auction)
+    return auction
@@ -0,0 +1,196 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.dkp_db import _last_log_id, _roll_up, invalidate_standings, run_db, run_write
+
+# Same format as SQLite's CURRENT_TIMESTAMP (UTC), like dkp_log.timestamp.
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+DECAY_REASON = "Decay"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# New balance for a row of `dkp` joined to its guild's policy `p`. Balances
+# at or below the floor are left alone; others never drop below it.
+_NEW_POINTS = """
+    CASE
+        WHEN dkp.points <= p.floor THEN dkp.points
+        WHEN p.mode = 'percent'
+            THEN MAX(p.floor, dkp.points - (dkp.points * p.amount) / 100)
+        ELSE MAX(p.floor, dkp.points - p.amount)
+    END
+"""
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dkp_decay (
+            server_id      INTEGER PRIMARY KEY,
+            mode           TEXT NOT NULL CHECK (mode IN ('percent', 'flat')),
+            amount         INTEGER NOT NULL,
+            floor          INTEGER NOT NULL DEFAULT 0,
+            interval_hours REAL NOT NULL,
+            last_run       TEXT,
+            next_run       TEXT NOT NULL
+        );
+        """
+    )
+
+
+async def init_db() -> None:
+    """Create the decay policy table if it doesn't exist."""
+    await run_write(_init_db)
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _set_policy(
+    conn: sqlite3.Connection,
+    server_id: int,
+    mode: str,
+    amount: int,
+    floor: int,
+    interval_hours: float,
+    next_run: str,
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO dkp_decay (
+            server_id, mode, amount, floor, interval_hours, next_run
+        )
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(server_id) DO UPDATE SET
+            mode = excluded.mode,
+            amount = excluded.amount,
+            floor = excluded.floor,
+            interval_hours = excluded.interval_hours,
+            next_run = excluded.next_run;
+        """,
+        (server_id, mode, amount, floor, interval_hours, next_run),
+    )
+
+
+def _delete_policy(conn: sqlite3.Connection, server_id: int) -> bool:
+    cur = conn.execute("DELETE FROM dkp_decay WHERE server_id = ?;", (server_id,))
+    return cur.rowcount > 0
+
+
+def _get_policy(conn: sqlite3.Connection, server_id: int) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT * FROM dkp_decay WHERE server_id = ?;", (server_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def _run_due_decay(
+    conn: sqlite3.Connection,
+    now: datetime,
+) -> Tuple[List[int], int]:
+    """Apply every due policy in one transaction opened by the caller.
+
+    Returns (decayed server_ids, number of balances changed). Missed runs
+    (e.g. the bot was offline) are not stacked: a due policy decays once
+    and its next_run moves to the first slot after `now`.
+    """
+    now_text = now.strftime(TIME_FORMAT)
+    due = conn.execute(
+        """
+        SELECT server_id, interval_hours, next_run
+        FROM dkp_decay
+        WHERE next_run <= ?;
+        """,
+        (now_text,),
+    ).fetchall()
+    if not due:
+        return [], 0
+
+    # Log first: the change is computed from the pre-decay balances.
+    last_id = _last_log_id(conn)
+    cur = conn.execute(
+        f"""
+        INSERT INTO dkp_log (server_id, user_id, change, reason)
+        SELECT dkp.server_id, dkp.user_id, ({_NEW_POINTS}) - dkp.points, ?
+        FROM dkp
+        JOIN dkp_decay p ON p.server_id = dkp.server_id
+        WHERE p.next_run <= ? AND ({_NEW_POINTS}) <> dkp.points;
+        """,
+        (DECAY_REASON, now_text),
+    )
+    _roll_up(conn, last_id)
+
+    conn.execute(
+        f"""
+        UPDATE dkp
+        SET points = (
+            SELECT {_NEW_POINTS} FROM dkp_decay p WHERE p.server_id = dkp.server_id
+        )
+        WHERE server_id IN (SELECT server_id FROM dkp_decay WHERE next_run <= ?)
+          AND points > (
+            SELECT p.floor FROM dkp_decay p WHERE p.server_id = dkp.server_id
+          );
+        """,
+        (now_text,),
+    )
+
+    updates = []
+    for r in due:
+        interval = timedelta(hours=float(r["interval_hours"]))
+        next_run = datetime.strptime(r["next_run"], TIME_FORMAT)
+        next_run += interval * ((now - next_run) // interval + 1)
+        updates.append((now_text, next_run.strftime(TIME_FORMAT), r["server_id"]))
+    conn.executemany(
+        "UPDATE dkp_decay SET last_run = ?, next_run = ? WHERE server_id = ?;",
+        updates,
+    )
+
+    return [int(r["server_id"]) for r in due], cur.rowcount
+
+
+# ----------------- public API -----------------
+
+async def set_policy(
+    server_id: int,
+    mode: str,
+    amount: int,
+    interval_hours: float,
+    floor: int = 0,
+) -> datetime:
+    """Create or replace a guild's decay policy; returns the first run time (UTC)."""
+    first_run = _utcnow() + timedelta(hours=interval_hours)
+    await run_write(
+        _set_policy,
+        server_id,
+        mode,
+        amount,
+        floor,
+        interval_hours,
+        first_run.strftime(TIME_FORMAT),
+    )
+    return first_run
+
+
+async def delete_policy(server_id: int) -> bool:
+    """Remove a guild's decay policy; returns False if it had none."""
+    return await run_write(_delete_policy, server_id)
+
+
+async def get_policy(server_id: int) -> Optional[Dict[str, Any]]:
+    return await run_db(_get_policy, server_id)
+
+
+async def run_due_decay() -> Tuple[List[int], int]:
+    """Decay every guild whose policy is due, in a single transaction.
+
+    Returns (decayed server_ids, number of balances changed). The policy's
+    persisted next_run marker advances in the same transaction, so a
+    restart can never apply the same run twice.
+    """
+    server_ids, changed = await run_write(_run_due_decay, _utcnow())
+    for server_id in server_ids:
+        invalidate_standings(server_id)
+    return server_ids, changed
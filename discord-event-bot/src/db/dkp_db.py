@@ -1,23 +1,152 @@
+import asyncio
 import sqlite3
-from pathlib import Path
-from typing import List, Tuple, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Optional, TypeVar
 
-# dkp.sqlite3 will sit in src/ next to bot.py
-DB_PATH = Path(__file__).resolve().parent.parent / "dkp.sqlite3"
+import config
+from db.standings import GuildStandings
+from utils import metrics
+from utils.log import get_logger
 
+log = get_logger("dkp_db")
+
+# dkp.sqlite3 sits in DATA_DIR (src/ next to bot.py by default)
+DB_PATH = config.DATA_DIR / "dkp.sqlite3"
+
+T = TypeVar("T")
+
+# All SQLite work runs on this single thread, which owns one long-lived
+# connection. Coroutines hand work to it through run_db(), so a slow disk
+# only delays DKP commands instead of blocking the discord.py event loop.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dkp-db")
+_conn: Optional[sqlite3.Connection] = None
+_closed = False
+
+# Optional WriteBehindLedger (db/ledger.py); when set, DKP changes are
+# group-committed through it instead of one transaction per call.
+_ledger: Optional[Any] = None
+
+
+# Per-guild standings, loaded from `dkp` on first use and then kept current
+# by every write in this module, so reads never touch SQLite. Only touched
+# from the event loop. A load that races with a write is safe because the
+# DB thread runs work in submission order: a load submitted before a write
+# resolves (and is installed) before that write publishes its totals.
+_standings: Dict[int, GuildStandings] = {}
+_standings_loading: Dict[int, "asyncio.Future[GuildStandings]"] = {}
+# Bumped whenever a guild's standings are dropped, so a load that started
+# before the drop doesn't install stale data.
+_standings_gen: Dict[int, int] = {}
+
+
+# ----------------- connection -----------------
 
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Return the DB thread's connection, opening it on first use.
 
+    Must only be called from the DB thread (i.e. inside a function passed
+    to run_db()).
+    """
+    global _conn
+    if _conn is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves in
+        # _transaction() instead of relying on sqlite3's implicit BEGIN.
+        conn = sqlite3.connect(
+            DB_PATH,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA busy_timeout=5000;")
+        _conn = conn
+    return _conn
 
-def init_db() -> None:
-    """Create DKP tables if they don't exist."""
-    conn = get_connection()
-    cur = conn.cursor()
 
-    cur.execute(
+def _close_connection() -> None:
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Add a column if it's missing; returns True if it was added."""
+    columns = {r["name"] for r in conn.execute(f"PRAGMA table_info({table});")}
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl};")
+    return True
+
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(conn, *args) on the DB thread and await its result."""
+    loop = asyncio.get_running_loop()
+    # Time the queue wait (contention for the single DB thread) separately
+    # from the work itself; writes are labelled by the function they wrap.
+    label = args[0].__name__ if fn is _transaction else fn.__name__
+    submitted = time.perf_counter()
+
+    def call() -> T:
+        started = time.perf_counter()
+        try:
+            return fn(get_connection(), *args)
+        finally:
+            metrics.DB_QUEUE_WAIT.observe(started - submitted, fn=label)
+            metrics.DB_DURATION.observe(time.perf_counter() - started, fn=label)
+
+    return await loop.run_in_executor(_executor, call)
+
+
+def _transaction(conn: sqlite3.Connection, fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(conn, *args) inside a single write transaction."""
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        result = fn(conn, *args)
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+    conn.execute("COMMIT;")
+    return result
+
+
+async def run_write(fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(conn, *args) in a write transaction on the DB thread."""
+    return await run_db(_transaction, fn, *args)
+
+
+def set_write_behind(ledger: Optional[Any]) -> None:
+    """Route DKP changes through a WriteBehindLedger (None to disable)."""
+    global _ledger
+    _ledger = ledger
+
+
+async def write_dkp(fn: Callable[..., T], *args: Any) -> T:
+    """Run a DKP-changing fn, group-committed if write-behind is enabled."""
+    if _ledger is not None:
+        return await _ledger.submit(fn, *args)
+    return await run_write(fn, *args)
+
+
+async def close_db() -> None:
+    """Close the shared connection and stop the DB thread."""
+    global _closed
+    if _closed:
+        return
+    _closed = True
+    await asyncio.get_running_loop().run_in_executor(_executor, _close_connection)
+    _executor.shutdown(wait=True)
+
+
+# ----------------- schema -----------------
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS dkp (
             server_id INTEGER NOT NULL,
@@ -28,7 +157,7 @@ def init_db() -> None:
         """
     )
 
-    cur.execute(
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS dkp_log (
             id        INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,104 +170,465 @@ def init_db() -> None:
         """
     )
 
-    conn.commit()
-    conn.close()
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_dkp_server_points
+        ON dkp (server_id, points DESC);
+        """
+    )
+
+    # Keyset pagination over dkp_log: per-user history walks
+    # (server_id, user_id, id); the guild audit view walks
+    # (server_id, timestamp) or, when filtered by reason,
+    # (server_id, reason, timestamp). The rowid rides along in each index.
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_dkp_log_user
+        ON dkp_log (server_id, user_id, id);
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_dkp_log_server_time
+        ON dkp_log (server_id, timestamp);
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_dkp_log_server_reason
+        ON dkp_log (server_id, reason, timestamp);
+        """
+    )
+
+    # Daily rollups of dkp_log (days in UTC, like its timestamps), kept up
+    # to date by _roll_up() in the same transaction as every log insert,
+    # so analytics read a few rows per day instead of scanning the log.
+    # Per guild they're split by reason, which makes "DKP issued per
+    # event" a lookup too; NULL reasons are stored as ''.
+    backfill = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dkp_daily_user';"
+    ).fetchone()
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dkp_daily_user (
+            server_id INTEGER NOT NULL,
+            user_id   INTEGER NOT NULL,
+            day       TEXT NOT NULL,
+            earned    INTEGER NOT NULL,
+            spent     INTEGER NOT NULL,
+            entries   INTEGER NOT NULL,
+            PRIMARY KEY (server_id, user_id, day)
+        ) WITHOUT ROWID;
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_dkp_daily_user_day
+        ON dkp_daily_user (server_id, day, user_id, earned, spent);
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dkp_daily_guild (
+            server_id INTEGER NOT NULL,
+            day       TEXT NOT NULL,
+            reason    TEXT NOT NULL,
+            earned    INTEGER NOT NULL,
+            spent     INTEGER NOT NULL,
+            entries   INTEGER NOT NULL,
+            PRIMARY KEY (server_id, day, reason)
+        ) WITHOUT ROWID;
+        """
+    )
+
+    # First start with rollups: fill them from the existing history, in
+    # this same transaction so no write can slip in between.
+    if backfill:
+        log.info("Building daily rollups from existing dkp_log")
+        _roll_up(conn, 0)
+
+
+async def init_db() -> None:
+    """Create DKP tables if they don't exist."""
+    await run_write(_init_db)
+
+
+# ----------------- statements -----------------
+
+# Kept as module constants so every call hits the connection's
+# prepared-statement cache instead of re-parsing the SQL.
+_UPSERT_DKP = """
+    INSERT INTO dkp (server_id, user_id, points)
+    VALUES (?, ?, ?)
+    ON CONFLICT(server_id, user_id) DO UPDATE SET points = points + excluded.points;
+"""
+
+_INSERT_LOG = """
+    INSERT INTO dkp_log (server_id, user_id, change, reason)
+    VALUES (?, ?, ?, ?);
+"""
+
+# dkp_log.timestamp is SQLite's CURRENT_TIMESTAMP (UTC).
+_LOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Upper bound for "id < ?" on the first page of a keyset scan.
+_MAX_ID = 2 ** 63 - 1
+
+# SQLite's default host-parameter limit is 999; stay well under it.
+_IN_CHUNK = 500
+
+_SELECT_STANDINGS = """
+    SELECT user_id, points
+    FROM dkp
+    WHERE server_id = ?
+    ORDER BY points DESC;
+"""
+
+
+_ROLL_UP_USERS = """
+    INSERT INTO dkp_daily_user (server_id, user_id, day, earned, spent, entries)
+    SELECT server_id, user_id, date(timestamp),
+           SUM(MAX(change, 0)), SUM(MAX(-change, 0)), COUNT(*)
+    FROM dkp_log
+    WHERE id > ?
+    GROUP BY server_id, user_id, date(timestamp)
+    ON CONFLICT(server_id, user_id, day) DO UPDATE SET
+        earned = earned + excluded.earned,
+        spent = spent + excluded.spent,
+        entries = entries + excluded.entries;
+"""
+
+_ROLL_UP_GUILDS = """
+    INSERT INTO dkp_daily_guild (server_id, day, reason, earned, spent, entries)
+    SELECT server_id, date(timestamp), COALESCE(reason, ''),
+           SUM(MAX(change, 0)), SUM(MAX(-change, 0)), COUNT(*)
+    FROM dkp_log
+    WHERE id > ?
+    GROUP BY server_id, date(timestamp), COALESCE(reason, '')
+    ON CONFLICT(server_id, day, reason) DO UPDATE SET
+        earned = earned + excluded.earned,
+        spent = spent + excluded.spent,
+        entries = entries + excluded.entries;
+"""
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _last_log_id(conn: sqlite3.Connection) -> int:
+    """Newest dkp_log id; pass it to _roll_up() after appending rows."""
+    return conn.execute("SELECT MAX(id) FROM dkp_log;").fetchone()[0] or 0
+
+
+def _roll_up(conn: sqlite3.Connection, after_id: int) -> None:
+    """Add dkp_log rows with id > after_id to the daily rollups.
+
+    Every path that appends to dkp_log calls this in the same
+    transaction. Only the new rows are read, by rowid range.
+    """
+    conn.execute(_ROLL_UP_USERS, (after_id,))
+    conn.execute(_ROLL_UP_GUILDS, (after_id,))
+
+
+def _apply_changes(
+    conn: sqlite3.Connection,
+    changes: List[Tuple[int, int, int, Optional[str]]],
+) -> Dict[Tuple[int, int], int]:
+    """Apply (server_id, user_id, delta, reason) rows and return new totals.
+
+    Upserts every total and appends every dkp_log row with executemany,
+    then rolls the new rows up.
+    Runs on the DB thread inside a transaction opened by the caller.
+    """
+    last_id = _last_log_id(conn)
+    conn.executemany(_UPSERT_DKP, [(s, u, d) for s, u, d, _ in changes])
+    conn.executemany(_INSERT_LOG, changes)
+    _roll_up(conn, last_id)
+
+    by_server: Dict[int, List[int]] = {}
+    for server_id, user_id, _, _ in changes:
+        by_server.setdefault(server_id, []).append(user_id)
+
+    totals: Dict[Tuple[int, int], int] = {}
+    for server_id, user_ids in by_server.items():
+        unique = list(dict.fromkeys(user_ids))
+        for i in range(0, len(unique), _IN_CHUNK):
+            chunk = unique[i:i + _IN_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT user_id, points FROM dkp "
+                f"WHERE server_id = ? AND user_id IN ({placeholders});",
+                (server_id, *chunk),
+            ).fetchall()
+            for r in rows:
+                totals[(server_id, int(r["user_id"]))] = int(r["points"])
+    return totals
 
 
 def _change_dkp(
+    conn: sqlite3.Connection,
     server_id: int,
     user_id: int,
     delta: int,
     reason: Optional[str],
 ) -> int:
     """Internal helper: apply a delta and return new total."""
-    conn = get_connection()
-    cur = conn.cursor()
+    totals = _apply_changes(conn, [(server_id, user_id, delta, reason)])
+    return totals.get((server_id, user_id), 0)
+
+
+def _get_standings_rows(
+    conn: sqlite3.Connection,
+    server_id: int,
+) -> List[Tuple[int, int]]:
+    rows = conn.execute(_SELECT_STANDINGS, (server_id,)).fetchall()
+    return [(int(r["user_id"]), int(r["points"])) for r in rows]
 
-    # Ensure row exists
-    cur.execute(
+
+def _log_rows(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": int(r["id"]),
+            "user_id": int(r["user_id"]),
+            "change": int(r["change"]),
+            "reason": r["reason"],
+            "timestamp": r["timestamp"],
+        }
+        for r in rows
+    ]
+
+
+def _get_history(
+    conn: sqlite3.Connection,
+    server_id: int,
+    user_id: int,
+    before_id: Optional[int],
+    limit: int,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    rows = conn.execute(
         """
-        INSERT INTO dkp (server_id, user_id, points)
-        VALUES (?, ?, 0)
-        ON CONFLICT(server_id, user_id) DO NOTHING;
+        SELECT id, user_id, change, reason, timestamp
+        FROM dkp_log
+        WHERE server_id = ? AND user_id = ? AND id < ?
+        ORDER BY id DESC
+        LIMIT ?;
         """,
-        (server_id, user_id),
-    )
+        (
+            server_id,
+            user_id,
+            before_id if before_id is not None else _MAX_ID,
+            limit + 1,
+        ),
+    ).fetchall()
+    entries = _log_rows(rows[:limit])
+    cursor = entries[-1]["id"] if len(rows) > limit else None
+    return entries, cursor
 
-    # Apply change
-    cur.execute(
-        "UPDATE dkp SET points = points + ? WHERE server_id = ? AND user_id = ?;",
-        (delta, server_id, user_id),
-    )
 
-    # Log entry
-    cur.execute(
-        """
-        INSERT INTO dkp_log (server_id, user_id, change, reason)
-        VALUES (?, ?, ?, ?);
+def _get_audit_log(
+    conn: sqlite3.Connection,
+    server_id: int,
+    reason: Optional[str],
+    since: Optional[str],
+    until: Optional[str],
+    before: Optional[Tuple[str, int]],
+    limit: int,
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+    where = ["server_id = ?"]
+    params: List[Any] = [server_id]
+    if reason is not None:
+        where.append("reason = ?")
+        params.append(reason)
+    if since is not None:
+        where.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("timestamp < ?")
+        params.append(until)
+    if before is not None:
+        where.append("(timestamp, id) < (?, ?)")
+        params.extend(before)
+
+    rows = conn.execute(
+        f"""
+        SELECT id, user_id, change, reason, timestamp
+        FROM dkp_log
+        WHERE {" AND ".join(where)}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?;
         """,
-        (server_id, user_id, delta, reason),
-    )
+        (*params, limit + 1),
+    ).fetchall()
+    entries = _log_rows(rows[:limit])
+    cursor = None
+    if len(rows) > limit:
+        cursor = (entries[-1]["timestamp"], entries[-1]["id"])
+    return entries, cursor
+
+
+# ----------------- standings -----------------
+
+async def _load_standings(server_id: int) -> GuildStandings:
+    gen = _standings_gen.get(server_id, 0)
+    try:
+        standings = GuildStandings(await run_db(_get_standings_rows, server_id))
+        if _standings_gen.get(server_id, 0) == gen:
+            _standings[server_id] = standings
+        return standings
+    finally:
+        _standings_loading.pop(server_id, None)
 
-    # Get new total
-    cur.execute(
-        "SELECT points FROM dkp WHERE server_id = ? AND user_id = ?;",
-        (server_id, user_id),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    conn.close()
 
-    return int(row["points"]) if row else 0
+async def _get_standings(server_id: int) -> GuildStandings:
+    standings = _standings.get(server_id)
+    if standings is not None:
+        return standings
+    loading = _standings_loading.get(server_id)
+    if loading is None:
+        loading = asyncio.ensure_future(_load_standings(server_id))
+        _standings_loading[server_id] = loading
+    return await asyncio.shield(loading)
 
 
-def add_dkp(
+def publish_totals(totals: Dict[Tuple[int, int], int]) -> None:
+    """Push committed totals into any loaded standings."""
+    for (server_id, user_id), points in totals.items():
+        standings = _standings.get(server_id)
+        if standings is not None:
+            standings.set(user_id, points)
+
+
+def invalidate_standings(server_id: int) -> None:
+    """Drop a guild's standings after a write that bypassed _apply_changes."""
+    _standings.pop(server_id, None)
+    _standings_gen[server_id] = _standings_gen.get(server_id, 0) + 1
+
+
+# ----------------- public API -----------------
+
+async def add_dkp(
     server_id: int,
     user_id: int,
     amount: int,
     reason: Optional[str] = None,
 ) -> int:
     """Add DKP to a user and return new total."""
-    return _change_dkp(server_id, user_id, abs(amount), reason)
+    total = await write_dkp(_change_dkp, server_id, user_id, abs(amount), reason)
+    publish_totals({(server_id, user_id): total})
+    return total
 
 
-def remove_dkp(
+async def remove_dkp(
     server_id: int,
     user_id: int,
     amount: int,
     reason: Optional[str] = None,
 ) -> int:
     """Remove DKP from a user and return new total."""
-    return _change_dkp(server_id, user_id, -abs(amount), reason)
+    total = await write_dkp(_change_dkp, server_id, user_id, -abs(amount), reason)
+    publish_totals({(server_id, user_id): total})
+    return total
 
 
-def get_dkp(server_id: int, user_id: int) -> int:
-    """Get current DKP for a user."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT points FROM dkp WHERE server_id = ? AND user_id = ?;",
-        (server_id, user_id),
+async def change_dkp_bulk(
+    server_id: int,
+    deltas: Dict[int, int],
+    reason: Optional[str] = None,
+) -> Dict[int, int]:
+    """Apply {user_id: delta} in one transaction and return {user_id: new total}."""
+    if not deltas:
+        return {}
+    changes = [(server_id, u, d, reason) for u, d in deltas.items()]
+    totals = await write_dkp(_apply_changes, changes)
+    publish_totals(totals)
+    return {u: totals.get((server_id, u), 0) for u in deltas}
+
+
+async def add_dkp_bulk(
+    server_id: int,
+    user_ids: Iterable[int],
+    amount: int,
+    reason: Optional[str] = None,
+) -> Dict[int, int]:
+    """Add the same amount of DKP to many users and return their new totals."""
+    return await change_dkp_bulk(
+        server_id,
+        {u: abs(amount) for u in user_ids},
+        reason,
     )
-    row = cur.fetchone()
-    conn.close()
-    return int(row["points"]) if row else 0
 
 
-def get_leaderboard(server_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+async def get_dkp(server_id: int, user_id: int) -> int:
+    """Get current DKP for a user."""
+    return (await _get_standings(server_id)).get(user_id)
+
+
+async def get_leaderboard(
+    server_id: int,
+    limit: int = 10,
+    offset: int = 0,
+) -> List[Tuple[int, int]]:
     """Return list of (user_id, points) sorted by DKP desc."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT user_id, points
-        FROM dkp
-        WHERE server_id = ?
-        ORDER BY points DESC
-        LIMIT ?;
-        """,
-        (server_id, limit),
+    return (await _get_standings(server_id)).page(offset, limit)
+
+
+async def get_leaderboard_page(
+    server_id: int,
+    offset: int,
+    limit: int,
+) -> Tuple[List[Tuple[int, int, int]], int]:
+    """Return ([(rank, user_id, points), ...], number of ranked users)."""
+    standings = await _get_standings(server_id)
+    rows = [
+        (standings.rank(user_id), user_id, points)
+        for user_id, points in standings.page(offset, limit)
+    ]
+    return rows, len(standings)
+
+
+async def get_rank(server_id: int, user_id: int) -> Tuple[Optional[int], int, int]:
+    """Return (rank or None, points, number of ranked users) for a user."""
+    standings = await _get_standings(server_id)
+    return standings.rank(user_id), standings.get(user_id), len(standings)
+
+
+async def get_history(
+    server_id: int,
+    user_id: int,
+    before_id: Optional[int] = None,
+    limit: int = 10,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Return one page of a user's dkp_log entries, newest first.
+
+    Pass the returned cursor as `before_id` to get the next (older) page;
+    it is None on the last page.
+    """
+    return await run_db(_get_history, server_id, user_id, before_id, limit)
+
+
+async def get_audit_log(
+    server_id: int,
+    reason: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[Tuple[str, int]] = None,
+    limit: int = 10,
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+    """Return one page of a guild's dkp_log, newest first.
+
+    Optionally filtered by exact reason and a [since, until) UTC time
+    window. Pass the returned cursor as `before` for the next page.
+    """
+    return await run_db(
+        _get_audit_log,
+        server_id,
+        reason,
+        since.strftime(_LOG_TIME_FORMAT) if since else None,
+        until.strftime(_LOG_TIME_FORMAT) if until else None,
+        before,
+        limit,
     )
-    rows = cur.fetchall()
-    conn.close()
-    return [(int(r["user_id"]), int(r["points"])) for r in rows]
@@ -0,0 +1,878 @@
+import asyncio
+import random
+import re
+import sqlite3
+import string
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from db.dkp_db import (
+    _add_column,
+    _change_dkp,
+    publish_totals,
+    run_db,
+    run_write,
+    write_dkp,
+)
+from utils.log import get_logger
+from utils.lru import LRUCache
+
+log = get_logger("events_db")
+
+# Event times are naive local datetimes, as typed into /create_event.
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# code -> reward code info (see _get_reward_code), plus a "redeemed" set of
+# user IDs this process has already seen redeem it.
+_code_cache: LRUCache[str, Dict[str, Any]] = LRUCache(config.REWARD_CODE_CACHE_SIZE)
+
+# event_id -> {"name", "limit", "status", "members": set of user IDs}. A
+# join reserves its slot here before awaiting the DB, so a burst of clicks
+# can't overfill an event; the DB write re-checks the limit, which keeps
+# several clusters honest too.
+_rosters: LRUCache[int, Dict[str, Any]] = LRUCache(config.RSVP_CACHE_SIZE)
+_rosters_loading: Dict[int, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+
+# A posted copy of an event: (guild_id, channel_id, message_id, webhook_id),
+# webhook_id being None unless it was sent through a broadcast webhook.
+EventMessage = Tuple[int, int, int, Optional[int]]
+
+# Whether events_fts exists; set by _init_fts.
+_fts_enabled = False
+
+# Most events a single /events or /event_search call returns.
+SEARCH_LIMIT = 10
+
+_WORD = re.compile(r"\w+")
+
+
+def _to_db(dt: Optional[datetime]) -> Optional[str]:
+    return dt.strftime(TIME_FORMAT) if dt else None
+
+
+def _from_db(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, TIME_FORMAT) if value else None
+
+
+def generate_reward_code(length: int = 8) -> str:
+    alphabet = string.ascii_uppercase + string.digits
+    return "".join(random.choices(alphabet, k=length))
+
+
+# ----------------- schema -----------------
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id    INTEGER NOT NULL,
+            name        TEXT NOT NULL,
+            genre       TEXT,
+            game        TEXT,
+            type        TEXT NOT NULL,
+            description TEXT,
+            user_limit  INTEGER,
+            start_time  TEXT,
+            end_time    TEXT,
+            creator_id  INTEGER NOT NULL,
+            dkp_reward  INTEGER NOT NULL DEFAULT 0,
+            created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+
+    # Lifecycle columns, added to databases created before the scheduler.
+    if _add_column(conn, "events", "status", "TEXT NOT NULL DEFAULT 'scheduled'"):
+        # Settle events that are already under way or over, so upgrading
+        # doesn't post a burst of stale notices.
+        now = _to_db(datetime.now())
+        conn.execute(
+            """
+            UPDATE events
+            SET status = CASE
+                WHEN COALESCE(end_time, start_time) < ? THEN 'ended'
+                ELSE 'started'
+            END
+            WHERE start_time < ? OR end_time < ?;
+            """,
+            (now, now, now),
+        )
+    _add_column(conn, "events", "reminder_sent", "INTEGER NOT NULL DEFAULT 0")
+    # Events paying DKP by voice attendance (see attendance_db).
+    _add_column(conn, "events", "voice_channel_id", "INTEGER")
+
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_guild ON events (guild_id, id);"
+    )
+
+    # Serves the scheduler's "not ended yet" scan and the default /events
+    # listing (upcoming events by start time); supersedes idx_events_status.
+    conn.execute("DROP INDEX IF EXISTS idx_events_status;")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_status_start
+        ON events (status, start_time);
+        """
+    )
+
+    # Discovery (/events, /event_search): a guild sees its own events and
+    # every public one, filtered by game and ordered by start time. Genres
+    # are too few to be worth an index; they're filtered on the way.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_start ON events (start_time);"
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_game
+        ON events (game COLLATE NOCASE, start_time);
+        """
+    )
+
+    _init_fts(conn)
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reward_codes (
+            code       TEXT PRIMARY KEY,
+            guild_id   INTEGER NOT NULL,
+            event_id   INTEGER NOT NULL REFERENCES events (id),
+            amount     INTEGER NOT NULL,
+            creator_id INTEGER NOT NULL,
+            expires_at TEXT NOT NULL
+        );
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reward_codes_expires
+        ON reward_codes (expires_at);
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reward_codes_event
+        ON reward_codes (event_id);
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS event_participants (
+            event_id  INTEGER NOT NULL,
+            user_id   INTEGER NOT NULL,
+            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (event_id, user_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+    # Every posted copy of an event (origin and broadcasts), so RSVP
+    # counts can be kept current on all of them.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS event_messages (
+            event_id   INTEGER NOT NULL,
+            guild_id   INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            PRIMARY KEY (event_id, message_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    # Set when a copy was posted through the guild's broadcast webhook,
+    # which is then the only way to edit it.
+    _add_column(conn, "event_messages", "webhook_id", "INTEGER")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS code_redemptions (
+            code        TEXT NOT NULL,
+            user_id     INTEGER NOT NULL,
+            redeemed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (code, user_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def _init_fts(conn: sqlite3.Connection) -> None:
+    """Full-text index over event names and descriptions, kept in sync by
+    triggers. Falls back to LIKE scans if SQLite was built without FTS5."""
+    global _fts_enabled
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events_fts';"
+    ).fetchone()
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5 (
+                name,
+                description,
+                content = 'events',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+    except sqlite3.OperationalError as e:
+        log.warning("FTS5 unavailable, event search will be slower: %s", e)
+        _fts_enabled = False
+        return
+    _fts_enabled = True
+
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS events_fts_update
+        AFTER UPDATE OF name, description ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO events_fts (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END;
+        """
+    )
+
+    if not exists:
+        # Hits in the name count for more than hits in the description.
+        conn.execute(
+            "INSERT INTO events_fts (events_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)');"
+        )
+        # Index events created before search existed.
+        conn.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild');")
+
+
+async def init_db() -> None:
+    """Create event and reward code tables if they don't exist."""
+    await run_write(_init_db)
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _create_event(
+    conn: sqlite3.Connection,
+    event: Dict[str, Any],
+    code_expires_at: datetime,
+) -> Tuple[int, Optional[str]]:
+    cur = conn.execute(
+        """
+        INSERT INTO events (
+            guild_id, name, genre, game, type, description,
+            user_limit, start_time, end_time, creator_id, dkp_reward,
+            voice_channel_id
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """,
+        (
+            event["guild_id"],
+            event["name"],
+            event["genre"],
+            event["game"],
+            event["type"],
+            event["description"],
+            event["limit"],
+            _to_db(event["start"]),
+            _to_db(event["end"]),
+            event["creator"],
+            event["dkp_reward"],
+            event.get("voice_channel_id"),
+        ),
+    )
+    event_id = int(cur.lastrowid)
+
+    # Events linked to a voice channel pay by attendance instead.
+    reward_code: Optional[str] = None
+    if event["dkp_reward"] > 0 and not event.get("voice_channel_id"):
+        while reward_code is None:
+            code = generate_reward_code()
+            cur = conn.execute(
+                """
+                INSERT OR IGNORE INTO reward_codes (
+                    code, guild_id, event_id, amount, creator_id, expires_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?);
+                """,
+                (
+                    code,
+                    event["guild_id"],
+                    event_id,
+                    event["dkp_reward"],
+                    event["creator"],
+                    _to_db(code_expires_at),
+                ),
+            )
+            if cur.rowcount:
+                reward_code = code
+
+    return event_id, reward_code
+
+
+def _row_to_event(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": int(row["id"]),
+        "guild_id": int(row["guild_id"]),
+        "name": row["name"],
+        "genre": row["genre"],
+        "game": row["game"],
+        "type": row["type"],
+        "description": row["description"],
+        "limit": row["user_limit"],
+        "start": _from_db(row["start_time"]),
+        "end": _from_db(row["end_time"]),
+        "creator": int(row["creator_id"]),
+        "dkp_reward": int(row["dkp_reward"]),
+        "voice_channel_id": row["voice_channel_id"],
+        "status": row["status"],
+    }
+
+
+def _get_event(conn: sqlite3.Connection, event_id: int) -> Optional[Dict[str, Any]]:
+    row = conn.execute("SELECT * FROM events WHERE id = ?;", (event_id,)).fetchone()
+    return _row_to_event(row) if row else None
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, the last
+    one as a prefix (so results show up while a word is still being typed).
+    Words are quoted, so FTS5 operators in user input are taken literally."""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    quoted = ['"' + w.replace('"', '""') + '"' for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _search_events(
+    conn: sqlite3.Connection,
+    guild_id: int,
+    filters: Dict[str, Any],
+    text: Optional[str],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    # A guild sees its own events and every public event.
+    where = ["(e.guild_id = ? OR e.type = 'public')"]
+    params: List[Any] = [guild_id]
+
+    for column in ("game", "genre", "type"):
+        if filters.get(column):
+            where.append(f"e.{column} = ? COLLATE NOCASE")
+            params.append(filters[column])
+
+    after, before = filters.get("after"), filters.get("before")
+    if after is not None:
+        where.append("e.start_time >= ?")
+        params.append(_to_db(after))
+    if before is not None:
+        where.append("e.start_time < ?")
+        params.append(_to_db(before))
+    if text is None and after is None and before is None:
+        # Plain listings default to what's still ahead; searches cover
+        # the whole history.
+        where.append("e.status IN ('scheduled', 'started')")
+
+    source = "events e"
+    if after is None and before is None:
+        order = "e.start_time IS NULL, e.start_time, e.id"
+    else:
+        # start_time is never NULL inside a window, and plain ordering
+        # lets SQLite walk the start_time index instead of sorting.
+        order = "e.start_time, e.id"
+    if text is not None:
+        if _fts_enabled:
+            source = "events_fts JOIN events e ON e.id = events_fts.rowid"
+            where.append("events_fts MATCH ?")
+            params.append(text)
+            order = "events_fts.rank, e.start_time DESC"
+        else:
+            for word in _WORD.findall(text):
+                where.append("(e.name LIKE ? OR e.description LIKE ?)")
+                params.extend([f"%{word}%"] * 2)
+            order = "e.start_time DESC, e.id DESC"
+
+    rows = conn.execute(
+        f"""
+        SELECT e.*
+        FROM {source}
+        WHERE {" AND ".join(where)}
+        ORDER BY {order}
+        LIMIT ?;
+        """,
+        (*params, limit),
+    )
+    return [_row_to_event(r) for r in rows]
+
+
+def _get_event_terms(conn: sqlite3.Connection) -> Tuple[List[str], List[str]]:
+    """Distinct games and genres of all events, for autocomplete."""
+    games = conn.execute(
+        "SELECT DISTINCT game FROM events WHERE game IS NOT NULL;"
+    ).fetchall()
+    genres = conn.execute(
+        "SELECT DISTINCT genre FROM events WHERE genre IS NOT NULL;"
+    ).fetchall()
+    return [r["game"] for r in games], [r["genre"] for r in genres]
+
+
+def _get_reward_code(conn: sqlite3.Connection, code: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        """
+        SELECT c.code, c.guild_id, c.event_id, c.amount, c.expires_at,
+               e.name AS event_name
+        FROM reward_codes c
+        LEFT JOIN events e ON e.id = c.event_id
+        WHERE c.code = ?;
+        """,
+        (code,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "code": row["code"],
+        "guild_id": int(row["guild_id"]),
+        "event_id": int(row["event_id"]),
+        "amount": int(row["amount"]),
+        "expires_at": _from_db(row["expires_at"]),
+        "event_name": row["event_name"] or f"Event {row['event_id']}",
+    }
+
+
+def _redeem_code(
+    conn: sqlite3.Connection,
+    info: Dict[str, Any],
+    user_id: int,
+    now: datetime,
+) -> Tuple[str, int]:
+    """Record a redemption and pay out, atomically. Returns (status, total)."""
+    # `info` may be cached; the code could have been closed since.
+    live = conn.execute(
+        "SELECT 1 FROM reward_codes WHERE code = ? AND expires_at > ?;",
+        (info["code"], _to_db(now)),
+    ).fetchone()
+    if live is None:
+        return "expired", 0
+
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO code_redemptions (code, user_id) VALUES (?, ?);",
+        (info["code"], user_id),
+    )
+    if not cur.rowcount:
+        return "already", 0
+
+    total = _change_dkp(
+        conn,
+        info["guild_id"],
+        user_id,
+        info["amount"],
+        f"Event reward ({info['event_name']})",
+    )
+    return "ok", total
+
+
+def _load_roster(conn: sqlite3.Connection, event_id: int) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT name, user_limit, status FROM events WHERE id = ?;", (event_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    members = conn.execute(
+        "SELECT user_id FROM event_participants WHERE event_id = ?;", (event_id,)
+    )
+    return {
+        "name": row["name"],
+        "limit": row["user_limit"] or None,
+        "status": row["status"],
+        "members": {int(r["user_id"]) for r in members},
+    }
+
+
+def _join_event(conn: sqlite3.Connection, event_id: int, user_id: int) -> str:
+    """Add a participant unless the event is full. Returns ok/already/full."""
+    if conn.execute(
+        "SELECT 1 FROM event_participants WHERE event_id = ? AND user_id = ?;",
+        (event_id, user_id),
+    ).fetchone():
+        return "already"
+
+    cur = conn.execute(
+        """
+        INSERT INTO event_participants (event_id, user_id)
+        SELECT ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM events
+            WHERE id = ?
+              AND user_limit > 0
+              AND user_limit <= (
+                SELECT COUNT(*) FROM event_participants WHERE event_id = ?
+              )
+        );
+        """,
+        (event_id, user_id, event_id, event_id),
+    )
+    return "ok" if cur.rowcount else "full"
+
+
+def _leave_event(conn: sqlite3.Connection, event_id: int, user_id: int) -> bool:
+    cur = conn.execute(
+        "DELETE FROM event_participants WHERE event_id = ? AND user_id = ?;",
+        (event_id, user_id),
+    )
+    return cur.rowcount > 0
+
+
+def _add_event_messages(
+    conn: sqlite3.Connection,
+    event_id: int,
+    messages: List[EventMessage],
+) -> None:
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO event_messages (
+            event_id, guild_id, channel_id, message_id, webhook_id
+        )
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        [(event_id, *m) for m in messages],
+    )
+
+
+def _get_event_messages(
+    conn: sqlite3.Connection,
+    event_id: int,
+) -> List[EventMessage]:
+    rows = conn.execute(
+        """
+        SELECT guild_id, channel_id, message_id, webhook_id
+        FROM event_messages
+        WHERE event_id = ?;
+        """,
+        (event_id,),
+    )
+    return [
+        (
+            int(r["guild_id"]),
+            int(r["channel_id"]),
+            int(r["message_id"]),
+            int(r["webhook_id"]) if r["webhook_id"] else None,
+        )
+        for r in rows
+    ]
+
+
+def _get_scheduled_events(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    rows = conn.execute(
+        """
+        SELECT e.id, e.guild_id, e.name, e.start_time, e.end_time,
+               e.status, e.reminder_sent, e.dkp_reward, e.voice_channel_id,
+               (SELECT MAX(c.expires_at) FROM reward_codes c
+                WHERE c.event_id = e.id) AS code_expires_at
+        FROM events e
+        WHERE (e.status <> 'ended'
+               AND (e.start_time IS NOT NULL OR e.end_time IS NOT NULL))
+           OR e.id IN (SELECT event_id FROM reward_codes);
+        """
+    ).fetchall()
+    return [
+        {
+            "id": int(r["id"]),
+            "guild_id": int(r["guild_id"]),
+            "name": r["name"],
+            "start": _from_db(r["start_time"]),
+            "end": _from_db(r["end_time"]),
+            "status": r["status"],
+            "reminder_sent": bool(r["reminder_sent"]),
+            "dkp_reward": int(r["dkp_reward"]),
+            "voice_channel_id": r["voice_channel_id"],
+            "code_expires_at": _from_db(r["code_expires_at"]),
+        }
+        for r in rows
+    ]
+
+
+def _set_event_state(
+    conn: sqlite3.Connection,
+    event_id: int,
+    status: Optional[str],
+    reminder_sent: Optional[bool],
+) -> None:
+    conn.execute(
+        """
+        UPDATE events
+        SET status = COALESCE(?, status),
+            reminder_sent = COALESCE(?, reminder_sent)
+        WHERE id = ?;
+        """,
+        (status, reminder_sent, event_id),
+    )
+
+
+def _close_reward_codes(
+    conn: sqlite3.Connection,
+    event_id: int,
+    now: datetime,
+) -> List[str]:
+    cutoff = _to_db(now)
+    codes = [
+        r["code"]
+        for r in conn.execute(
+            "SELECT code FROM reward_codes WHERE event_id = ? AND expires_at <= ?;",
+            (event_id, cutoff),
+        )
+    ]
+    conn.executemany(
+        "DELETE FROM code_redemptions WHERE code = ?;", [(c,) for c in codes]
+    )
+    conn.executemany("DELETE FROM reward_codes WHERE code = ?;", [(c,) for c in codes])
+    return codes
+
+
+# ----------------- public API -----------------
+
+async def create_event(event: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+    """Store an event and, if it pays DKP, a reward code for it.
+
+    Events with a voice_channel_id get no code; they pay by attendance.
+
+    Returns (event_id, reward_code or None). The code expires
+    REWARD_CODE_GRACE after the event ends, or REWARD_CODE_TTL after
+    creation for events without an end time.
+    """
+    return await run_write(_create_event, event, reward_code_expiry(event))
+
+
+def reward_code_expiry(event: Dict[str, Any]) -> datetime:
+    """When a new event's reward code should stop working."""
+    if event["end"] is not None:
+        return event["end"] + config.REWARD_CODE_GRACE
+    return datetime.now() + config.REWARD_CODE_TTL
+
+
+async def get_event(event_id: int) -> Optional[Dict[str, Any]]:
+    return await run_db(_get_event, event_id)
+
+
+async def get_reward_code(code: str) -> Optional[Dict[str, Any]]:
+    """Look up a reward code, serving hot codes from the in-memory LRU."""
+    info = _code_cache.get(code)
+    if info is None:
+        info = await run_db(_get_reward_code, code)
+        if info is None:
+            return None
+        info["redeemed"] = set()
+        _code_cache.set(code, info)
+    return info
+
+
+async def redeem_code(
+    code: str,
+    guild_id: int,
+    user_id: int,
+) -> Tuple[str, Optional[Dict[str, Any]], int]:
+    """Redeem a reward code for a user.
+
+    Returns (status, code info, new total) where status is one of "ok",
+    "invalid", "expired", "wrong_guild" or "already". Rejections that the cached code
+    info can answer never reach the DB write path.
+    """
+    info = await get_reward_code(code)
+    if info is None or info["expires_at"] <= datetime.now():
+        return "invalid", info, 0
+    if info["guild_id"] != guild_id:
+        return "wrong_guild", info, 0
+    if user_id in info["redeemed"]:
+        return "already", info, 0
+
+    status, total = await write_dkp(_redeem_code, info, user_id, datetime.now())
+    if status == "expired":
+        _code_cache.pop(code)
+        return status, info, 0
+    info["redeemed"].add(user_id)
+    if status == "ok":
+        publish_totals({(guild_id, user_id): total})
+    return status, info, total
+
+
+async def get_scheduled_events() -> List[Dict[str, Any]]:
+    """Events that still have a lifecycle deadline ahead of them.
+
+    That is every event not yet ended that has a start or end time, plus
+    any event whose reward code hasn't been closed. Each dict has id,
+    guild_id, name, start, end, status, reminder_sent, dkp_reward,
+    voice_channel_id and code_expires_at.
+    """
+    return await run_db(_get_scheduled_events)
+
+
+async def set_event_status(event_id: int, status: str) -> None:
+    """Move an event to "scheduled", "started" or "ended"."""
+    await run_write(_set_event_state, event_id, status, None)
+    roster = _rosters.get(event_id)
+    if roster is not None:
+        roster["status"] = status
+
+
+async def mark_reminded(event_id: int) -> None:
+    await run_write(_set_event_state, event_id, None, True)
+
+
+async def close_reward_codes(event_id: int) -> int:
+    """Delete an event's expired reward codes and their redemptions."""
+    codes = await run_write(_close_reward_codes, event_id, datetime.now())
+    for code in codes:
+        _code_cache.pop(code)
+    return len(codes)
+
+
+# ----------------- discovery -----------------
+
+async def search_events(
+    guild_id: int,
+    *,
+    text: Optional[str] = None,
+    game: Optional[str] = None,
+    genre: Optional[str] = None,
+    event_type: Optional[str] = None,
+    after: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+    limit: int = SEARCH_LIMIT,
+) -> List[Dict[str, Any]]:
+    """Events visible to a guild, optionally matching free text.
+
+    Without text or a time window only upcoming and running events are
+    listed, soonest first; text searches rank the whole history by
+    relevance. Returns at most limit events.
+    """
+    query = None
+    if text is not None:
+        query = _fts_query(text) if _fts_enabled else text
+        if query is None:
+            return []
+    filters = {
+        "game": game,
+        "genre": genre,
+        "type": event_type,
+        "after": after,
+        "before": before,
+    }
+    return await run_db(_search_events, guild_id, filters, query, limit)
+
+
+async def get_event_terms() -> Tuple[List[str], List[str]]:
+    return await run_db(_get_event_terms)
+
+
+# ----------------- RSVPs -----------------
+
+async def _get_roster(event_id: int) -> Optional[Dict[str, Any]]:
+    """Cached roster for an event, loading it once even under a burst."""
+    roster = _rosters.get(event_id)
+    if roster is not None:
+        return roster
+
+    pending = _rosters_loading.get(event_id)
+    if pending is None:
+        pending = asyncio.ensure_future(run_db(_load_roster, event_id))
+        _rosters_loading[event_id] = pending
+        try:
+            roster = await asyncio.shield(pending)
+        finally:
+            _rosters_loading.pop(event_id, None)
+        if roster is not None:
+            _rosters.set(event_id, roster)
+        return roster
+    return await asyncio.shield(pending)
+
+
+async def join_event(
+    event_id: int,
+    user_id: int,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Sign a user up for an event.
+
+    Returns (status, roster) where status is "ok", "already", "full",
+    "closed" (event ended) or "missing"; roster has name, limit and
+    members for building the reply.
+    """
+    roster = await _get_roster(event_id)
+    if roster is None:
+        return "missing", None
+    if roster["status"] == "ended":
+        return "closed", roster
+    members = roster["members"]
+    if user_id in members:
+        return "already", roster
+    if roster["limit"] and len(members) >= roster["limit"]:
+        return "full", roster
+
+    # Reserve the slot before awaiting so concurrent joins see it.
+    members.add(user_id)
+    try:
+        status = await run_write(_join_event, event_id, user_id)
+    except BaseException:
+        members.discard(user_id)
+        raise
+    if status == "full":
+        # Filled up through another process.
+        members.discard(user_id)
+    return status, roster
+
+
+async def leave_event(
+    event_id: int,
+    user_id: int,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Remove a user from an event; status is "ok", "not_joined", "closed" or "missing"."""
+    roster = await _get_roster(event_id)
+    if roster is None:
+        return "missing", None
+    if roster["status"] == "ended":
+        return "closed", roster
+    if user_id not in roster["members"]:
+        return "not_joined", roster
+
+    roster["members"].discard(user_id)
+    try:
+        await run_write(_leave_event, event_id, user_id)
+    except BaseException:
+        roster["members"].add(user_id)
+        raise
+    return "ok", roster
+
+
+async def get_roster(event_id: int) -> Optional[Dict[str, Any]]:
+    return await _get_roster(event_id)
+
+
+def forget_roster(event_id: int) -> None:
+    """Drop a cached roster, e.g. after another cluster changed it."""
+    _rosters.pop(event_id)
+
+
+async def add_event_messages(event_id: int, messages: List[EventMessage]) -> None:
+    """Remember posted copies of an event (see EventMessage)."""
+    if messages:
+        await run_write(_add_event_messages, event_id, messages)
+
+
+async def get_event_messages(event_id: int) -> List[EventMessage]:
+    return await run_db(_get_event_messages, event_id)
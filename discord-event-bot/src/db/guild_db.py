@@ -0,0 +1,190 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import config
+from db.dkp_db import _add_column, run_db, run_write
+from utils.log import get_logger
+
+log = get_logger("guild_db")
+
+
+def _init_db(conn: sqlite3.Connection) -> Optional[Tuple[Path, int]]:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id          INTEGER PRIMARY KEY,
+            events_channel_id INTEGER
+        );
+        """
+    )
+
+    # Webhook in the events channel that broadcasts are posted through
+    # (BROADCAST_WEBHOOKS); created on first use.
+    _add_column(conn, "guild_settings", "webhook_id", "INTEGER")
+    _add_column(conn, "guild_settings", "webhook_token", "TEXT")
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS guild_games (
+            guild_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            game     TEXT NOT NULL,
+            PRIMARY KEY (guild_id, position)
+        ) WITHOUT ROWID;
+        """
+    )
+
+    return _migrate_prefs_file(conn)
+
+
+def _prefs_file() -> Optional[Path]:
+    """The old server_prefs.json, if there is one.
+
+    It used to live in the working directory the bot was started from, so
+    look there as well as in DATA_DIR.
+    """
+    for path in (config.DATA_DIR / "server_prefs.json", Path.cwd() / "server_prefs.json"):
+        if path.exists():
+            return path
+    return None
+
+
+def _migrate_prefs_file(conn: sqlite3.Connection) -> Optional[Tuple[Path, int]]:
+    """One-time import of the old server_prefs.json into guild_games.
+
+    Returns (imported file, guild count); init_db renames the file only
+    once the import has been committed.
+    """
+    path = _prefs_file()
+    if path is None:
+        return None
+    if conn.execute("SELECT 1 FROM guild_games LIMIT 1;").fetchone():
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        prefs: Dict[str, List[str]] = json.load(f)
+    conn.executemany(
+        "INSERT INTO guild_games (guild_id, position, game) VALUES (?, ?, ?);",
+        [
+            (int(guild_id), position, game)
+            for guild_id, games in prefs.items()
+            for position, game in enumerate(games)
+        ],
+    )
+    return path, len(prefs)
+
+
+async def init_db() -> None:
+    """Create guild settings tables if they don't exist."""
+    migrated = await run_write(_init_db)
+    if migrated is not None:
+        path, guilds = migrated
+        path.rename(path.with_suffix(".json.migrated"))
+        log.info("Migrated guild preferences", extra={"guilds": guilds, "path": str(path)})
+
+
+def _get_events_channels(conn: sqlite3.Connection) -> Dict[int, int]:
+    rows = conn.execute(
+        """
+        SELECT guild_id, events_channel_id
+        FROM guild_settings
+        WHERE events_channel_id IS NOT NULL;
+        """
+    ).fetchall()
+    return {int(r["guild_id"]): int(r["events_channel_id"]) for r in rows}
+
+
+def _set_events_channel(
+    conn: sqlite3.Connection,
+    guild_id: int,
+    channel_id: Optional[int],
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO guild_settings (guild_id, events_channel_id)
+        VALUES (?, ?)
+        ON CONFLICT(guild_id) DO UPDATE SET events_channel_id = excluded.events_channel_id;
+        """,
+        (guild_id, channel_id),
+    )
+
+
+async def get_events_channels() -> Dict[int, int]:
+    """Return {guild_id: events channel id} for every configured guild."""
+    return await run_db(_get_events_channels)
+
+
+async def set_events_channel(guild_id: int, channel_id: Optional[int]) -> None:
+    """Remember a guild's events channel (None to forget it)."""
+    await run_write(_set_events_channel, guild_id, channel_id)
+
+
+def _get_webhooks(conn: sqlite3.Connection) -> Dict[int, Tuple[int, str]]:
+    rows = conn.execute(
+        """
+        SELECT guild_id, webhook_id, webhook_token
+        FROM guild_settings
+        WHERE webhook_id IS NOT NULL;
+        """
+    ).fetchall()
+    return {
+        int(r["guild_id"]): (int(r["webhook_id"]), r["webhook_token"]) for r in rows
+    }
+
+
+def _set_webhook(
+    conn: sqlite3.Connection,
+    guild_id: int,
+    webhook: Optional[Tuple[int, str]],
+) -> None:
+    webhook_id, token = webhook if webhook else (None, None)
+    conn.execute(
+        """
+        INSERT INTO guild_settings (guild_id, webhook_id, webhook_token)
+        VALUES (?, ?, ?)
+        ON CONFLICT(guild_id) DO UPDATE SET
+            webhook_id = excluded.webhook_id,
+            webhook_token = excluded.webhook_token;
+        """,
+        (guild_id, webhook_id, token),
+    )
+
+
+async def get_webhooks() -> Dict[int, Tuple[int, str]]:
+    """Return {guild_id: (webhook id, token)} for guilds with a broadcast webhook."""
+    return await run_db(_get_webhooks)
+
+
+async def set_webhook(guild_id: int, webhook: Optional[Tuple[int, str]]) -> None:
+    """Remember a guild's broadcast webhook (None to forget it)."""
+    await run_write(_set_webhook, guild_id, webhook)
+
+
+def _get_all_games(conn: sqlite3.Connection) -> Dict[int, List[str]]:
+    prefs: Dict[int, List[str]] = {}
+    rows = conn.execute(
+        "SELECT guild_id, game FROM guild_games ORDER BY guild_id, position;"
+    )
+    for r in rows:
+        prefs.setdefault(int(r["guild_id"]), []).append(r["game"])
+    return prefs
+
+
+def _set_games(conn: sqlite3.Connection, guild_id: int, games: List[str]) -> None:
+    conn.execute("DELETE FROM guild_games WHERE guild_id = ?;", (guild_id,))
+    conn.executemany(
+        "INSERT INTO guild_games (guild_id, position, game) VALUES (?, ?, ?);",
+        [(guild_id, position, game) for position, game in enumerate(games)],
+    )
+
+
+async def get_all_games() -> Dict[int, List[str]]:
+    """Return {guild_id: [game, ...]} for every guild with preferences."""
+    return await run_db(_get_all_games)
+
+
+async def set_games(guild_id: int, games: List[str]) -> None:
+    """Replace one guild's game preferences (an empty list clears them)."""
+    await run_write(_set_games, guild_id, games)
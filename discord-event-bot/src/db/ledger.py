@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+from typing import Any, Callable, List, Optional, Tuple
+
+from db import dkp_db
+
+# (fn, args, future) — fn(conn, *args) runs inside the group transaction.
+_Op = Tuple[Callable[..., Any], Tuple[Any, ...], asyncio.Future]
+
+
+def _group_commit(
+    conn: sqlite3.Connection,
+    ops: List[Tuple[Callable[..., Any], Tuple[Any, ...]]],
+) -> List[Tuple[bool, Any]]:
+    """Run every op in one transaction, isolating each in a savepoint.
+
+    Returns (ok, result_or_exception) per op. A failing op is rolled back
+    on its own; the rest of the batch still commits.
+    """
+    results: List[Tuple[bool, Any]] = []
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        for fn, args in ops:
+            conn.execute("SAVEPOINT op;")
+            try:
+                results.append((True, fn(conn, *args)))
+            except Exception as e:
+                conn.execute("ROLLBACK TO op;")
+                results.append((False, e))
+            conn.execute("RELEASE op;")
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+    conn.execute("COMMIT;")
+    return results
+
+
+class WriteBehindLedger:
+    """Coalesces DKP writes into group commits.
+
+    Writes are queued in memory and committed together once the batch is
+    `max_batch` long or the oldest write has waited `max_delay` seconds.
+    Each caller's awaitable resolves with its own result after the batch
+    that contains it is committed.
+    """
+
+    def __init__(self, max_delay: float = 0.05, max_batch: int = 256):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue[Optional[_Op]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the commit loop and route dkp_db writes through it."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            dkp_db.set_write_behind(self)
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Queue fn(conn, *args) and wait until its batch is durable."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, future))
+        return await future
+
+    async def close(self) -> None:
+        """Flush everything queued so far and stop the commit loop."""
+        if self._task is None:
+            return
+        # New writes go straight to the DB from now on.
+        dkp_db.set_write_behind(None)
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        op = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        op = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[_Op]) -> None:
+        try:
+            results = await dkp_db.run_db(
+                _group_commit,
+                [(fn, args) for fn, args, _ in batch],
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
@@ -0,0 +1,43 @@
+import sqlite3
+from typing import Optional
+
+from db.dkp_db import run_db, run_write
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bot_meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+        """
+    )
+
+
+async def init_db() -> None:
+    """Create the bot-wide key/value table if it doesn't exist."""
+    await run_write(_init_db)
+
+
+def _get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM bot_meta WHERE key = ?;", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        """
+        INSERT INTO bot_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value;
+        """,
+        (key, value),
+    )
+
+
+async def get_meta(key: str) -> Optional[str]:
+    return await run_db(_get_meta, key)
+
+
+async def set_meta(key: str, value: str) -> None:
+    await run_write(_set_meta, key, value)
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import random
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import config
+from db.dkp_db import run_db, run_write
+from db.events_db import _add_event_messages
+
+# Outbox rows move pending -> sending -> sent | skipped | failed; a failed
+# attempt that may succeed later goes back to pending with a later
+# next_attempt_at. Rows left in "sending" by a crash are "in doubt": the
+# message may or may not have been posted, so the next attempt looks for
+# it in the channel before sending again.
+DONE_STATUSES = ("sent", "skipped", "failed")
+
+# (shard_count, shard_ids) of this process, or None for "every guild".
+Shards = Optional[Tuple[int, Sequence[int]]]
+
+
+def delivery_nonce(event_id: int, guild_id: int) -> str:
+    """Idempotency key for one delivery.
+
+    Sent as the message nonce, which Discord enforces: a retried send with
+    the same nonce returns the original message instead of a duplicate.
+    Discord caps nonces at 25 characters, hence the hash.
+    """
+    digest = hashlib.blake2b(f"{event_id}:{guild_id}".encode(), digest_size=8)
+    return digest.hexdigest()
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter after `attempts` failed tries."""
+    delay = min(
+        config.BROADCAST_RETRY_BASE * 2 ** max(attempts - 1, 0),
+        config.BROADCAST_RETRY_MAX,
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _shard_filter(shards: Shards) -> Tuple[str, List[int]]:
+    """SQL restricting guild_id to the shards this process runs."""
+    if shards is None:
+        return "1", []
+    count, ids = shards
+    placeholders = ", ".join("?" for _ in ids)
+    return f"((guild_id >> 22) % ?) IN ({placeholders})", [count, *ids]
+
+
+# ----------------- schema -----------------
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    # One row per broadcast event: what to post, shared by its deliveries.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            event_id        INTEGER PRIMARY KEY,
+            origin_guild_id INTEGER NOT NULL,
+            game            TEXT NOT NULL,
+            embed           TEXT NOT NULL,
+            created_at      REAL NOT NULL
+        );
+        """
+    )
+
+    # One row per (event, target guild); the key makes enqueueing the same
+    # delivery twice a no-op.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_outbox (
+            event_id        INTEGER NOT NULL,
+            guild_id        INTEGER NOT NULL,
+            status          TEXT NOT NULL DEFAULT 'pending',
+            attempts        INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            in_doubt        INTEGER NOT NULL DEFAULT 0,
+            last_error      TEXT,
+            updated_at      REAL NOT NULL,
+            PRIMARY KEY (event_id, guild_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON broadcast_outbox (status, next_attempt_at);
+        """
+    )
+
+
+async def init_db() -> None:
+    """Create the broadcast outbox tables if they don't exist."""
+    await run_write(_init_db)
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _enqueue(
+    conn: sqlite3.Connection,
+    broadcast: Optional[Dict[str, Any]],
+    event_id: int,
+    guild_ids: List[int],
+) -> int:
+    now = time.time()
+    if broadcast is not None:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO broadcasts (
+                event_id, origin_guild_id, game, embed, created_at
+            )
+            VALUES (?, ?, ?, ?, ?);
+            """,
+            (
+                event_id,
+                broadcast["origin_id"],
+                broadcast["game"],
+                json.dumps(broadcast["embed"]),
+                now,
+            ),
+        )
+    before = conn.total_changes
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO broadcast_outbox (
+            event_id, guild_id, next_attempt_at, updated_at
+        )
+        VALUES (?, ?, ?, ?);
+        """,
+        [(event_id, guild_id, now, now) for guild_id in guild_ids],
+    )
+    return conn.total_changes - before
+
+
+def _row_to_broadcast(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "event_id": int(row["event_id"]),
+        "origin_id": int(row["origin_guild_id"]),
+        "game": row["game"],
+        "embed": json.loads(row["embed"]),
+    }
+
+
+def _get_broadcasts(
+    conn: sqlite3.Connection,
+    since: float,
+) -> List[Dict[str, Any]]:
+    rows = conn.execute(
+        "SELECT * FROM broadcasts WHERE created_at >= ?;", (since,)
+    )
+    return [_row_to_broadcast(r) for r in rows]
+
+
+def _get_broadcast(
+    conn: sqlite3.Connection,
+    event_id: int,
+) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT * FROM broadcasts WHERE event_id = ?;", (event_id,)
+    ).fetchone()
+    return _row_to_broadcast(row) if row else None
+
+
+def _release_in_doubt(conn: sqlite3.Connection, shards: Shards) -> int:
+    """Return rows a previous run left mid-send to the queue."""
+    where, params = _shard_filter(shards)
+    cur = conn.execute(
+        f"""
+        UPDATE broadcast_outbox
+        SET status = 'pending', in_doubt = 1
+        WHERE status = 'sending' AND {where};
+        """,
+        params,
+    )
+    return cur.rowcount
+
+
+def _claim(
+    conn: sqlite3.Connection,
+    shards: Shards,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """Mark up to limit due rows as sending and return them."""
+    now = time.time()
+    where, params = _shard_filter(shards)
+    rows = conn.execute(
+        f"""
+        SELECT event_id, guild_id, attempts, in_doubt
+        FROM broadcast_outbox
+        WHERE status = 'pending' AND next_attempt_at <= ? AND {where}
+        ORDER BY next_attempt_at
+        LIMIT ?;
+        """,
+        (now, *params, limit),
+    ).fetchall()
+    conn.executemany(
+        """
+        UPDATE broadcast_outbox
+        SET status = 'sending', attempts = attempts + 1, updated_at = ?
+        WHERE event_id = ? AND guild_id = ?;
+        """,
+        [(now, r["event_id"], r["guild_id"]) for r in rows],
+    )
+    return [
+        {
+            "event_id": int(r["event_id"]),
+            "guild_id": int(r["guild_id"]),
+            "attempts": int(r["attempts"]) + 1,
+            "in_doubt": bool(r["in_doubt"]),
+        }
+        for r in rows
+    ]
+
+
+def _record(conn: sqlite3.Connection, results: List[Dict[str, Any]]) -> None:
+    """Store the outcome of claimed deliveries.
+
+    Each result has event_id, guild_id, attempts and an outcome of "sent"
+    (with channel_id, message_id, webhook_id), "skipped", "failed" or
+    "retry" (with error, and in_doubt if the send may have gone through).
+    """
+    now = time.time()
+    for r in results:
+        outcome = r["outcome"]
+        if outcome == "retry" and r["attempts"] >= config.BROADCAST_MAX_ATTEMPTS:
+            outcome = "failed"
+
+        if outcome == "retry":
+            conn.execute(
+                """
+                UPDATE broadcast_outbox
+                SET status = 'pending', next_attempt_at = ?, in_doubt = ?,
+                    last_error = ?, updated_at = ?
+                WHERE event_id = ? AND guild_id = ?;
+                """,
+                (
+                    now + retry_delay(r["attempts"]),
+                    int(r.get("in_doubt", False)),
+                    r.get("error"),
+                    now,
+                    r["event_id"],
+                    r["guild_id"],
+                ),
+            )
+            continue
+
+        conn.execute(
+            """
+            UPDATE broadcast_outbox
+            SET status = ?, in_doubt = 0, last_error = ?, updated_at = ?
+            WHERE event_id = ? AND guild_id = ?;
+            """,
+            (outcome, r.get("error"), now, r["event_id"], r["guild_id"]),
+        )
+        if outcome == "sent":
+            _add_event_messages(
+                conn,
+                r["event_id"],
+                [(r["guild_id"], r["channel_id"], r["message_id"], r.get("webhook_id"))],
+            )
+
+
+def _next_due(conn: sqlite3.Connection, shards: Shards) -> Optional[float]:
+    where, params = _shard_filter(shards)
+    row = conn.execute(
+        f"""
+        SELECT MIN(next_attempt_at) AS due
+        FROM broadcast_outbox
+        WHERE status = 'pending' AND {where};
+        """,
+        params,
+    ).fetchone()
+    return row["due"]
+
+
+def _prune(conn: sqlite3.Connection, before: float) -> int:
+    cur = conn.execute(
+        f"""
+        DELETE FROM broadcast_outbox
+        WHERE status IN ({", ".join("?" for _ in DONE_STATUSES)})
+          AND updated_at < ?;
+        """,
+        (*DONE_STATUSES, before),
+    )
+    conn.execute(
+        """
+        DELETE FROM broadcasts
+        WHERE created_at < ?
+          AND NOT EXISTS (
+            SELECT 1 FROM broadcast_outbox o
+            WHERE o.event_id = broadcasts.event_id
+          );
+        """,
+        (before,),
+    )
+    return cur.rowcount
+
+
+# ----------------- public API -----------------
+
+async def enqueue(
+    event_id: int,
+    guild_ids: Iterable[int],
+    broadcast: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Queue deliveries of an event to guild_ids; returns how many were new.
+
+    broadcast ({"origin_id", "game", "embed"}) is stored the first time an
+    event is queued. Deliveries already queued (or done) are left alone.
+    """
+    return await run_write(_enqueue, broadcast, event_id, list(guild_ids))
+
+
+async def get_broadcast(event_id: int) -> Optional[Dict[str, Any]]:
+    return await run_db(_get_broadcast, event_id)
+
+
+async def get_broadcasts_since(since: float) -> List[Dict[str, Any]]:
+    """Broadcasts created at or after a unix timestamp."""
+    return await run_db(_get_broadcasts, since)
+
+
+async def release_in_doubt(shards: Shards) -> int:
+    return await run_write(_release_in_doubt, shards)
+
+
+async def claim(shards: Shards, limit: int) -> List[Dict[str, Any]]:
+    return await run_write(_claim, shards, limit)
+
+
+async def record(results: List[Dict[str, Any]]) -> None:
+    if results:
+        await run_write(_record, results)
+
+
+async def next_due(shards: Shards) -> Optional[float]:
+    """Unix time the next pending delivery is due, or None if there's none."""
+    return await run_db(_next_due, shards)
+
+
+async def prune(before: float) -> int:
+    """Delete finished deliveries last touched before a unix timestamp."""
+    return await run_write(_prune, before)
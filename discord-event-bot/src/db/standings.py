@@ -0,0 +1,47 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class GuildStandings:
+    """In-memory DKP standings for one guild.
+
+    Keeps a {user_id: points} map plus a list of (-points, user_id) kept in
+    sorted order, so point reads are O(1), rank lookups are O(log n) and a
+    top-N page is a slice.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, int]] = ()):
+        self._points: Dict[int, int] = dict(rows)
+        self._order: List[Tuple[int, int]] = sorted(
+            (-points, user_id) for user_id, points in self._points.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def get(self, user_id: int) -> int:
+        return self._points.get(user_id, 0)
+
+    def set(self, user_id: int, points: int) -> None:
+        """Record a user's new total, moving them to their new position."""
+        old = self._points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            i = bisect_left(self._order, (-old, user_id))
+            del self._order[i]
+        self._points[user_id] = points
+        insort(self._order, (-points, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user (ties share a rank), or None if unranked."""
+        points = self._points.get(user_id)
+        if points is None:
+            return None
+        # (-points,) sorts before every (-points, user_id) entry, so this is
+        # the number of users with strictly more points.
+        return bisect_left(self._order, (-points,)) + 1
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, int]]:
+        """Return (user_id, points) rows sorted by DKP desc."""
+        return [(u, -p) for p, u in self._order[offset:offset + limit]]
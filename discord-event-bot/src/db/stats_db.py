@@ -0,0 +1,156 @@
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from db.dkp_db import run_db
+
+# All of these read the daily rollups kept by dkp_db._roll_up(), never
+# dkp_log itself, so they cost the same however long the history is.
+# Days are UTC dates, like dkp_log.timestamp.
+
+# (day, earned, spent) for one day of a series; quiet days are zeros.
+DayTotals = Tuple[date, int, int]
+
+
+def _since(days: int) -> date:
+    """First day of a window of `days` days ending today (UTC)."""
+    return datetime.now(timezone.utc).date() - timedelta(days=max(days, 1) - 1)
+
+
+def _fill(since: date, rows: List[sqlite3.Row]) -> List[DayTotals]:
+    """Expand (day, earned, spent) rows to every day from `since` to today."""
+    by_day: Dict[str, Tuple[int, int]] = {
+        row["day"]: (row["earned"], row["spent"]) for row in rows
+    }
+    today = datetime.now(timezone.utc).date()
+    series = []
+    day = since
+    while day <= today:
+        earned, spent = by_day.get(day.isoformat(), (0, 0))
+        series.append((day, earned, spent))
+        day += timedelta(days=1)
+    return series
+
+
+# ----------------- DB-thread helpers -----------------
+
+def _top_earners(
+    conn: sqlite3.Connection, server_id: int, since: str, limit: int
+) -> List[Tuple[int, int, int]]:
+    return [
+        tuple(row)
+        for row in conn.execute(
+            """
+            SELECT user_id, SUM(earned) AS earned, SUM(spent) AS spent
+            FROM dkp_daily_user
+            WHERE server_id = ? AND day >= ?
+            GROUP BY user_id
+            HAVING SUM(earned) > 0
+            ORDER BY earned DESC, user_id
+            LIMIT ?;
+            """,
+            (server_id, since, limit),
+        )
+    ]
+
+
+def _reason_totals(
+    conn: sqlite3.Connection, server_id: int, since: str, limit: int
+) -> List[Tuple[str, int, int, int]]:
+    return [
+        tuple(row)
+        for row in conn.execute(
+            """
+            SELECT reason, SUM(earned) AS earned, SUM(spent) AS spent,
+                   SUM(entries) AS entries
+            FROM dkp_daily_guild
+            WHERE server_id = ? AND day >= ?
+            GROUP BY reason
+            ORDER BY earned + spent DESC, reason
+            LIMIT ?;
+            """,
+            (server_id, since, limit),
+        )
+    ]
+
+
+def _guild_days(conn: sqlite3.Connection, server_id: int, since: str) -> List[sqlite3.Row]:
+    return conn.execute(
+        """
+        SELECT day, SUM(earned) AS earned, SUM(spent) AS spent
+        FROM dkp_daily_guild
+        WHERE server_id = ? AND day >= ?
+        GROUP BY day;
+        """,
+        (server_id, since),
+    ).fetchall()
+
+
+def _member_days(
+    conn: sqlite3.Connection, server_id: int, user_id: int, since: str
+) -> Tuple[List[sqlite3.Row], int]:
+    """The member's rollup rows since `since`, plus their current balance.
+
+    Both are read on the DB thread in one go, so the balance matches the
+    rows it gets walked back through.
+    """
+    rows = conn.execute(
+        """
+        SELECT day, earned, spent
+        FROM dkp_daily_user
+        WHERE server_id = ? AND user_id = ? AND day >= ?;
+        """,
+        (server_id, user_id, since),
+    ).fetchall()
+    points = conn.execute(
+        "SELECT points FROM dkp WHERE server_id = ? AND user_id = ?;",
+        (server_id, user_id),
+    ).fetchone()
+    return rows, points[0] if points else 0
+
+
+# ----------------- public API -----------------
+
+async def top_earners(
+    server_id: int, days: int, limit: int = 10
+) -> List[Tuple[int, int, int]]:
+    """Return [(user_id, earned, spent), ...] for the last `days` days, top earners first."""
+    return await run_db(_top_earners, server_id, _since(days).isoformat(), limit)
+
+
+async def reason_totals(
+    server_id: int, days: int, limit: int = 10
+) -> List[Tuple[str, int, int, int]]:
+    """Return [(reason, earned, spent, entries), ...] for the last `days` days.
+
+    The busiest reasons come first. Event rewards carry the event's name in
+    their reason, so this is also DKP issued per event.
+    """
+    return await run_db(_reason_totals, server_id, _since(days).isoformat(), limit)
+
+
+async def guild_activity(server_id: int, days: int) -> List[DayTotals]:
+    """Return DKP issued and spent in a guild on each of the last `days` days."""
+    since = _since(days)
+    return _fill(since, await run_db(_guild_days, server_id, since.isoformat()))
+
+
+async def member_history(
+    server_id: int, user_id: int, days: int
+) -> List[Tuple[date, int, int, int]]:
+    """Return (day, earned, spent, balance at end of day) for the last `days` days.
+
+    Balances are worked back from the current balance, so no per-entry
+    history is read.
+    """
+    since = _since(days)
+    rows, balance = await run_db(
+        _member_days, server_id, user_id, since.isoformat()
+    )
+    series = []
+    for day, earned, spent in reversed(_fill(since, rows)):
+        series.append((day, earned, spent, balance))
+        balance -= earned - spent
+    series.reverse()
+    return series
+
@@ -0,0 +1,442 @@
+import asyncio
+import csv
+import gzip
+import heapq
+import io
+import itertools
+import json
+import re
+import sqlite3
+import tempfile
+from typing import IO, Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+from db.dkp_db import (
+    _IN_CHUNK,
+    _UPSERT_DKP,
+    _apply_changes,
+    _get_standings,
+    _last_log_id,
+    _roll_up,
+    DB_PATH,
+    invalidate_standings,
+    run_write,
+)
+
+# Exports and imports move whole tables, so rows are streamed: exports
+# iterate a cursor into a SpooledTemporaryFile (in memory up to
+# DKP_TRANSFER_SPOOL_MB, on disk beyond), imports parse the uploaded
+# file lazily and apply it in DKP_IMPORT_CHUNK row transactions. Memory
+# stays bounded by the chunk size and the guild's member count, never
+# by the size of dkp_log.
+
+EXPORT_FORMATS = ("csv", "jsonl")
+BALANCE_COLUMNS = ("user_id", "points")
+LOG_COLUMNS = ("id", "user_id", "change", "reason", "timestamp")
+
+IMPORT_REASON = "Import"
+# Parse errors reported back before giving up on listing them.
+MAX_ERRORS = 10
+# Largest changes shown in an import preview.
+PREVIEW_SAMPLES = 10
+
+# dkp_log.timestamp format (SQLite's CURRENT_TIMESTAMP, UTC); a "T"
+# separator is accepted on import too.
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+
+# Rows of text buffered before each write to the spool file.
+_WRITE_BATCH = 1000
+
+
+def spool() -> IO[bytes]:
+    """A temp file kept in memory until it grows past the spool limit."""
+    return tempfile.SpooledTemporaryFile(
+        max_size=int(config.DKP_TRANSFER_SPOOL_MB * 1024 * 1024), mode="w+b"
+    )
+
+
+# ----------------- export -----------------
+
+def _read_connection() -> sqlite3.Connection:
+    # Exports read on a connection of their own (WAL lets it run beside
+    # the writer), so a long export doesn't hold up the DB thread that
+    # every DKP command waits on.
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=5000;")
+    return conn
+
+
+def _csv_lines(columns: Tuple[str, ...], rows: Iterable[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl_lines(columns: Tuple[str, ...], rows: Iterable[tuple]) -> Iterator[str]:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for batch in iter(lambda: list(itertools.islice(rows, _WRITE_BATCH)), []):
+        yield "".join(dumps(dict(zip(columns, row))) + "\n" for row in batch)
+
+
+def _export(server_id: int, table: str, fmt: str, out: IO[bytes]) -> int:
+    """Stream a guild's balances or log into out; returns the row count."""
+    if table == "balances":
+        columns = BALANCE_COLUMNS
+        sql = """
+            SELECT user_id, points FROM dkp
+            WHERE server_id = ?
+            ORDER BY points DESC, user_id;
+        """
+    else:
+        columns = LOG_COLUMNS
+        sql = """
+            SELECT id, user_id, change, reason, timestamp FROM dkp_log
+            WHERE server_id = ?
+            ORDER BY id;
+        """
+    conn = _read_connection()
+    count = 0
+    try:
+        cursor = conn.execute(sql, (server_id,))
+
+        def counted() -> Iterator[tuple]:
+            nonlocal count
+            for row in cursor:
+                count += 1
+                yield row
+
+        lines = _csv_lines if fmt == "csv" else _jsonl_lines
+        for text in lines(columns, counted()):
+            out.write(text.encode("utf-8"))
+    finally:
+        conn.close()
+    return count
+
+
+def compress(source: IO[bytes]) -> IO[bytes]:
+    """Gzip a spooled export into a new spool, closing the source."""
+    target = spool()
+    source.seek(0)
+    with gzip.GzipFile(fileobj=target, mode="wb", mtime=0) as gz:
+        while chunk := source.read(1024 * 1024):
+            gz.write(chunk)
+    source.close()
+    target.seek(0)
+    return target
+
+
+async def export(server_id: int, table: str, fmt: str) -> Tuple[IO[bytes], int]:
+    """Export "balances" or "log" as csv/jsonl.
+
+    Returns (spooled file positioned at the start, row count); the caller
+    closes the file.
+    """
+    out = spool()
+    try:
+        count = await asyncio.to_thread(_export, server_id, table, fmt, out)
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out, count
+
+
+# ----------------- import parsing -----------------
+
+class TransferError(Exception):
+    """An import file that can't be applied; the message says why."""
+
+
+class _Borrowed(io.BufferedIOBase):
+    """Read-only view of a file that leaves it open when closed, so the
+    text wrapper parse_import puts around an upload can be dropped and
+    the upload read again."""
+
+    def __init__(self, raw: IO[bytes]):
+        self._raw = raw
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._raw.read(size)
+
+    read1 = read
+
+
+def _open_text(raw: IO[bytes]) -> IO[str]:
+    raw.seek(0)
+    magic = raw.read(2)
+    raw.seek(0)
+    stream: IO[bytes] = _Borrowed(raw)
+    if magic == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def _records(text: IO[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(line number, record) for every row of a CSV or JSONL file."""
+    first = text.readline()
+    if first.lstrip().startswith("{"):
+        for number, line in enumerate(itertools.chain([first], text), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                yield number, {}
+                continue
+            yield number, record
+        return
+
+    reader = csv.DictReader(itertools.chain([first], text))
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _as_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    return int(str(value).strip())
+
+
+def parse_import(raw: IO[bytes]) -> Tuple[str, Iterator[tuple], List[str]]:
+    """Read an export back.
+
+    Returns (kind, rows, errors): kind is "balances" (rows of (user_id,
+    points)) or "log" (rows of (user_id, change, reason, timestamp)),
+    decided by the first record's columns. rows is a lazy iterator;
+    errors is filled in as it is consumed, with at most MAX_ERRORS
+    messages plus a final count.
+    """
+    records = _records(_open_text(raw))
+    try:
+        number, first = next(records)
+    except StopIteration:
+        raise TransferError("The file is empty.")
+    records = itertools.chain([(number, first)], records)
+
+    if "points" in first:
+        kind = "balances"
+    elif "change" in first:
+        kind = "log"
+    else:
+        raise TransferError(
+            "Unrecognised file: expected a `points` (balances) or "
+            "`change` (log) column, as written by `!dkp_export`."
+        )
+
+    errors: List[str] = []
+    bad = 0
+
+    def error(number: int, message: str) -> None:
+        nonlocal bad
+        bad += 1
+        if len(errors) < MAX_ERRORS:
+            errors.append(f"line {number}: {message}")
+        elif len(errors) == MAX_ERRORS:
+            errors.append("…")
+
+    def rows() -> Iterator[tuple]:
+        for number, record in records:
+            try:
+                user_id = _as_int(record.get("user_id"))
+                amount = _as_int(record.get("points" if kind == "balances" else "change"))
+            except (TypeError, ValueError):
+                error(number, "user_id and amount must be whole numbers")
+                continue
+            if kind == "balances":
+                yield user_id, amount
+                continue
+            reason = record.get("reason") or None
+            timestamp = str(record.get("timestamp") or "").strip()
+            if not _TIMESTAMP.fullmatch(timestamp):
+                error(number, "timestamp must look like YYYY-MM-DD HH:MM:SS")
+                continue
+            yield user_id, amount, reason, timestamp.replace("T", " ")
+        if bad > MAX_ERRORS:
+            errors[-1] = f"… {bad} bad rows in total"
+
+    return kind, rows(), errors
+
+
+async def _chunks(rows: Iterator[tuple], size: int) -> AsyncIterator[List[tuple]]:
+    # Parsing is plain Python, so each chunk is parsed off the event loop.
+    while chunk := await asyncio.to_thread(list, itertools.islice(rows, size)):
+        yield chunk
+
+
+# ----------------- import -----------------
+
+def _set_balances(
+    conn: sqlite3.Connection,
+    server_id: int,
+    balances: Dict[int, int],
+    reason: str,
+) -> int:
+    """Bring balances to the given values; returns how many changed.
+
+    Deltas are taken against the balances read in this transaction, so
+    re-running an interrupted import is harmless.
+    """
+    changes = []
+    users = list(balances)
+    for i in range(0, len(users), _IN_CHUNK):
+        chunk = users[i:i + _IN_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        current = {
+            int(r["user_id"]): int(r["points"])
+            for r in conn.execute(
+                f"SELECT user_id, points FROM dkp "
+                f"WHERE server_id = ? AND user_id IN ({placeholders});",
+                (server_id, *chunk),
+            )
+        }
+        for user_id in chunk:
+            delta = balances[user_id] - current.get(user_id, 0)
+            if delta:
+                changes.append((server_id, user_id, delta, reason))
+    if changes:
+        _apply_changes(conn, changes)
+    return len(changes)
+
+
+def _replay_log(
+    conn: sqlite3.Connection,
+    server_id: int,
+    rows: List[Tuple[int, int, Optional[str], str]],
+) -> int:
+    """Append log rows with their original timestamps and apply them;
+    returns the number of rows."""
+    deltas: Dict[int, int] = {}
+    for user_id, change, _, _ in rows:
+        deltas[user_id] = deltas.get(user_id, 0) + change
+    last_id = _last_log_id(conn)
+    conn.executemany(
+        _UPSERT_DKP, [(server_id, user_id, delta) for user_id, delta in deltas.items()]
+    )
+    conn.executemany(
+        """
+        INSERT INTO dkp_log (server_id, user_id, change, reason, timestamp)
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        [(server_id, *row) for row in rows],
+    )
+    _roll_up(conn, last_id)
+    return len(rows)
+
+
+async def preview_import(server_id: int, raw: IO[bytes]) -> Dict[str, Any]:
+    """Dry run: what importing raw into a guild would change.
+
+    Returns {"kind", "rows", "errors"} plus, for balances, "changed",
+    "added", "unchanged", "net" and "samples" ([(user_id, old, new)],
+    largest changes first); for a log, "members", "net", "first" and
+    "last" (timestamps).
+    """
+    kind, rows, errors = parse_import(raw)
+    standings = await _get_standings(server_id)
+    preview: Dict[str, Any] = {"kind": kind, "rows": 0, "errors": errors, "net": 0}
+
+    if kind == "balances":
+        balances: Dict[int, int] = {}
+        async for chunk in _chunks(rows, config.DKP_IMPORT_CHUNK):
+            preview["rows"] += len(chunk)
+            balances.update(chunk)
+        changed = added = 0
+        diffs = []
+        for user_id, points in balances.items():
+            old = standings.get(user_id)
+            if old == points:
+                continue
+            changed += 1
+            added += standings.rank(user_id) is None
+            preview["net"] += points - old
+            diffs.append((abs(points - old), user_id, old, points))
+        preview.update(
+            changed=changed,
+            added=added,
+            unchanged=len(balances) - changed,
+            samples=[
+                (u, old, new)
+                for _, u, old, new in heapq.nlargest(PREVIEW_SAMPLES, diffs)
+            ],
+        )
+        return preview
+
+    members = set()
+    first = last = None
+    async for chunk in _chunks(rows, config.DKP_IMPORT_CHUNK):
+        preview["rows"] += len(chunk)
+        for user_id, change, _, timestamp in chunk:
+            members.add(user_id)
+            preview["net"] += change
+            first = timestamp if first is None else min(first, timestamp)
+            last = timestamp if last is None else max(last, timestamp)
+    preview.update(members=len(members), first=first, last=last)
+    return preview
+
+
+async def apply_import(
+    server_id: int,
+    raw: IO[bytes],
+    checked: bool = False,
+) -> Tuple[str, int]:
+    """Import raw into a guild; returns (kind, rows written).
+
+    Balances set each listed member's total (logged as IMPORT_REASON);
+    a log is appended as-is and its changes added to the totals. Rows
+    are written DKP_IMPORT_CHUNK at a time, each chunk in its own
+    transaction so other DKP commands run in between, while the next
+    chunk is parsed. Nothing is written if the file has errors; pass
+    checked=True if preview_import already found none, to skip reading
+    a log twice.
+    """
+    kind, rows, errors = parse_import(raw)
+    written = 0
+    try:
+        if kind == "balances":
+            # Later rows for the same member win, as in the preview.
+            balances: Dict[int, int] = {}
+            async for chunk in _chunks(rows, config.DKP_IMPORT_CHUNK):
+                balances.update(chunk)
+            if errors:
+                raise TransferError("\n".join(errors))
+            items = list(balances.items())
+            for i in range(0, len(items), config.DKP_IMPORT_CHUNK):
+                written += await run_write(
+                    _set_balances,
+                    server_id,
+                    dict(items[i:i + config.DKP_IMPORT_CHUNK]),
+                    IMPORT_REASON,
+                )
+            return kind, written
+
+        if not checked:
+            async for _ in _chunks(rows, config.DKP_IMPORT_CHUNK):
+                pass
+            if errors:
+                raise TransferError("\n".join(errors))
+            kind, rows, errors = parse_import(raw)
+
+        pending: Optional[asyncio.Future] = None
+        async for chunk in _chunks(rows, config.DKP_IMPORT_CHUNK):
+            if pending is not None:
+                written += await pending
+            pending = asyncio.ensure_future(run_write(_replay_log, server_id, chunk))
+        if pending is not None:
+            written += await pending
+        return kind, written
+    finally:
+        invalidate_standings(server_id)
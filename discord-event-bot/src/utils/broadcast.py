@@ -0,0 +1,117 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, TypeVar
+
+import discord
+
+from utils import metrics
+from utils.log import get_logger
+from utils.ratelimit import TokenBucket
+
+T = TypeVar("T")
+
+log = get_logger("broadcast")
+
+# How many times a single delivery is retried after a 429 or a 5xx.
+MAX_RETRIES = 2
+
+
+def target_fields(target: Any) -> Dict[str, Any]:
+    """Log fields identifying a delivery target (an outbox row or anything else)."""
+    if isinstance(target, dict):
+        return {k: target[k] for k in ("guild_id", "event_id") if k in target}
+    return {"target": str(target)}
+
+
+class DeliveryFailed(Exception):
+    """Raised by a send callback to count a delivery as failed, e.g. when
+    it has already arranged its own retry."""
+
+
+@dataclass
+class BroadcastStats:
+    sent: int = 0
+    skipped: int = 0
+    failed: int = 0
+    rate_limited: int = 0
+    elapsed: float = 0.0
+
+
+class BroadcastScheduler:
+    """Fans a delivery out to many targets concurrently.
+
+    At most `concurrency` deliveries are in flight, and new ones start at
+    no more than `rate` per second so a large fan-out stays under Discord's
+    global limit. Per-route buckets are handled by discord.py's HTTP
+    client; when it gives up with RateLimited (or the API returns a 5xx)
+    the delivery is retried after the advertised delay.
+    """
+
+    def __init__(self, concurrency: int = 8, rate: float = 40.0):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, capacity=rate)
+
+    async def _deliver(
+        self,
+        target: T,
+        send: Callable[[T], Awaitable[bool]],
+        stats: BroadcastStats,
+    ) -> None:
+        async with self._semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                await self._bucket.acquire()
+                try:
+                    delivered = await send(target)
+                except discord.RateLimited as e:
+                    stats.rate_limited += 1
+                    metrics.RATE_LIMITED.inc(source="broadcast")
+                    if attempt == MAX_RETRIES:
+                        stats.failed += 1
+                        log.warning(
+                            "Gave up after rate limits",
+                            extra={**target_fields(target), "sample": "delivery_failed"},
+                        )
+                        return
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                except discord.HTTPException as e:
+                    if e.status >= 500 and attempt < MAX_RETRIES:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    stats.failed += 1
+                    log.warning(
+                        "Delivery failed: %s", e,
+                        extra={**target_fields(target), "sample": "delivery_failed"},
+                    )
+                    return
+                except Exception as e:
+                    stats.failed += 1
+                    log.warning(
+                        "Delivery failed: %s", e,
+                        extra={**target_fields(target), "sample": "delivery_failed"},
+                    )
+                    return
+
+                if delivered:
+                    stats.sent += 1
+                else:
+                    stats.skipped += 1
+                return
+
+    async def fan_out(
+        self,
+        targets: Iterable[T],
+        send: Callable[[T], Awaitable[bool]],
+    ) -> BroadcastStats:
+        """Call send(target) for every target; send returns False to skip."""
+        stats = BroadcastStats()
+        start = time.perf_counter()
+        await asyncio.gather(*(self._deliver(t, send, stats) for t in targets))
+        stats.elapsed = time.perf_counter() - start
+
+        metrics.BROADCAST_DURATION.observe(stats.elapsed)
+        metrics.BROADCAST_DELIVERIES.inc(stats.sent, result="sent")
+        metrics.BROADCAST_DELIVERIES.inc(stats.skipped, result="skipped")
+        metrics.BROADCAST_DELIVERIES.inc(stats.failed, result="failed")
+        return stats
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from utils.log import get_logger
+
+log = get_logger("bus")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Messages published while the client is disconnected are kept (up to this
+# many) and sent once it reconnects.
+MAX_PENDING = 1000
+
+
+class BusServer:
+    """Relay for the cross-cluster bus, run by cluster.py.
+
+    Clients connect over a Unix socket and exchange newline-delimited JSON
+    messages; every message is forwarded to every *other* connected client.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in list(self._clients):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self._clients.add(writer)
+        try:
+            while line := await reader.readline():
+                for other in list(self._clients):
+                    if other is writer:
+                        continue
+                    try:
+                        other.write(line)
+                        await other.drain()
+                    except ConnectionError:
+                        self._clients.discard(other)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+class BusClient:
+    """A cluster's connection to the BusServer.
+
+    publish() sends {"topic", "origin", "data"} to all other clusters;
+    handlers registered with subscribe() receive the "data" of messages
+    on their topic. Reconnects automatically if the relay restarts.
+    """
+
+    def __init__(self, path: str, cluster_id: int):
+        self.path = path
+        self.cluster_id = cluster_id
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: List[bytes] = []
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        await self._connected.wait()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def publish(self, topic: str, data: Dict[str, Any]) -> None:
+        line = json.dumps(
+            {"topic": topic, "origin": self.cluster_id, "data": data}
+        ).encode("utf-8") + b"\n"
+
+        if self._writer is None:
+            if len(self._pending) < MAX_PENDING:
+                self._pending.append(line)
+            else:
+                log.warning("Dropping message: relay unavailable", extra={"topic": topic})
+            return
+
+        self._writer.write(line)
+        await self._writer.drain()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(1)
+                continue
+
+            self._writer = writer
+            for line in self._pending:
+                writer.write(line)
+            self._pending.clear()
+            self._connected.set()
+
+            try:
+                while line := await reader.readline():
+                    message = json.loads(line)
+                    for handler in self._handlers.get(message["topic"], []):
+                        asyncio.create_task(self._dispatch(handler, message))
+            except ConnectionError:
+                pass
+            finally:
+                self._writer = None
+                self._connected.clear()
+                writer.close()
+
+            log.warning("Lost connection to relay, reconnecting")
+            await asyncio.sleep(1)
+
+    async def _dispatch(self, handler: Handler, message: Dict[str, Any]) -> None:
+        try:
+            await handler(message["data"])
+        except Exception:
+            log.exception("Handler failed", extra={"topic": message["topic"]})
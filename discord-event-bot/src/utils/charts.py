@@ -0,0 +1,57 @@
+import asyncio
+import io
+from datetime import date
+from typing import Dict, List, Sequence
+
+# matplotlib is optional: without it /dkp_stats still answers, as text.
+# Only Figure is used (never pyplot), so no global state or GUI backend is
+# involved and figures can be drawn from worker threads.
+try:
+    from matplotlib.figure import Figure
+except ImportError:
+    Figure = None
+
+WIDTH, HEIGHT, DPI = 8, 4, 100
+
+
+def available() -> bool:
+    return Figure is not None
+
+
+def _png(fig: "Figure") -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def _line_chart(title: str, days: List[date], series: Dict[str, List[int]]) -> bytes:
+    fig = Figure(figsize=(WIDTH, HEIGHT), dpi=DPI, layout="tight")
+    ax = fig.add_subplot()
+    for label, values in series.items():
+        ax.plot(days, values, label=label)
+    ax.set_title(title)
+    ax.grid(alpha=0.3)
+    if len(series) > 1:
+        ax.legend()
+    fig.autofmt_xdate()
+    return _png(fig)
+
+
+def _bar_chart(title: str, labels: Sequence[str], values: Sequence[int]) -> bytes:
+    fig = Figure(figsize=(WIDTH, HEIGHT), dpi=DPI, layout="tight")
+    ax = fig.add_subplot()
+    # Largest on top.
+    ax.barh(list(reversed(labels)), list(reversed(values)))
+    ax.set_title(title)
+    ax.grid(axis="x", alpha=0.3)
+    return _png(fig)
+
+
+async def line_chart(title: str, days: List[date], series: Dict[str, List[int]]) -> bytes:
+    """PNG of one line per {label: values}, drawn off the event loop."""
+    return await asyncio.to_thread(_line_chart, title, days, series)
+
+
+async def bar_chart(title: str, labels: Sequence[str], values: Sequence[int]) -> bytes:
+    """PNG of a horizontal bar chart, drawn off the event loop."""
+    return await asyncio.to_thread(_bar_chart, title, labels, values)
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from utils import metrics
+
+T = TypeVar("T")
+
+
+class Coalescer:
+    """Share one in-flight call between identical concurrent requests.
+
+    The first caller for a key starts `fn()`; callers arriving while it is
+    still running await the same result instead of running it again. Once
+    it finishes the key is free, so nothing is cached beyond the call.
+    Only use it for reads whose result may go to every caller as-is.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, "asyncio.Future[T]"] = {}
+
+    def _done(self, key: Hashable, future: "asyncio.Future[T]") -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark a failure as seen even if every caller was cancelled.
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            metrics.READS_COALESCED.inc(name=self.name)
+        # Shielded, so one caller giving up doesn't cancel it for the rest.
+        return await asyncio.shield(future)
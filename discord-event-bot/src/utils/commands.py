@@ -0,0 +1,114 @@
+import time
+from typing import Callable, Optional, TypeVar
+
+import discord
+from discord import app_commands
+
+import config
+from utils import metrics
+from utils.log import get_logger
+
+T = TypeVar("T")
+
+log = get_logger("commands")
+
+
+def guild_objects() -> list[discord.Object]:
+    return [discord.Object(id=g_id) for g_id in config.COMMAND_GUILD_IDS]
+
+
+def command_scope() -> Callable[[T], T]:
+    """Register an app command for COMMAND_GUILD_IDS, or globally if unset.
+
+    app_commands.guilds() with no IDs would register the command nowhere,
+    so global scope leaves the command untouched instead.
+    """
+    if config.COMMAND_GUILD_IDS:
+        return app_commands.guilds(*guild_objects())
+    return lambda command: command
+
+
+def throttled_message(scope: str, retry_after: float) -> str:
+    """Reply for a command refused by CommandLimiter."""
+    who = {
+        "user": "You're using this command too often",
+        "guild": "This command is busy in this server",
+        "global": "The bot is busy",
+    }[scope]
+    return f"⏳ {who}; try again in {max(1, round(retry_after))}s."
+
+
+def record_command(
+    command: str,
+    kind: str,
+    status: str,
+    latency: float,
+    guild_id: Optional[int],
+    user_id: int,
+) -> None:
+    """Record a finished command's latency in metrics and a (sampled) log."""
+    metrics.COMMAND_DURATION.observe(latency, command=command, kind=kind, status=status)
+    log.info(
+        "Command finished",
+        extra={
+            "command": command,
+            "kind": kind,
+            "status": status,
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "latency_ms": round(latency * 1000, 1),
+            "sample": "command",
+        },
+    )
+
+
+def observe_app_command(interaction: discord.Interaction, status: str) -> None:
+    """Record a finished slash command's latency (see MetricsTree)."""
+    started = interaction.extras.pop("started", None)
+    if started is None or interaction.command is None:
+        return
+    record_command(
+        interaction.command.qualified_name,
+        "app",
+        status,
+        time.perf_counter() - started,
+        interaction.guild_id,
+        interaction.user.id,
+    )
+
+
+class MetricsTree(app_commands.CommandTree):
+    """CommandTree that times and rate limits every slash command.
+
+    The clock starts in interaction_check; completion is recorded by
+    EventBot.on_app_command_completion and failures by on_error. Commands
+    go through the client's CommandLimiter (autocomplete doesn't).
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started"] = time.perf_counter()
+        command = interaction.command
+        if interaction.type is not discord.InteractionType.application_command or command is None:
+            return True
+
+        scope, retry_after, _ = self.client.limiter.hit(
+            command.qualified_name, interaction.user.id, interaction.guild_id
+        )
+        if scope is None:
+            return True
+        metrics.COMMANDS_THROTTLED.inc(command=command.qualified_name, scope=scope)
+        observe_app_command(interaction, "throttled")
+        # An interaction has to be answered either way; this costs no
+        # channel rate limit.
+        await interaction.response.send_message(
+            throttled_message(scope, retry_after), ephemeral=True
+        )
+        return False
+
+    async def on_error(
+        self,
+        interaction: discord.Interaction,
+        error: app_commands.AppCommandError,
+    ) -> None:
+        observe_app_command(interaction, "error")
+        await super().on_error(interaction, error)
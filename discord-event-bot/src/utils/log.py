@@ -0,0 +1,193 @@
+"""Structured logging that never blocks the event loop.
+
+Loggers hand records to a bounded in-memory queue; a background thread
+(logging.handlers.QueueListener) formats them and writes them out. If
+the writer falls behind, new records are dropped (and counted in
+metrics) rather than making the caller wait.
+
+Use get_logger("<subsystem>") and pass fields through `extra`:
+
+    log.info("Event sent", extra={"guild_id": guild.id, "event_id": 42})
+
+Fields such as guild_id, event_id, command and latency_ms become JSON
+keys. Records that may come once per guild or per command can add
+"sample": "<key>" to `extra`: only 1 in LOG_SAMPLE_EVERY of them per key
+is kept (errors always are) and kept ones carry
+"sampled": N, so counts can be scaled back up.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import config
+from utils import metrics
+
+# Attributes every LogRecord has; anything else on a record came from
+# `extra` (or from us) and is written out as a field.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "sample",
+}
+
+_handler: Optional["_QueueHandler"] = None
+_listener: Optional["_QueueListener"] = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """Logger for one part of the bot, e.g. "broadcast" or "dkp"."""
+    return logging.getLogger(f"eventbot.{subsystem}")
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, then any fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs, fields as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{k}={v}" for k, v in _fields(record).items())
+        return f"{line} [{fields}]" if fields else line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in `every` records per sample key; others pass untouched."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._seen: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or self.every <= 1 or record.levelno >= logging.ERROR:
+            return True
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        if seen % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class ContextFilter(logging.Filter):
+    """Add the same fields (e.g. cluster_id) to every record."""
+
+    def __init__(self, fields: Dict[str, Any]):
+        super().__init__()
+        self.fields = fields
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in self.fields.items():
+            setattr(record, key, value)
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the writer.
+
+    Only the message itself (and a traceback, if any) is rendered on the
+    calling thread, so the record no longer refers to its arguments.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room rather than fail when stopping with a full queue.
+        self.queue.put(self._sentinel)
+
+
+def parse_levels(text: str) -> Dict[str, int]:
+    """Parse "logger=LEVEL,logger=LEVEL", e.g. "eventbot.broadcast=WARNING"."""
+    levels = {}
+    for item in text.split(","):
+        name, _, level = item.partition("=")
+        if name.strip():
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(**context: Any) -> None:
+    """Route all logging (ours and discord.py's) through the queue.
+
+    Keyword arguments are added as fields to every record, e.g.
+    setup_logging(cluster_id=2). Safe to call more than once.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    if config.LOG_FILE:
+        output: logging.Handler = logging.FileHandler(config.LOG_FILE, encoding="utf-8")
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter() if config.LOG_FORMAT == "json" else TextFormatter())
+
+    handler = _QueueHandler(queue.Queue(config.LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter(config.LOG_SAMPLE_EVERY))
+    if context:
+        handler.addFilter(ContextFilter(context))
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    _handler = handler
+    root.setLevel(config.LOG_LEVEL.upper())
+    for name, level in parse_levels(config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = _QueueListener(handler.queue, output)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out everything still queued and stop the writer thread."""
+    global _handler, _listener
+    if _listener is not None:
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        _handler = _listener = None
@@ -0,0 +1,232 @@
+import bisect
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import aiohttp
+from aiohttp import web
+
+# Not utils.log.get_logger: utils.log imports this module.
+log = logging.getLogger("eventbot.metrics")
+
+# Seconds; covers a fast cached read up to a slow fan-out.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Metrics are updated from the event loop and from the DB thread.
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+                )
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> ([count per bucket, +Inf last], sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        names = self.labelnames + ("le",)
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, key + (le,))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----------------- metrics -----------------
+
+COMMAND_DURATION = Histogram(
+    "eventbot_command_duration_seconds",
+    "Time spent handling a prefix or slash command.",
+    ["command", "kind", "status"],
+)
+
+DB_QUEUE_WAIT = Histogram(
+    "eventbot_db_queue_seconds",
+    "Time a DB call waited for the single DB thread.",
+    ["fn"],
+)
+
+DB_DURATION = Histogram(
+    "eventbot_db_duration_seconds",
+    "Time a DB call ran on the DB thread (including its transaction).",
+    ["fn"],
+)
+
+BROADCAST_DURATION = Histogram(
+    "eventbot_broadcast_duration_seconds",
+    "Wall time of one event broadcast fan-out.",
+)
+
+BROADCAST_DELIVERIES = Counter(
+    "eventbot_broadcast_deliveries_total",
+    "Broadcast deliveries by outcome.",
+    ["result"],
+)
+
+RATE_LIMITED = Counter(
+    "eventbot_rate_limited_total",
+    "Discord rate limits (429) hit, by where they surfaced.",
+    ["source"],
+)
+
+COMMANDS_THROTTLED = Counter(
+    "eventbot_commands_throttled_total",
+    "Commands refused by the bot's own rate limits, by the scope that was full.",
+    ["command", "scope"],
+)
+
+READS_COALESCED = Counter(
+    "eventbot_reads_coalesced_total",
+    "Reads that joined an identical one already in flight instead of running.",
+    ["name"],
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "eventbot_log_records_dropped_total",
+    "Log records dropped because the log writer fell behind.",
+)
+
+HTTP_RESPONSES = Counter(
+    "eventbot_http_responses_total",
+    "Discord REST responses by status class.",
+    ["status"],
+)
+
+
+async def _on_request_end(
+    session: aiohttp.ClientSession,
+    context: SimpleNamespace,
+    params: aiohttp.TraceRequestEndParams,
+) -> None:
+    status = params.response.status
+    if status < 200:  # the gateway's websocket upgrade
+        return
+    HTTP_RESPONSES.inc(status=f"{status // 100}xx")
+    if status == 429:
+        RATE_LIMITED.inc(source="http")
+
+
+def http_trace() -> aiohttp.TraceConfig:
+    """aiohttp trace hooks counting discord.py's REST responses and 429s.
+
+    discord.py waits out most rate limits itself, so they never surface as
+    exceptions; this is the only place they can be counted.
+    """
+    trace = aiohttp.TraceConfig()
+    trace.on_request_end.append(_on_request_end)
+    return trace
+
+
+# ----------------- HTTP endpoint -----------------
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_server(host: str, port: int) -> Optional[web.AppRunner]:
+    """Serve GET /metrics on host:port; returns the runner to clean up."""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        log.warning("Could not listen on %s:%s: %s", host, port, e)
+        await runner.cleanup()
+        return None
+    log.info("Serving http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,63 @@
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+# A letter or digit (any script) not preceded by one.
+_WORD_START = re.compile(r"(?<!\w)\w")
+
+
+class PrefixIndex:
+    """Sorted in-memory index answering "names starting with ..." queries.
+
+    Each name is indexed under its case-folded form and under every word
+    inside it, so "str" finds "Counter-Strike 2" as well as "Stray". A
+    lookup is a binary search plus a walk over the matches, which keeps
+    slash-command autocomplete well inside Discord's 3 second window no
+    matter how many events exist.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        # (key, display name); key is a suffix of the folded name that
+        # starts at a word boundary.
+        self._keys: List[Tuple[str, str]] = []
+        self._names: Dict[str, str] = {}
+        # (folded name, display name), kept sorted for empty prefixes
+        self._sorted: List[Tuple[str, str]] = []
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str) -> None:
+        name = name.strip()
+        folded = name.casefold()
+        if not folded or folded in self._names:
+            return
+        self._names[folded] = name
+        insort(self._sorted, (folded, name))
+        for match in _WORD_START.finditer(folded):
+            insort(self._keys, (folded[match.start():], name))
+
+    def complete(self, prefix: str, limit: int = 25) -> List[str]:
+        """Up to limit names with a word starting with prefix; whole-name
+        matches first, then alphabetically."""
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return [name for _, name in self._sorted[:limit]]
+
+        whole: List[str] = []
+        partial: List[str] = []
+        seen = set()
+        i = bisect_left(self._keys, (prefix, ""))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            key, name = self._keys[i]
+            i += 1
+            if name in seen:
+                continue
+            seen.add(name)
+            (whole if name.casefold() == key else partial).append(name)
+            if len(whole) >= limit:
+                break
+        partial.sort(key=str.casefold)
+        return (whole + partial)[:limit]
@@ -0,0 +1,157 @@
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.lru import LRUCache
+
+# Buckets a command can be limited by: each user, each guild, and the whole
+# process (per cluster when sharded).
+SCOPES = ("user", "guild", "global")
+
+# (uses, seconds): at most `uses` calls in a burst, refilling at
+# uses/seconds per second.
+Rate = Tuple[int, float]
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate,
+        )
+        self._updated = now
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` are available (0.0 if they are now)."""
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available.
+
+        Returns 0.0 on success, otherwise how many seconds until enough
+        tokens will be available (nothing is taken in that case).
+        """
+        wait = self.delay(tokens)
+        if wait == 0.0:
+            self._tokens -= tokens
+        return wait
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until tokens are available, then take them."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
+
+
+def parse_rate(text: str) -> Optional[Rate]:
+    """Parse "<uses>/<seconds>" (or just "<uses>", per second).
+
+    "0" or an empty string means no limit and returns None.
+    """
+    uses, _, seconds = text.strip().partition("/")
+    if uses in ("", "0"):
+        return None
+    rate = int(uses), float(seconds or 1)
+    if rate[0] < 0 or rate[1] <= 0:
+        raise ValueError(f"Invalid rate limit: {text!r}")
+    return rate
+
+
+def parse_limits(text: str) -> Dict[str, Dict[str, Optional[Rate]]]:
+    """Parse per-command limits: "cmd:scope=rate,scope=rate;cmd2:...".
+
+    For example "dkp_export:user=1/60,guild=2/60;bid:guild=0".
+    """
+    limits: Dict[str, Dict[str, Optional[Rate]]] = {}
+    for entry in text.split(";"):
+        command, _, rates = entry.partition(":")
+        if not command.strip():
+            continue
+        scopes = limits.setdefault(command.strip(), {})
+        for item in rates.split(","):
+            scope, _, rate = item.partition("=")
+            scope = scope.strip()
+            if scope not in SCOPES:
+                raise ValueError(f"Unknown rate limit scope {scope!r} for {command!r}")
+            scopes[scope] = parse_rate(rate)
+    return limits
+
+
+class CommandLimiter:
+    """Per-user, per-guild and global token buckets for each command.
+
+    Every command gets `defaults` for each scope unless `overrides` sets
+    that scope for it (None turns a scope off). Buckets are created on
+    first use and kept in an LRU, so idle ones are eventually dropped;
+    a dropped bucket simply starts full again.
+    """
+
+    def __init__(
+        self,
+        defaults: Dict[str, Optional[Rate]],
+        overrides: Dict[str, Dict[str, Optional[Rate]]],
+        max_buckets: int,
+    ):
+        self.defaults = defaults
+        self.overrides = overrides
+        self._buckets: LRUCache[Tuple[str, str, int], TokenBucket] = LRUCache(max_buckets)
+        # (command, user_id) of users already told they're being limited.
+        self._warned: LRUCache[Tuple[str, int], bool] = LRUCache(max_buckets)
+
+    def limits(self, command: str) -> Dict[str, Rate]:
+        """The active rate for each limited scope of a command."""
+        rates = {**self.defaults, **self.overrides.get(command, {})}
+        return {scope: rate for scope, rate in rates.items() if rate is not None}
+
+    def _bucket(self, command: str, scope: str, key: int, rate: Rate) -> TokenBucket:
+        bucket = self._buckets.get((command, scope, key))
+        if bucket is None:
+            uses, seconds = rate
+            bucket = TokenBucket(uses / seconds, capacity=uses)
+            self._buckets.set((command, scope, key), bucket)
+        return bucket
+
+    def hit(
+        self,
+        command: str,
+        user_id: int,
+        guild_id: Optional[int],
+    ) -> Tuple[Optional[str], float, bool]:
+        """Spend one use of a command.
+
+        Returns (None, 0.0, False) if it may run. Otherwise nothing is spent
+        and it returns (the scope that is full, seconds until it may run,
+        whether this is the user's first refusal since they last got
+        through); only that first refusal is worth answering, so spamming a
+        limited command costs no API calls.
+        """
+        keys = {"user": user_id, "guild": guild_id, "global": 0}
+        buckets = [
+            (scope, self._bucket(command, scope, keys[scope], rate))
+            for scope, rate in self.limits(command).items()
+            if keys[scope] is not None
+        ]
+        for scope, bucket in buckets:
+            wait = bucket.delay()
+            if wait:
+                first = self._warned.get((command, user_id)) is None
+                self._warned.set((command, user_id), True)
+                return scope, wait, first
+        for _, bucket in buckets:
+            bucket.try_acquire()
+        self._warned.pop((command, user_id))
+        return None, 0.0, False
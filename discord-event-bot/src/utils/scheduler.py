@@ -0,0 +1,76 @@
+import asyncio
+import heapq
+import itertools
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from utils.log import get_logger
+
+log = get_logger("scheduler")
+
+# Never sleep longer than this in one go, so a wall clock change (DST, NTP
+# step) is noticed within a few minutes instead of oversleeping.
+MAX_SLEEP = 300.0
+
+# (when, tie-breaker, key, data)
+_Entry = Tuple[datetime, int, Hashable, Any]
+
+
+class DeadlineScheduler:
+    """Runs callbacks at (naive, local) datetimes from a single task.
+
+    Deadlines live in a min-heap keyed by an arbitrary hashable; run()
+    sleeps only until the earliest one, so thousands of pending deadlines
+    cost one coroutine. Rescheduling a key replaces its deadline and
+    cancel() drops it; stale heap entries are skipped lazily. Deadlines
+    already in the past fire immediately, in time order.
+    """
+
+    def __init__(self):
+        self._heap: List[_Entry] = []
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, key: Hashable, when: datetime, data: Any = None) -> None:
+        entry = (when, next(self._seq), key, data)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wake.set()
+
+    def cancel(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def _peek(self) -> Optional[_Entry]:
+        while self._heap and self._entries.get(self._heap[0][2]) is not self._heap[0]:
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    async def run(self, handler: Callable[[Hashable, Any], Awaitable[None]]) -> None:
+        """Call handler(key, data) for each deadline as it comes due. Never returns."""
+        while True:
+            entry = self._peek()
+            delay = (
+                (entry[0] - datetime.now()).total_seconds() if entry else MAX_SLEEP
+            )
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), timeout=min(delay, MAX_SLEEP)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            _, _, key, data = entry
+            del self._entries[key]
+            try:
+                await handler(key, data)
+            except Exception:
+                log.exception("Deadline failed", extra={"key": key})
@@ -0,0 +1,95 @@
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+# Built-in aliases, keyed and valued by normalized game key. Extended (or
+# overridden) by the JSON file at config.GAME_ALIASES_FILE.
+DEFAULT_ALIASES: Dict[str, str] = {
+    "counterstrike2": "cs2",
+    "counterstrike": "cs2",
+    "csgo": "cs2",
+    "leagueoflegends": "lol",
+    "league": "lol",
+    "worldofwarcraft": "wow",
+    "finalfantasyxiv": "ffxiv",
+    "ff14": "ffxiv",
+    "apexlegends": "apex",
+}
+
+# Anything that isn't a letter or digit in any script.
+_NON_ALNUM = re.compile(r"[\W_]+")
+
+
+def _fold(name: str) -> str:
+    """Game key: case-folded, accents and punctuation/spacing removed.
+
+    Works for any script ("Pokémon" and "Pokemon" meet, "原神" stays
+    "原神"); a name made only of symbols keys as itself, never as "".
+    """
+    folded = name.casefold()
+    plain = "".join(
+        c for c in unicodedata.normalize("NFKD", folded) if not unicodedata.combining(c)
+    )
+    return _NON_ALNUM.sub("", plain) or folded.strip()
+
+
+def load_aliases(path: Optional[Path]) -> Dict[str, str]:
+    """Return the default alias table merged with a JSON {alias: game} file."""
+    aliases = dict(DEFAULT_ALIASES)
+    if path is not None and path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for alias, game in json.load(f).items():
+                aliases[_fold(alias)] = _fold(game)
+    return aliases
+
+
+class SubscriptionIndex:
+    """Maps normalized game keys to the guilds that want events for them.
+
+    Guilds without preferences are kept in a wildcard set and receive every
+    game. Only guilds the bot is currently in are indexed, so picking
+    broadcast targets costs O(subscribers) rather than a scan of all guilds.
+    """
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None):
+        self.aliases = aliases if aliases is not None else dict(DEFAULT_ALIASES)
+        self._subscribers: Dict[str, Set[int]] = {}
+        self._games: Dict[int, Set[str]] = {}
+        self._wildcard: Set[int] = set()
+
+    def normalize(self, game: str) -> str:
+        """Case-fold, drop punctuation/spacing and resolve aliases."""
+        key = _fold(game)
+        return self.aliases.get(key, key)
+
+    def set_games(self, guild_id: int, games: Iterable[str]) -> None:
+        """Replace a guild's subscriptions, touching only what changed."""
+        new = {self.normalize(g) for g in games}
+        new.discard("")
+        old = self._games.get(guild_id, set())
+
+        for key in old - new:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(guild_id)
+                if not subscribers:
+                    del self._subscribers[key]
+        for key in new - old:
+            self._subscribers.setdefault(key, set()).add(guild_id)
+
+        if new:
+            self._games[guild_id] = new
+            self._wildcard.discard(guild_id)
+        else:
+            self._games.pop(guild_id, None)
+            self._wildcard.add(guild_id)
+
+    def remove_guild(self, guild_id: int) -> None:
+        self.set_games(guild_id, ())
+        self._wildcard.discard(guild_id)
+
+    def targets(self, game: str) -> Set[int]:
+        """Guild IDs that should receive an event for `game`."""
+        return self._subscribers.get(self.normalize(game), set()) | self._wildcard
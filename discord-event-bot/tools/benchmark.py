@@ -0,0 +1,365 @@
+"""Offline benchmarks: the real cogs against tools/fake_discord.py.
+
+    python tools/benchmark.py                     # every scenario
+    python tools/benchmark.py broadcast dkp_top   # just these
+    python tools/benchmark.py --latency 50 --rate-limit 0.05 --json out.json
+
+Each scenario runs in a fresh process with its own empty database, and
+starts an EventBot with cogs.events and cogs.dkp loaded against a local
+fake gateway/REST server. The bot's own settings come from the
+environment as usual, so e.g. DKP_WRITE_BEHIND=true or BROADCAST_RATE=100
+can be compared by running the suite twice. Command rate limits are
+turned off unless --command-limits is given, since every scenario is a
+burst from a handful of users.
+
+Scenarios:
+    broadcast   one public event broadcast to 1,000 subscribed guilds, until
+                every copy is posted by the outbox worker
+    redeem      5,000 /redeem_dkp calls for one code, sent in a burst
+    dkp_top     !dkp_top against a 100k-row dkp table
+    cold_start  startup with 500 guilds, until every guild is warmed
+
+Results are throughput plus p50/p99 latency per scenario; --json writes
+them out for comparing runs.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+TOOLS_DIR = Path(__file__).resolve().parent
+SRC_DIR = TOOLS_DIR.parent / "src"
+
+Result = Dict[str, Any]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples (0 if there are none)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def result(ops: int, elapsed: float, latencies: List[float], **extra: Any) -> Result:
+    return {
+        "ops": ops,
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(ops / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        **extra,
+    }
+
+
+async def wait_until(check: Callable[[], bool], timeout: float = 300) -> None:
+    deadline = time.perf_counter() + timeout
+    while not check():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("scenario did not finish in time")
+        await asyncio.sleep(0.01)
+
+
+# ----------------- scenarios -----------------
+# Each takes (fake, bot) after the bot is ready and returns a Result.
+
+async def scenario_broadcast(fake: Any, bot: Any) -> Result:
+    import discord
+    from db import events_db
+    from fake_discord import USER_BASE_ID
+
+    events = bot.get_cog("Events")
+    origin, *targets = [bot.get_guild(g) for g in fake.guilds]
+    for guild in targets:
+        events.subscriptions.set_games(guild.id, ["Valorant"])
+
+    event_id, _ = await events_db.create_event(
+        {
+            "guild_id": origin.id,
+            "name": "Benchmark event",
+            "genre": "FPS",
+            "game": "Valorant",
+            "start": None,
+            "end": None,
+            "limit": None,
+            "type": "public",
+            "creator": USER_BASE_ID,
+            "description": "Load test",
+            "dkp_reward": 0,
+        }
+    )
+    embed = discord.Embed(title="Benchmark event", description="Load test")
+    embed.set_footer(text=f"Event ID: {event_id}")
+    already = len(fake.message_times)
+    start = time.perf_counter()
+    queued = await events.broadcast_event(event_id, "Valorant", embed, origin)
+    queued_s = time.perf_counter() - start
+    # Delivery happens in the outbox worker; wait for every copy to land.
+    await wait_until(lambda: len(fake.message_times) - already >= queued)
+    elapsed = time.perf_counter() - start
+
+    # Latency here is time-to-delivery: broadcast start -> message posted.
+    arrivals = [t - start for t in fake.message_times[already:]]
+    return result(
+        len(arrivals),
+        elapsed,
+        arrivals,
+        queued=queued,
+        queued_ms=round(queued_s * 1000, 2),
+        rate_limited=fake.rate_limited,
+    )
+
+
+async def scenario_redeem(fake: Any, bot: Any) -> Result:
+    from db import events_db
+    from fake_discord import USER_BASE_ID
+
+    guild_id = next(iter(fake.guilds))
+    _, code = await events_db.create_event(
+        {
+            "guild_id": guild_id,
+            "name": "Benchmark raid",
+            "genre": "MMO",
+            "game": "WoW",
+            "start": None,
+            "end": None,
+            "limit": None,
+            "type": "private",
+            "creator": USER_BASE_ID,
+            "description": "",
+            "dkp_reward": 10,
+        }
+    )
+
+    calls = 5000
+    start = time.perf_counter()
+    for i in range(calls):
+        await fake.send_interaction(
+            guild_id, "redeem_dkp", {"code": code}, user_id=USER_BASE_ID + i
+        )
+    # Latency is to the acknowledgement (the deferral); the run ends once
+    # every followup with the outcome has been posted too.
+    await wait_until(
+        lambda: len(fake.interaction_latencies) >= calls
+        and sum(1 for r in fake.interaction_responses if r.get("followup")) >= calls
+    )
+    elapsed = time.perf_counter() - start
+
+    return result(
+        calls, elapsed, fake.interaction_latencies, rate_limited=fake.rate_limited
+    )
+
+
+def _seed_dkp(conn: Any, server_id: int, rows: int) -> None:
+    rng = random.Random(0)
+    conn.executemany(
+        "INSERT INTO dkp (server_id, user_id, points) VALUES (?, ?, ?);",
+        ((server_id, 10**17 + i, rng.randint(0, 5000)) for i in range(rows)),
+    )
+
+
+async def scenario_dkp_top(fake: Any, bot: Any) -> Result:
+    from db import dkp_db
+
+    guild_id = next(iter(fake.guilds))
+    await dkp_db.run_write(_seed_dkp, guild_id, 100_000)
+    dkp_db.invalidate_standings(guild_id)
+
+    calls = 200
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for i in range(calls):
+        # Walk the pages so the cached standings are read at many offsets.
+        reply = fake.expect_message()
+        sent = time.perf_counter()
+        await fake.send_message(guild_id, f"!dkp_top {1 + i * 50}")
+        await asyncio.wait_for(reply, timeout=30)
+        latencies.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - start
+
+    return result(
+        calls,
+        elapsed,
+        latencies[1:],
+        first_ms=round(latencies[0] * 1000, 2),
+    )
+
+
+# cold_start has no run step: run_scenario measures the startup itself.
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "broadcast": {"guilds": 1001, "run": scenario_broadcast},
+    "redeem": {"guilds": 1, "run": scenario_redeem},
+    "dkp_top": {"guilds": 1, "run": scenario_dkp_top},
+    "cold_start": {"guilds": 500, "run": None},
+}
+
+
+# ----------------- running -----------------
+
+async def run_scenario(name: str, args: argparse.Namespace) -> Result:
+    """Start a fake Discord and an EventBot, run one scenario, tear down."""
+    import bot as bot_module
+    from fake_discord import FakeDiscord
+
+    # When each guild finished warming, in seconds into startup.
+    warm_times: List[float] = []
+
+    class BenchBot(bot_module.EventBot):
+        async def setup_hook(self) -> None:
+            await super().setup_hook()
+            events = self.get_cog("Events")
+            warm_guild = events.warm_guild
+
+            async def timed_warm_guild(guild: Any) -> None:
+                await warm_guild(guild)
+                warm_times.append(time.perf_counter() - start)
+
+            events.warm_guild = timed_warm_guild
+
+    spec = SCENARIOS[name]
+    fake = FakeDiscord(
+        guild_count=spec["guilds"],
+        latency=args.latency / 1000,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    bot_module.use_fake_discord(await fake.start())
+    bot = BenchBot(shard_count=1)
+
+    start = time.perf_counter()
+    runner = asyncio.create_task(bot.start(bot_module.TOKEN))
+    try:
+        await wait_until(lambda: runner.done() or bot.is_ready())
+        ready = time.perf_counter() - start
+        events = bot.get_cog("Events")
+        await wait_until(lambda: runner.done() or len(events.warmed) >= len(fake.guilds))
+        if runner.done():
+            runner.result()  # surface a startup failure
+
+        if spec["run"] is None:
+            # Latency per guild: how long into startup it became usable.
+            return result(
+                len(warm_times),
+                time.perf_counter() - start,
+                warm_times,
+                ready_s=round(ready, 3),
+            )
+        return await spec["run"](fake, bot)
+    finally:
+        await bot.close()
+        with contextlib.suppress(Exception):
+            await runner
+        await fake.close()
+
+
+def run_child(name: str, args: argparse.Namespace) -> None:
+    """Entry point inside the per-scenario process; prints one JSON line."""
+    sys.path[:0] = [str(SRC_DIR), str(TOOLS_DIR)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        outcome = asyncio.run(run_scenario(name, args))
+    print(json.dumps(outcome))
+
+
+def run_all(names: List[str], args: argparse.Namespace) -> Dict[str, Result]:
+    results: Dict[str, Result] = {}
+    for name in names:
+        with tempfile.TemporaryDirectory(prefix=f"eventbot-bench-{name}-") as data_dir:
+            env = {
+                **os.environ,
+                "DATA_DIR": data_dir,
+                "DISCORD_TOKEN": os.environ.get("DISCORD_TOKEN", "benchmark"),
+                "FAKE_DISCORD_URL": "",
+                "METRICS_ENABLED": "false",
+            }
+            if not args.command_limits:
+                # Scenarios send bursts from one user; measure the cogs,
+                # not CommandLimiter refusing them.
+                env.update(
+                    RATE_LIMIT_USER="0",
+                    RATE_LIMIT_GUILD="0",
+                    RATE_LIMIT_GLOBAL="0",
+                    RATE_LIMITS="",
+                )
+            proc = subprocess.run(
+                [sys.executable, __file__, "--child", name, *sys.argv[1:]],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+        if proc.returncode != 0:
+            print(f"{name}: FAILED\n{proc.stderr.strip()}")
+            continue
+        results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(format_row(name, results[name]))
+    return results
+
+
+def format_row(name: str, res: Result) -> str:
+    extra = ", ".join(
+        f"{k}={v}"
+        for k, v in res.items()
+        if k not in ("ops", "elapsed_s", "throughput", "p50_ms", "p99_ms")
+    )
+    return (
+        f"{name:<11} {res['ops']:>6} ops in {res['elapsed_s']:>8.3f}s  "
+        f"{res['throughput']:>9.1f} ops/s  p50 {res['p50_ms']:>8.2f}ms  "
+        f"p99 {res['p99_ms']:>8.2f}ms" + (f"  ({extra})" if extra else "")
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)"
+    )
+    parser.add_argument("--latency", type=float, default=0, help="REST latency (ms)")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0, help="fraction of writes answered 429"
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=0.05, help="retry_after sent with 429s (s)"
+    )
+    parser.add_argument(
+        "--command-limits",
+        action="store_true",
+        help="keep the bot's command rate limits (off by default)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args)
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    results = run_all(args.scenarios or list(SCENARIOS), args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "latency_ms": args.latency,
+                    "rate_limit": args.rate_limit,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
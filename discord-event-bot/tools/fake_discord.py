@@ -0,0 +1,842 @@
+"""A small stand-in for Discord's REST API and gateway, for local testing.
+
+Serves just enough of both for discord.py to log in, shard, receive its
+guilds and send messages, so the bot (or several clusters of it) can run
+on one machine without a token or network access:
+
+    python tools/fake_discord.py --guilds 20 --port 8765
+
+    # in another shell
+    FAKE_DISCORD_URL=http://127.0.0.1:8765 DISCORD_TOKEN=fake \\
+    SHARD_COUNT=4 CLUSTER_COUNT=2 python src/cluster.py
+
+Everything the bot sends is recorded, and test traffic can be injected:
+
+    GET  /_fake/messages         messages the bot has posted
+    GET  /_fake/responses        interaction responses and followups
+    POST /_fake/interaction      dispatch a slash command invocation
+    POST /_fake/message          dispatch a MESSAGE_CREATE (prefix commands)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+
+BOT_ID = 100000000000000001
+OWNER_ID = 100000000000000002
+USER_BASE_ID = 200000000000000000
+
+# Discord snowflakes carry their creation time in the top bits; anything
+# above this is fine for ids made up here.
+_ids = itertools.count(300000000000000000)
+
+
+def snowflake() -> int:
+    return next(_ids)
+
+
+def user_payload(user_id: int, bot: bool = False) -> Dict[str, Any]:
+    return {
+        "id": str(user_id),
+        "username": "EventBot" if bot else f"user{user_id % 100000}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def _json(data: Any, status: int = 200) -> web.Response:
+    # discord.py only parses bodies whose content type is exactly
+    # "application/json", without aiohttp's usual "; charset=utf-8".
+    return web.Response(
+        body=json.dumps(data).encode(), status=status, content_type="application/json"
+    )
+
+
+def option_type(value: Any) -> int:
+    """Application command option type for a test value."""
+    if isinstance(value, bool):
+        return 5
+    return 4 if isinstance(value, int) else 3
+
+
+def guild_id_for(index: int) -> int:
+    # discord.py routes a guild to shard (guild_id >> 22) % shard_count, so
+    # consecutive values in the high bits spread guilds evenly over shards.
+    return ((1000 + index) << 22) | 1
+
+
+class FakeDiscord:
+    """In-process fake of the parts of Discord the bot talks to."""
+
+    def __init__(
+        self,
+        guild_count: int = 10,
+        members_per_guild: int = 5,
+        latency: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: float = 0.05,
+        seed: int = 0,
+        server_errors: float = 0.0,
+    ):
+        # Every REST call is delayed by `latency` seconds, and a `rate_limit`
+        # fraction of writes (non-GET) is answered with a 429. Another
+        # `server_errors` fraction is carried out but answered with a 500,
+        # like a gateway timing out after the write went through.
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.rate_limited = 0
+        self.server_errors = server_errors
+        self.server_errored = 0
+        self._random = random.Random(seed)
+
+        self.guilds: Dict[int, Dict[str, Any]] = {}
+        for i in range(guild_count):
+            self.add_guild(f"Guild {i}", members_per_guild)
+
+        self.shard_count = 1
+        # shard_id -> (websocket, next sequence number)
+        self.shards: Dict[int, Tuple[web.WebSocketResponse, int]] = {}
+        self.messages: List[Dict[str, Any]] = []
+        self.edits = 0
+        # webhook id -> webhook payload (with token and channel_id)
+        self.webhooks: Dict[int, Dict[str, Any]] = {}
+        # (channel_id, nonce) -> message, for enforce_nonce
+        self._nonces: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.interaction_responses: List[Dict[str, Any]] = []
+        # attachment id -> file contents, served under /attachments/
+        self.files: Dict[str, bytes] = {}
+        self.commands: Dict[str, List[Dict[str, Any]]] = {}
+        self.ready = asyncio.Event()
+
+        # perf_counter() timestamps for benchmarks: when each bot message
+        # arrived, and dispatch -> first response time per interaction.
+        self.message_times: List[float] = []
+        self.interaction_latencies: List[float] = []
+        self._interactions_sent: Dict[str, float] = {}
+        self._message_waiters: List[asyncio.Future] = []
+
+        self.app = web.Application(
+            middlewares=[self._inject_faults], client_max_size=64 * 1024 * 1024
+        )
+        self.app.add_routes(
+            [
+                web.get("/gateway", self.ws_gateway),
+                web.get("/api/v10/gateway", self.get_gateway),
+                web.get("/api/v10/gateway/bot", self.get_gateway_bot),
+                web.get("/api/v10/users/@me", self.get_me),
+                web.get("/api/v10/oauth2/applications/@me", self.get_application),
+                web.put(
+                    "/api/v10/applications/{app}/commands",
+                    self.put_commands,
+                ),
+                web.put(
+                    "/api/v10/applications/{app}/guilds/{guild}/commands",
+                    self.put_commands,
+                ),
+                web.post(
+                    "/api/v10/channels/{channel}/messages",
+                    self.post_message,
+                ),
+                web.get(
+                    "/api/v10/channels/{channel}/messages",
+                    self.get_messages,
+                ),
+                web.get(
+                    "/api/v10/channels/{channel}/messages/{message}",
+                    self.get_message,
+                ),
+                web.post(
+                    "/api/v10/channels/{channel}/typing",
+                    self.post_typing,
+                ),
+                web.get(
+                    "/api/v10/channels/{channel}/webhooks",
+                    self.get_webhooks,
+                ),
+                web.post(
+                    "/api/v10/channels/{channel}/webhooks",
+                    self.post_webhook,
+                ),
+                web.patch(
+                    "/api/v10/channels/{channel}/messages/{message}",
+                    self.patch_message,
+                ),
+                web.post(
+                    "/api/v10/guilds/{guild}/channels",
+                    self.post_guild_channel,
+                ),
+                web.post(
+                    "/api/v10/interactions/{id}/{token}/callback",
+                    self.post_interaction_callback,
+                ),
+                web.post(
+                    "/api/v10/webhooks/{app}/{token}",
+                    self.post_followup,
+                ),
+                web.get(
+                    "/api/v10/webhooks/{app}/{token}/messages/{message}",
+                    self.get_webhook_message,
+                ),
+                web.patch(
+                    "/api/v10/webhooks/{app}/{token}/messages/{message}",
+                    self.patch_webhook_message,
+                ),
+                web.get("/attachments/{id}/{filename}", self.get_attachment),
+                web.get("/_fake/messages", self.fake_messages),
+                web.get("/_fake/responses", self.fake_responses),
+                web.post("/_fake/interaction", self.fake_interaction),
+                web.post("/_fake/message", self.fake_message),
+                web.route("*", "/{tail:.*}", self.catch_all),
+            ]
+        )
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    # ----------------- setup -----------------
+
+    def add_guild(self, name: str, members: int = 5) -> int:
+        guild_id = guild_id_for(len(self.guilds))
+        self.guilds[guild_id] = {
+            "id": guild_id,
+            "name": name,
+            "channels": [
+                {
+                    "id": str(guild_id + 1),
+                    "type": 0,
+                    "name": "events",
+                    "position": 0,
+                    "permission_overwrites": [],
+                    "guild_id": str(guild_id),
+                }
+            ],
+            "members": [BOT_ID] + [USER_BASE_ID + i for i in range(members)],
+        }
+        return guild_id
+
+    def expect_message(self) -> "asyncio.Future[Dict[str, Any]]":
+        """Future resolved with the next message the bot posts to a channel."""
+        future = asyncio.get_running_loop().create_future()
+        self._message_waiters.append(future)
+        return future
+
+    def shard_of(self, guild_id: int) -> int:
+        return (guild_id >> 22) % self.shard_count
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        # discord.py doesn't cap its connection pool, so a burst of
+        # interactions opens thousands of sockets at once; a short listen
+        # queue makes the kernel reset some of them.
+        site = web.TCPSite(self._runner, host, port, backlog=4096)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self) -> None:
+        for ws, _ in list(self.shards.values()):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # ----------------- payloads -----------------
+
+    def guild_payload(self, guild_id: int) -> Dict[str, Any]:
+        guild = self.guilds[guild_id]
+        return {
+            "id": str(guild_id),
+            "name": guild["name"],
+            "owner_id": str(OWNER_ID),
+            "unavailable": False,
+            "member_count": len(guild["members"]),
+            "large": False,
+            "features": [],
+            "emojis": [],
+            "stickers": [],
+            "roles": [
+                {
+                    "id": str(guild_id),
+                    "name": "@everyone",
+                    "permissions": str(8),  # administrator
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }
+            ],
+            "channels": guild["channels"],
+            "members": [
+                self.member_payload(user_id) for user_id in guild["members"]
+            ],
+            "presences": [],
+            "voice_states": [],
+            "threads": [],
+            "stage_instances": [],
+            "guild_scheduled_events": [],
+            "premium_tier": 0,
+            "preferred_locale": "en-US",
+        }
+
+    def member_payload(self, user_id: int) -> Dict[str, Any]:
+        return {
+            "user": user_payload(user_id, bot=user_id == BOT_ID),
+            "roles": [],
+            "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+        }
+
+    def message_payload(
+        self,
+        channel_id: int,
+        body: Dict[str, Any],
+        author_id: int = BOT_ID,
+    ) -> Dict[str, Any]:
+        return {
+            "id": str(snowflake()),
+            "channel_id": str(channel_id),
+            "author": user_payload(author_id, bot=author_id == BOT_ID),
+            "content": body.get("content") or "",
+            "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [],
+            "attachments": body.get("attachments") or [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "type": 0,
+            "flags": body.get("flags", 0),
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None,
+        }
+
+    @web.middleware
+    async def _inject_faults(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        if not request.path.startswith("/api/"):
+            return await handler(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if (
+            self.rate_limit
+            and request.method != "GET"
+            and self._random.random() < self.rate_limit
+        ):
+            self.rate_limited += 1
+            response = _json(
+                {
+                    "message": "You are being rate limited.",
+                    "retry_after": self.retry_after,
+                    "global": False,
+                }
+            )
+            response.set_status(429)
+            # discord.py treats a 429 without Via as a Cloudflare ban.
+            response.headers["Via"] = "1.1 google"
+            response.headers["Retry-After"] = str(self.retry_after)
+            response.headers["X-RateLimit-Scope"] = "user"
+            return response
+        if (
+            self.server_errors
+            and request.method != "GET"
+            and self._random.random() < self.server_errors
+        ):
+            await handler(request)
+            self.server_errored += 1
+            return _json({"message": "Internal Server Error", "code": 0}, status=500)
+        return await handler(request)
+
+    # ----------------- gateway -----------------
+
+    async def dispatch(self, shard_id: int, event: str, data: Dict[str, Any]) -> None:
+        ws, seq = self.shards[shard_id]
+        self.shards[shard_id] = (ws, seq + 1)
+        await ws.send_str(json.dumps({"op": 0, "t": event, "s": seq, "d": data}))
+
+    async def ws_gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_str(json.dumps({"op": 10, "d": {"heartbeat_interval": 41250}}))
+
+        shard_id: Optional[int] = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                op, data = payload["op"], payload.get("d")
+
+                if op == 1:  # heartbeat
+                    await ws.send_str(json.dumps({"op": 11}))
+                elif op == 2:  # identify
+                    shard_id, self.shard_count = data.get("shard", [0, 1])
+                    self.shards[shard_id] = (ws, 1)
+                    await self.send_ready(shard_id)
+                elif op == 8:  # request guild members
+                    await self.send_member_chunk(shard_id, data)
+        finally:
+            if shard_id is not None and self.shards.get(shard_id, (None,))[0] is ws:
+                del self.shards[shard_id]
+        return ws
+
+    async def send_ready(self, shard_id: int) -> None:
+        guild_ids = [g for g in self.guilds if self.shard_of(g) == shard_id]
+        await self.dispatch(
+            shard_id,
+            "READY",
+            {
+                "v": 10,
+                "user": user_payload(BOT_ID, bot=True),
+                "guilds": [{"id": str(g), "unavailable": True} for g in guild_ids],
+                "session_id": f"fake-{shard_id}-{time.time_ns()}",
+                "resume_gateway_url": self.url.replace("http", "ws", 1) + "/gateway",
+                "shard": [shard_id, self.shard_count],
+                "application": {"id": str(BOT_ID), "flags": 0},
+            },
+        )
+        for guild_id in guild_ids:
+            await self.dispatch(shard_id, "GUILD_CREATE", self.guild_payload(guild_id))
+        if len(self.shards) == self.shard_count:
+            self.ready.set()
+
+    async def send_member_chunk(self, shard_id: int, data: Dict[str, Any]) -> None:
+        guild_id = int(data["guild_id"])
+        await self.dispatch(
+            shard_id,
+            "GUILD_MEMBERS_CHUNK",
+            {
+                "guild_id": str(guild_id),
+                "members": [
+                    self.member_payload(u) for u in self.guilds[guild_id]["members"]
+                ],
+                "chunk_index": 0,
+                "chunk_count": 1,
+                "nonce": data.get("nonce"),
+            },
+        )
+
+    # ----------------- REST -----------------
+
+    async def get_gateway(self, request: web.Request) -> web.Response:
+        return _json({"url": self.url.replace("http", "ws", 1) + "/gateway"})
+
+    async def get_gateway_bot(self, request: web.Request) -> web.Response:
+        return _json(
+            {
+                "url": self.url.replace("http", "ws", 1) + "/gateway",
+                "shards": max(1, len(self.guilds) // 1000 + 1),
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    async def get_me(self, request: web.Request) -> web.Response:
+        return _json(user_payload(BOT_ID, bot=True))
+
+    async def get_application(self, request: web.Request) -> web.Response:
+        return _json(
+            {
+                "id": str(BOT_ID),
+                "name": "EventBot",
+                "icon": None,
+                "description": "",
+                "bot_public": True,
+                "bot_require_code_grant": False,
+                "verify_key": "0" * 64,
+                "owner": user_payload(OWNER_ID),
+                "flags": 0,
+            }
+        )
+
+    async def put_commands(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        scope = request.match_info.get("guild", "global")
+        for command in body:
+            command.setdefault("id", str(snowflake()))
+            command.setdefault("application_id", str(BOT_ID))
+            command.setdefault("version", "1")
+        self.commands[scope] = body
+        return _json(body)
+
+    async def post_typing(self, request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    def attachment_payload(self, filename: str, data: bytes) -> Dict[str, Any]:
+        attachment_id = str(snowflake())
+        self.files[attachment_id] = data
+        url = f"{self.url}/attachments/{attachment_id}/{filename}"
+        return {
+            "id": attachment_id,
+            "filename": filename,
+            "size": len(data),
+            "url": url,
+            "proxy_url": url,
+        }
+
+    async def _read_body(self, request: web.Request) -> Dict[str, Any]:
+        """JSON body of a request, with uploaded files (multipart) turned
+        into attachments."""
+        if not request.content_type.startswith("multipart/"):
+            return await request.json()
+        body: Dict[str, Any] = {}
+        attachments = []
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "payload_json":
+                body.update(json.loads(await part.text()))
+            else:
+                attachments.append(
+                    self.attachment_payload(part.filename or "file", await part.read())
+                )
+        body["attachments"] = attachments
+        return body
+
+    async def get_attachment(self, request: web.Request) -> web.Response:
+        data = self.files.get(request.match_info["id"])
+        if data is None:
+            return web.Response(status=404)
+        return web.Response(body=data)
+
+    async def post_message(self, request: web.Request) -> web.Response:
+        body = await self._read_body(request)
+        nonce_key = (request.match_info["channel"], str(body.get("nonce")))
+        if body.get("enforce_nonce") and nonce_key in self._nonces:
+            return _json(self._nonces[nonce_key])
+        message = self.message_payload(int(request.match_info["channel"]), body)
+        if body.get("enforce_nonce"):
+            self._nonces[nonce_key] = message
+        self.record_message(message)
+        return _json(message)
+
+    def record_message(self, message: Dict[str, Any]) -> None:
+        self.messages.append(message)
+        self.message_times.append(time.perf_counter())
+        waiters, self._message_waiters = self._message_waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(message)
+
+    def find_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        return next((m for m in self.messages if m["id"] == message_id), None)
+
+    async def get_messages(self, request: web.Request) -> web.Response:
+        channel_id = request.match_info["channel"]
+        limit = int(request.query.get("limit", 50))
+        history = [m for m in self.messages if m["channel_id"] == channel_id]
+        return _json(history[::-1][:limit])
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        message = self.find_message(request.match_info["message"])
+        if message is None:
+            return _json({"code": 10008, "message": "Unknown Message"}, status=404)
+        return _json(message)
+
+    async def patch_message(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        message = self.find_message(request.match_info["message"])
+        if message is None:
+            message = self.message_payload(int(request.match_info.get("channel", 0)), body)
+            message["id"] = request.match_info["message"]
+        else:
+            # Only the fields sent are replaced, as on Discord.
+            for field in ("content", "embeds", "components"):
+                if field in body:
+                    message[field] = body[field] or ([] if field != "content" else "")
+            message["edited_timestamp"] = "2024-01-01T00:00:01+00:00"
+        self.edits += 1
+        return _json(message)
+
+    async def post_guild_channel(self, request: web.Request) -> web.Response:
+        guild_id = int(request.match_info["guild"])
+        body = await request.json()
+        channel = {
+            "id": str(snowflake()),
+            "type": body.get("type", 0),
+            "name": body["name"],
+            "position": len(self.guilds[guild_id]["channels"]),
+            "permission_overwrites": [],
+            "guild_id": str(guild_id),
+        }
+        self.guilds[guild_id]["channels"].append(channel)
+        return _json(channel)
+
+    async def post_interaction_callback(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.interaction_responses.append(
+            {"interaction_id": request.match_info["id"], **body}
+        )
+        sent = self._interactions_sent.pop(request.match_info["id"], None)
+        if sent is not None:
+            self.interaction_latencies.append(time.perf_counter() - sent)
+        # discord.py asks for ?with_response=true and expects the callback
+        # resource back.
+        resource: Dict[str, Any] = {"type": body["type"]}
+        if body["type"] in (4, 7):  # message / update message
+            resource["message"] = self.message_payload(0, body.get("data") or {})
+        return _json(
+            {
+                "interaction": {
+                    "id": request.match_info["id"],
+                    "type": 2,
+                    "response_message_loading": body["type"] == 5,
+                    "response_message_ephemeral": bool(
+                        (body.get("data") or {}).get("flags", 0) & 64
+                    ),
+                },
+                "resource": resource,
+            }
+        )
+
+    async def get_webhooks(self, request: web.Request) -> web.Response:
+        channel_id = request.match_info["channel"]
+        return _json([w for w in self.webhooks.values() if w["channel_id"] == channel_id])
+
+    async def post_webhook(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        channel_id = request.match_info["channel"]
+        guild_id = next(
+            g
+            for g, guild in self.guilds.items()
+            if any(c["id"] == channel_id for c in guild["channels"])
+        )
+        webhook = {
+            "id": str(snowflake()),
+            "type": 1,
+            "token": f"webhook-{snowflake()}",
+            "name": body["name"],
+            "avatar": None,
+            "channel_id": channel_id,
+            "guild_id": str(guild_id),
+            "application_id": str(BOT_ID),
+            "user": user_payload(BOT_ID, bot=True),
+        }
+        self.webhooks[int(webhook["id"])] = webhook
+        return _json(webhook)
+
+    def _webhook(self, request: web.Request) -> Optional[Dict[str, Any]]:
+        webhook = self.webhooks.get(int(request.match_info["app"]))
+        if webhook is None or webhook["token"] != request.match_info["token"]:
+            return None
+        return webhook
+
+    async def post_followup(self, request: web.Request) -> web.Response:
+        body = await self._read_body(request)
+        webhook = self._webhook(request)
+        if webhook is not None:
+            # Executing a channel webhook rather than an interaction followup.
+            message = self.message_payload(int(webhook["channel_id"]), body)
+            message["webhook_id"] = webhook["id"]
+            message["author"] = {**user_payload(int(webhook["id"])), "username": webhook["name"]}
+            self.record_message(message)
+            return _json(message)
+        message = self.message_payload(0, body)
+        self.interaction_responses.append({"followup": True, **message})
+        return _json(message)
+
+    async def get_webhook_message(self, request: web.Request) -> web.Response:
+        message = self.find_message(request.match_info["message"])
+        if self._webhook(request) is None or message is None:
+            return _json({"code": 10008, "message": "Unknown Message"}, status=404)
+        return _json(message)
+
+    async def patch_webhook_message(self, request: web.Request) -> web.Response:
+        if self._webhook(request) is None:
+            # Interaction response edits (@original) aren't tracked.
+            return await self.post_followup(request)
+        return await self.patch_message(request)
+
+    async def catch_all(self, request: web.Request) -> web.Response:
+        print(f"[FAKE] Unhandled {request.method} {request.path}")
+        return _json({})
+
+    # ----------------- test controls -----------------
+
+    async def fake_messages(self, request: web.Request) -> web.Response:
+        return _json(self.messages)
+
+    async def fake_responses(self, request: web.Request) -> web.Response:
+        return _json(self.interaction_responses)
+
+    async def fake_interaction(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        payload = await self.send_interaction(
+            int(body["guild_id"]),
+            body["name"],
+            body.get("options", {}),
+            user_id=int(body.get("user_id", USER_BASE_ID)),
+        )
+        return _json({"id": payload["id"]})
+
+    async def fake_message(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        await self.send_message(
+            int(body["guild_id"]),
+            body["content"],
+            user_id=int(body.get("user_id", USER_BASE_ID)),
+        )
+        return _json({})
+
+    async def send_interaction(
+        self,
+        guild_id: int,
+        name: str,
+        options: Dict[str, Any],
+        user_id: int = USER_BASE_ID,
+    ) -> Dict[str, Any]:
+        """Dispatch an INTERACTION_CREATE for a chat input command."""
+        command = next(
+            (
+                c
+                for scope in (str(guild_id), "global")
+                for c in self.commands.get(scope, [])
+                if c["name"] == name
+            ),
+            {"id": str(snowflake())},
+        )
+        return await self._send_interaction(
+            guild_id,
+            self.guilds[guild_id]["channels"][0]["id"],
+            user_id,
+            2,
+            {
+                "id": command["id"],
+                "name": name,
+                "type": 1,
+                "options": [
+                    # BOOLEAN, INTEGER for ints, STRING for everything else
+                    {"name": k, "type": option_type(v), "value": v}
+                    for k, v in options.items()
+                ],
+            },
+        )
+
+    async def send_button_click(
+        self,
+        message: Dict[str, Any],
+        custom_id: str,
+        user_id: int = USER_BASE_ID,
+    ) -> Dict[str, Any]:
+        """Dispatch an INTERACTION_CREATE for a button on a posted message."""
+        channel_id = message["channel_id"]
+        guild_id = next(
+            g
+            for g, guild in self.guilds.items()
+            if any(c["id"] == channel_id for c in guild["channels"])
+        )
+        return await self._send_interaction(
+            guild_id,
+            channel_id,
+            user_id,
+            3,
+            {"custom_id": custom_id, "component_type": 2},
+            message=message,
+        )
+
+    async def _send_interaction(
+        self,
+        guild_id: int,
+        channel_id: str,
+        user_id: int,
+        kind: int,
+        data: Dict[str, Any],
+        message: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        payload = {
+            "id": str(snowflake()),
+            "application_id": str(BOT_ID),
+            "type": kind,
+            "token": f"token-{snowflake()}",
+            "version": 1,
+            "guild_id": str(guild_id),
+            "channel_id": channel_id,
+            "channel": {"id": channel_id, "type": 0, "guild_id": str(guild_id)},
+            "member": {
+                **self.member_payload(user_id),
+                "permissions": str(8),
+            },
+            "app_permissions": str(8),
+            "locale": "en-US",
+            "guild_locale": "en-US",
+            "entitlements": [],
+            "attachment_size_limit": 8 * 1024 * 1024,
+            "context": 0,
+            "authorizing_integration_owners": {},
+            "data": data,
+        }
+        if message is not None:
+            payload["message"] = message
+        self._interactions_sent[payload["id"]] = time.perf_counter()
+        await self.dispatch(self.shard_of(guild_id), "INTERACTION_CREATE", payload)
+        return payload
+
+    async def send_message(
+        self,
+        guild_id: int,
+        content: str,
+        user_id: int = USER_BASE_ID,
+        files: Optional[Dict[str, bytes]] = None,
+    ) -> None:
+        """Dispatch a MESSAGE_CREATE from a member, e.g. a prefix command,
+        optionally with {filename: contents} attached."""
+        channel_id = int(self.guilds[guild_id]["channels"][0]["id"])
+        attachments = [
+            self.attachment_payload(name, data) for name, data in (files or {}).items()
+        ]
+        message = self.message_payload(
+            channel_id, {"content": content, "attachments": attachments}, user_id
+        )
+        message["guild_id"] = str(guild_id)
+        message["member"] = {
+            k: v for k, v in self.member_payload(user_id).items() if k != "user"
+        }
+        await self.dispatch(self.shard_of(guild_id), "MESSAGE_CREATE", message)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    fake = FakeDiscord(
+        guild_count=args.guilds,
+        members_per_guild=args.members,
+        latency=args.latency / 1000,
+        rate_limit=args.rate_limit,
+        server_errors=args.server_errors,
+    )
+    url = await fake.start(args.host, args.port)
+    print(f"[FAKE] Serving {len(fake.guilds)} guild(s) at {url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0, help="REST latency (ms)")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0, help="fraction of writes answered 429"
+    )
+    parser.add_argument(
+        "--server-errors",
+        type=float,
+        default=0,
+        help="fraction of writes carried out but answered 500",
+    )
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass